@@ -0,0 +1,75 @@
+"""
+Long-running HTTP query service (ASGI).
+
+    uvicorn app.api:app --host 0.0.0.0 --port 8000 --workers 4
+    python -m app.api --workers 4 --threads 32
+
+Each worker process holds its own warm ServiceState (pooled Mongo client,
+category index, snapshots, vector stores); /health/ready turns 200 once it is
+loaded, and query endpoints return 503 until then.
+
+- API_THREADS: blocking handlers run concurrently per worker (default 40)
+- WARM_TENANTS / FOLLOW_CHANGES / MONGO_URI / DB_NAME: see app/services/service_state.py
+- SCHEDULER_* / TENANT_WEIGHTS: per-tenant fair queues, see app/services/scheduler.py
+  (429 when a tenant's queue is full, 503 when a job waited too long)
+"""
+import argparse
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import anyio.to_thread
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.routers.query import router as query_router
+from app.services.mongo_client import close_clients
+from app.services.scheduler import SchedulerFull, SchedulerTimeout
+from app.services.service_state import ServiceState
+
+API_THREADS = int(os.getenv("API_THREADS", "40"))
+
+
+def create_app(state: Optional[ServiceState] = None, threads: int = API_THREADS) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        anyio.to_thread.current_default_thread_limiter().total_tokens = threads
+        app.state.service = state or ServiceState()
+        app.state.service.start()
+        yield
+        app.state.service.stop()
+        close_clients()
+
+    app = FastAPI(title="Content query service", lifespan=lifespan)
+    app.include_router(query_router)
+
+    @app.exception_handler(ValueError)
+    async def invalid_value(request: Request, exc: ValueError):
+        return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+    @app.exception_handler(SchedulerFull)
+    async def tenant_queue_full(request: Request, exc: SchedulerFull):
+        return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+    @app.exception_handler(SchedulerTimeout)
+    async def queue_timeout(request: Request, exc: SchedulerTimeout):
+        return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the query service")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own warm state")
+    parser.add_argument("--threads", type=int, default=API_THREADS, help="Concurrent blocking handlers per worker")
+    args = parser.parse_args()
+
+    os.environ["API_THREADS"] = str(args.threads)
+    uvicorn.run("app.api:app", host=args.host, port=args.port, workers=args.workers)
@@ -0,0 +1,122 @@
+# app/db/embedding_backend.py
+"""
+Embedding backends, selected with EMBEDDING_BACKEND:
+
+- "openai"  (default): OpenAI embeddings API (text-embedding-3-small)
+- "hashing": local CPU feature hashing of word + character n-grams into a
+             fixed dimension. Deterministic, no network; meant for offline
+             indexing, tests and benchmarks (lexical, not semantic, similarity).
+"""
+import os
+import re
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Point at a local stub (see stub_embedding_server.py) for tests/benchmarks
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+HASHING_DIMENSIONS = int(os.getenv("HASHING_EMBEDDING_DIMENSIONS", "512"))
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class EmbeddingBackend(ABC):
+    """
+    Interface every backend implements. `model` identifies the vector space:
+    it is stored as embeddingModel and is part of content/cache hashes, so
+    vectors from different backends never mix.
+    """
+    name = ""
+    model = ""
+    dimensions: Optional[int] = None
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> Tuple[List[List[float]], Optional[int]]:
+        """Embed a batch; returns (embeddings in input order, tokens billed or None)."""
+
+    def embed_one(self, text: str) -> Optional[List[float]]:
+        embeddings, _ = self.embed([text])
+        return embeddings[0] if embeddings else None
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    name = "openai"
+
+    def __init__(self, model: str = OPENAI_EMBEDDING_MODEL, api_key: Optional[str] = OPENAI_API_KEY, base_url: Optional[str] = OPENAI_BASE_URL):
+        self.model = model
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    def embed(self, texts: List[str]) -> Tuple[List[List[float]], Optional[int]]:
+        resp = self.client.embeddings.create(model=self.model, input=texts)
+        ordered = sorted(resp.data, key=lambda d: d.index)
+        usage = getattr(resp, "usage", None)
+        return [d.embedding for d in ordered], getattr(usage, "total_tokens", None)
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Signed feature hashing of word unigrams/bigrams and character n-grams,
+    log-scaled term counts, L2-normalized. crc32 keeps it stable across processes.
+    """
+    name = "hashing"
+
+    def __init__(self, dimensions: int = HASHING_DIMENSIONS, char_ngrams: Tuple[int, ...] = (3, 4)):
+        self.dimensions = dimensions
+        self.char_ngrams = char_ngrams
+        self.model = f"local-hashing-v1-{dimensions}"
+
+    def features(self, text: str) -> List[str]:
+        words = _WORD_RE.findall(text.casefold())
+        feats = list(words)
+        feats.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"#{word}#"
+            for n in self.char_ngrams:
+                feats.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return feats
+
+    def vector(self, text: str) -> np.ndarray:
+        feats = self.features(text)
+        if not feats:
+            return np.zeros(self.dimensions, dtype=np.float32)
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feats), dtype=np.uint32, count=len(feats))
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        counts = np.bincount(hashes % self.dimensions, weights=signs, minlength=self.dimensions)
+        vec = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed(self, texts: List[str]) -> Tuple[List[List[float]], Optional[int]]:
+        # Tokens aren't billed locally; report None so callers fall back to their estimate
+        return [self.vector(text).tolist() for text in texts], None
+
+
+BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    OpenAIEmbeddingBackend.name: OpenAIEmbeddingBackend,
+    HashingEmbeddingBackend.name: HashingEmbeddingBackend,
+}
+_instances: Dict[str, EmbeddingBackend] = {}
+
+
+def get_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """Process-wide backend instance by name (default: EMBEDDING_BACKEND)."""
+    name = name or EMBEDDING_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}'. Options: {sorted(BACKENDS)}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
@@ -0,0 +1,145 @@
+# app/db/embedding_codec.py
+"""
+Embedding storage formats.
+
+- "array":   BSON array of doubles (original format, ~8 bytes/dim plus per-element overhead)
+- "float32": Binary, packed little-endian float32 (4 bytes/dim)
+- "int8":    Binary, 4-byte float32 scale header + int8 values (1 byte/dim)
+
+Readers go through decode_embedding(), which accepts every format, so
+collections can be migrated gradually:
+
+    python -m app.db.embedding_codec --format float32
+"""
+import argparse
+import os
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+from bson.binary import Binary, USER_DEFINED_SUBTYPE
+from pymongo import UpdateOne
+
+ARRAY = "array"
+FLOAT32 = "float32"
+INT8 = "int8"
+STORAGE_FORMATS = (ARRAY, FLOAT32, INT8)
+
+# Default format for newly written embeddings
+EMBEDDING_STORAGE_FORMAT = os.getenv("EMBEDDING_STORAGE_FORMAT", ARRAY)
+
+FLOAT32_SUBTYPE = USER_DEFINED_SUBTYPE       # 0x80
+INT8_SUBTYPE = USER_DEFINED_SUBTYPE + 1      # 0x81
+_F32 = np.dtype("<f4")
+_SCALE_BYTES = _F32.itemsize
+
+EmbeddingValue = Union[List[float], Binary, bytes, np.ndarray]
+
+
+def encode_embedding(value: EmbeddingValue, storage_format: str = EMBEDDING_STORAGE_FORMAT):
+    """Convert an embedding (list, ndarray or already-encoded Binary) to the storage format."""
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown embedding storage format: {storage_format}")
+
+    if storage_format == ARRAY and isinstance(value, list):
+        return value
+    if storage_format == FLOAT32 and isinstance(value, Binary) and value.subtype == FLOAT32_SUBTYPE:
+        return value
+
+    vec = decode_embedding(value)
+    if storage_format == ARRAY:
+        return vec.astype(np.float64).tolist()
+    if storage_format == FLOAT32:
+        return Binary(vec.astype(_F32, copy=False).tobytes(), FLOAT32_SUBTYPE)
+
+    # int8: symmetric per-vector scale so that max |v| maps to 127
+    max_abs = float(np.max(np.abs(vec))) if vec.size else 0.0
+    scale = max_abs / 127.0 if max_abs > 0 else 1.0
+    quantized = np.clip(np.rint(vec / scale), -127, 127).astype(np.int8)
+    return Binary(np.float32(scale).astype(_F32).tobytes() + quantized.tobytes(), INT8_SUBTYPE)
+
+
+def decode_embedding(value: EmbeddingValue) -> np.ndarray:
+    """
+    Return a float32 vector for any stored format.
+    float32 Binary values are decoded zero-copy (a read-only view over the BSON bytes).
+    """
+    if isinstance(value, np.ndarray):
+        return value.astype(np.float32, copy=False)
+    if isinstance(value, Binary):
+        if value.subtype == INT8_SUBTYPE:
+            scale = np.frombuffer(value, dtype=_F32, count=1)[0]
+            return np.frombuffer(value, dtype=np.int8, offset=_SCALE_BYTES).astype(np.float32) * scale
+        if value.subtype != FLOAT32_SUBTYPE:
+            raise ValueError(f"Unsupported embedding Binary subtype: {value.subtype}")
+        return np.frombuffer(value, dtype=_F32)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=_F32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def decode_embeddings(values: Sequence[EmbeddingValue], dimensions: Optional[int] = None) -> np.ndarray:
+    """Stack many stored embeddings into one contiguous (n, d) float32 matrix."""
+    if not len(values):
+        return np.empty((0, dimensions or 0), dtype=np.float32)
+    first = decode_embedding(values[0])
+    matrix = np.empty((len(values), dimensions or first.shape[0]), dtype=np.float32)
+    matrix[0] = first
+    for i in range(1, len(values)):
+        matrix[i] = decode_embedding(values[i])
+    return matrix
+
+
+def storage_format_of(value: EmbeddingValue) -> Optional[str]:
+    if isinstance(value, list):
+        return ARRAY
+    if isinstance(value, Binary):
+        return {FLOAT32_SUBTYPE: FLOAT32, INT8_SUBTYPE: INT8}.get(value.subtype)
+    return None
+
+
+# === Migration ===
+def migrate_embeddings(
+    collection,
+    storage_format: str,
+    field: str = "embedding",
+    batch_size: int = 1000,
+    query: Optional[dict] = None
+) -> int:
+    """Re-encode every stored embedding not already in `storage_format`. Returns docs rewritten."""
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unknown embedding storage format: {storage_format}")
+
+    base = dict(query or {})
+    base[field] = {"$type": "binData"} if storage_format == ARRAY else {"$exists": True}
+
+    migrated = 0
+    ops: List[UpdateOne] = []
+    for doc in collection.find(base, {field: 1}, batch_size=batch_size):
+        value = doc.get(field)
+        if value is None or storage_format_of(value) == storage_format:
+            continue
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: encode_embedding(value, storage_format)}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            migrated += len(ops)
+            ops = []
+            print(f"🔄 Migrated {migrated} docs to {storage_format}")
+
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        migrated += len(ops)
+    return migrated
+
+
+if __name__ == "__main__":
+    from app.db.generate_embedding import db, EMBEDDING_CACHE_COLLECTION
+
+    parser = argparse.ArgumentParser(description="Migrate stored embeddings between storage formats")
+    parser.add_argument("--format", choices=STORAGE_FORMATS, default=FLOAT32)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--collections", nargs="+", default=["sitemaps", EMBEDDING_CACHE_COLLECTION])
+    args = parser.parse_args()
+
+    for name in args.collections:
+        count = migrate_embeddings(db[name], args.format, batch_size=args.batch_size)
+        print(f"✅ {name}: migrated {count} embeddings to {args.format}")
@@ -0,0 +1,323 @@
+# app/db/embedding_worker.py
+"""
+Concurrent, resumable embedding backfill.
+
+- N embedding requests in flight, throttled by request/token buckets (RPM/TPM)
+- Exponential backoff with jitter on 429 / 5xx / connection errors
+- Progress checkpointed per _id partition, so a crash resumes where it stopped
+  instead of re-scanning from the start
+- Same selection as process_sitemaps: docs without an embedding, hash or with
+  another model, or edited since they were last embedded/checked; --rescan walks every doc and re-embeds those whose text hash
+  changed (use a separate --job, checkpoints are per job)
+- Several processes can split the collection with --partition i --partitions n
+
+    python -m app.db.embedding_worker --partitions 4 --partition 0 --concurrency 8
+    python -m app.db.embedding_worker --rescan --job sitemaps-rescan
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from app.db.generate_embedding import (
+    db,
+    EmbeddingItem,
+    EmbeddingStats,
+    TEXT_FIELDS,
+    MAX_BATCH_INPUTS,
+    MAX_BATCH_TOKENS,
+    embed_batch,
+    get_embeddings,
+    iter_embedding_batches,
+    mark_checked,
+    pending_embedding_query,
+)
+
+CHECKPOINT_COLLECTION = "embedding_checkpoints"
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+# === Rate Limiting ===
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until `amount` tokens are available."""
+
+    def __init__(self, rate_per_sec: float, capacity: Optional[float] = None):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(capacity if capacity is not None else rate_per_sec)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """Returns the number of seconds spent waiting."""
+        # A single request bigger than the bucket would never fit; let it drain the bucket instead
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                sleep_for = (amount - self._tokens) / self.rate
+            time.sleep(sleep_for)
+            waited += sleep_for
+
+
+# === Retry ===
+def is_retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    # openai.APIConnectionError / APITimeoutError and plain socket errors carry no status
+    return type(exc).__name__ in {"APIConnectionError", "APITimeoutError"} or isinstance(exc, (ConnectionError, TimeoutError))
+
+
+def with_backoff(
+    fn: Callable,
+    max_retries: int = 6,
+    base_delay: float = 0.5,
+    max_delay: float = 30.0
+) -> Callable:
+    """Wrap fn so retryable failures are retried with full-jitter exponential backoff."""
+    def wrapper(*args, **kwargs):
+        for attempt in range(max_retries + 1):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == max_retries or not is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+                print(f"🔁 Retry {attempt + 1}/{max_retries} in {delay:.1f}s: {e}")
+                time.sleep(delay)
+    return wrapper
+
+
+# === Partitions + Checkpoints ===
+def plan_partitions(collection, partitions: int, job: str) -> List[Dict]:
+    """
+    Split the collection into `partitions` contiguous _id ranges.
+    The plan is stored once per job so every worker process uses the same boundaries.
+    """
+    checkpoints = db[CHECKPOINT_COLLECTION]
+    existing = list(checkpoints.find({"job": job}).sort("partition", 1))
+    if existing:
+        if len(existing) != partitions:
+            raise ValueError(f"Job '{job}' was planned with {len(existing)} partitions, not {partitions}")
+        return existing
+
+    buckets = list(collection.aggregate([
+        {"$project": {"_id": 1}},
+        {"$bucketAuto": {"groupBy": "$_id", "buckets": partitions}}
+    ], allowDiskUse=True))
+
+    # partitions-1 cut points; partition i covers (edges[i], edges[i + 1]]
+    cuts = [b["_id"]["max"] for b in buckets][:partitions - 1]
+    edges = [None] + cuts + [None]
+
+    plan = []
+    for i in range(partitions):
+        # Small collections can yield fewer buckets than partitions; extra partitions are empty
+        empty = i > len(cuts)
+        lower = edges[i] if not empty else None
+        plan.append({
+            "_id": f"{job}:{i}",
+            "job": job,
+            "partition": i,
+            "lower": lower,  # exclusive; None = unbounded
+            "upper": edges[i + 1] if not empty else None,  # inclusive; None = unbounded
+            "last_id": lower,
+            "docs": 0,
+            "done": empty,
+            "updatedAt": datetime.now(timezone.utc)
+        })
+
+    for doc in plan:
+        checkpoints.update_one({"_id": doc["_id"]}, {"$setOnInsert": doc}, upsert=True)
+    # Another process may have won the race; re-read the stored plan
+    return list(checkpoints.find({"job": job}).sort("partition", 1))
+
+
+def save_checkpoint(checkpoint_id: str, last_id: Optional[ObjectId], docs: int, done: bool = False) -> None:
+    update = {
+        "$set": {"done": done, "updatedAt": datetime.now(timezone.utc)},
+        "$inc": {"docs": docs}
+    }
+    if last_id is not None:
+        # $max: concurrent writers can land out of order; never move the checkpoint backwards
+        update["$max"] = {"last_id": last_id}
+    db[CHECKPOINT_COLLECTION].update_one({"_id": checkpoint_id}, update)
+
+
+class _Watermark:
+    """
+    Batches finish out of order; the checkpoint may only advance past a batch
+    once it and every batch before it have been written.
+    """
+
+    def __init__(self, start):
+        self.value = start
+        self._next_seq = 0
+        self._finished: Dict[int, Tuple[object, bool]] = {}
+        self._lock = threading.Lock()
+
+    def finish(self, seq: int, last_id, ok: bool) -> Optional[object]:
+        """Record batch completion; returns the new watermark if it moved."""
+        with self._lock:
+            self._finished[seq] = (last_id, ok)
+            moved = False
+            while self._next_seq in self._finished:
+                batch_last_id, batch_ok = self._finished[self._next_seq]
+                if not batch_ok:
+                    # A failed batch pins the checkpoint; its docs are retried on resume
+                    break
+                del self._finished[self._next_seq]
+                self.value = batch_last_id
+                self._next_seq += 1
+                moved = True
+            return self.value if moved else None
+
+
+# === Worker ===
+def run_partition(
+    collection,
+    checkpoint: Dict,
+    concurrency: int = 4,
+    requests_per_minute: float = 3000,
+    tokens_per_minute: float = 1_000_000,
+    max_inputs: int = MAX_BATCH_INPUTS,
+    max_tokens: int = MAX_BATCH_TOKENS,
+    embed_fn=get_embeddings,
+    rescan: bool = False
+) -> EmbeddingStats:
+    """Backfill one _id partition, resuming from its checkpoint."""
+    stats = EmbeddingStats()
+    scan_stats = EmbeddingStats()
+    if checkpoint.get("done"):
+        print(f"⏭️ Partition {checkpoint['partition']} already complete")
+        return stats
+
+    # Bucket capacity = one minute of quota, mirroring how the API enforces RPM/TPM
+    request_bucket = TokenBucket(requests_per_minute / 60.0, requests_per_minute)
+    token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+    retrying_embed = with_backoff(embed_fn)
+    watermark = _Watermark(checkpoint.get("last_id"))
+    stats_lock = threading.Lock()
+    # Backpressure: never hold more than 2x concurrency batches in memory
+    in_flight = threading.BoundedSemaphore(concurrency * 2)
+
+    id_range = {}
+    if checkpoint.get("last_id") is not None:
+        id_range["$gt"] = checkpoint["last_id"]
+    if checkpoint.get("upper") is not None:
+        id_range["$lte"] = checkpoint["upper"]
+    query = pending_embedding_query(rescan)
+    if id_range:
+        query["_id"] = id_range
+
+    # Walks the _id index from the checkpoint forward; no full collection scan on resume
+    projection = {field: 1 for field in TEXT_FIELDS}
+    projection["embeddingHash"] = 1
+    cursor = collection.find(query, projection).sort("_id", 1)
+
+    def run_batch(seq: int, batch: List[EmbeddingItem]):
+        local = EmbeddingStats()
+        ok = True
+        try:
+            request_bucket.acquire(1)
+            token_bucket.acquire(sum(item.tokens for item in batch))
+            embed_batch(collection, batch, local, retrying_embed)
+        except Exception as e:
+            ok = False
+            local.errors += len(batch)
+            print(f"❌ Batch starting at {batch[0].doc_id} failed: {e}")
+        finally:
+            in_flight.release()
+
+        with stats_lock:
+            stats.merge(local)
+        moved_to = watermark.finish(seq, batch[-1].doc_id, ok)
+        save_checkpoint(checkpoint["_id"], moved_to, local.docs)
+        if moved_to is not None:
+            print(f"💾 Partition {checkpoint['partition']} @ {moved_to} ({stats.docs_per_sec:.1f} docs/sec)")
+
+    # (future, first _id, size) only; holding the batches would undo the in_flight backpressure
+    futures: List[Tuple[Future, ObjectId, int]] = []
+    unchanged: List[object] = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for seq, batch in enumerate(iter_embedding_batches(cursor, max_inputs, max_tokens, scan_stats, unchanged)):
+            mark_checked(collection, unchanged)
+            in_flight.acquire()
+            futures.append((pool.submit(run_batch, seq, batch), batch[0].doc_id, len(batch)))
+        mark_checked(collection, unchanged)
+
+    # run_batch handles embedding errors itself; anything escaping it (checkpoint writes) surfaces here
+    failed_batches = 0
+    for future, first_id, size in futures:
+        try:
+            future.result()
+        except Exception as e:
+            failed_batches += 1
+            stats.errors += size
+            print(f"❌ Batch starting at {first_id} failed after embedding: {e}")
+    if failed_batches:
+        print(f"⚠️ Partition {checkpoint['partition']}: {failed_batches} batches failed")
+
+    stats.merge(scan_stats)
+    if stats.errors == 0:
+        save_checkpoint(checkpoint["_id"], None, 0, done=True)
+    return stats
+
+
+def run_worker(
+    partition: int = 0,
+    partitions: int = 1,
+    job: str = "sitemaps-backfill",
+    collection_name: str = "sitemaps",
+    **kwargs
+) -> EmbeddingStats:
+    collection = db[collection_name]
+    plan = plan_partitions(collection, partitions, job)
+    return run_partition(collection, plan[partition], **kwargs)
+
+
+def reset_job(job: str) -> None:
+    db[CHECKPOINT_COLLECTION].delete_many({"job": job})
+
+
+# === Main ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent, resumable sitemap embedding backfill")
+    parser.add_argument("--job", default="sitemaps-backfill")
+    parser.add_argument("--partition", type=int, default=0)
+    parser.add_argument("--partitions", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=3000, help="Max embedding requests per minute")
+    parser.add_argument("--tpm", type=float, default=1_000_000, help="Max embedding tokens per minute")
+    parser.add_argument("--rescan", action="store_true", help="Check every doc, re-embed those whose text changed")
+    parser.add_argument("--reset", action="store_true", help="Drop this job's checkpoints and exit")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset_job(args.job)
+        print(f"🗑️ Cleared checkpoints for job '{args.job}'")
+    else:
+        stats = run_worker(
+            partition=args.partition,
+            partitions=args.partitions,
+            job=args.job,
+            concurrency=args.concurrency,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            rescan=args.rescan
+        )
+        print(f"🎯 Partition {args.partition}/{args.partitions} complete: {stats.summary()}")
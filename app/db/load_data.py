@@ -1,65 +1,314 @@
+import argparse
+import hashlib
 import json
 import os
-from pymongo import MongoClient
-from bson import ObjectId
-from datetime import datetime
+import time
+from pymongo import MongoClient, ReplaceOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId, encode as bson_encode
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Sequence, Set, Tuple
 
 # === MongoDB connection ===
-MONGO_URI = "mongodb://localhost:27017"
-DB_NAME = "my_database"
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "my_database")
+DATA_DIR = os.getenv("DATA_DIR", "/home/ubuntu/Demand Genius/Demand-Genius/data")  # Folder where JSON files are stored
+
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "1000"))
+READ_CHUNK_SIZE = 1 << 20  # 1 MiB
+STAGING_SUFFIX = "__staging"
+
+# "swap": full reload into a staging collection, then atomic rename over the live one
+# "incremental": upsert only changed docs, delete docs missing from the file
+LOAD_MODES = ("swap", "incremental")
 
 client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 
-# === Utility to parse $oid and $date ===
-def parse_mongo_json(obj):
-    if isinstance(obj, dict):
+FILE_MAPPING = {
+    "categories.json": "categories",
+    "category_attributes.json": "category_attributes",
+    "sitemaps.json": "sitemaps"
+}
+
+# Incremental mode keys docs exported without an _id on these fields, so a
+# re-run updates the same doc instead of inserting a copy under a new ObjectId
+NATURAL_KEYS = {
+    "categories": ("tenant", "name"),
+    "category_attributes": ("tenant", "category", "name"),
+    "sitemaps": ("tenant", "fullUrl")
+}
+# Written by the embedding pipeline, not present in the exports
+DERIVED_FIELDS = ("embedding", "embeddingHash", "embeddingModel", "embeddingUpdatedAt", "embeddingCheckedAt")
+
+def extended_json_hook(obj: Dict):
+    """
+    json object_hook: converts Extended JSON wrappers while the decoder builds
+    each dict (bottom-up), so no second recursive pass over the document.
+    """
+    if len(obj) == 1:
         if "$oid" in obj:
             return ObjectId(obj["$oid"])
-        elif "$date" in obj:
-            return datetime.fromisoformat(obj["$date"].replace("Z", "+00:00"))
-        else:
-            return {k: parse_mongo_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [parse_mongo_json(i) for i in obj]
-    else:
-        return obj
+        if "$date" in obj:
+            value = obj["$date"]
+            if isinstance(value, str):
+                return datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if isinstance(value, int):  # {"$numberLong": ...} was converted first
+                return datetime.fromtimestamp(value / 1000.0, tz=timezone.utc)
+            return value
+        if "$numberLong" in obj:
+            return int(obj["$numberLong"])
+        if "$numberInt" in obj:
+            return int(obj["$numberInt"])
+        if "$numberDouble" in obj:
+            return float(obj["$numberDouble"])
+    return obj
+
+
+_decoder = json.JSONDecoder(object_hook=extended_json_hook)
+
+
+# === Streaming reader ===
+def iter_json_documents(filepath: str, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    Yield documents one at a time from a top-level JSON array, a single JSON
+    object, or NDJSON/concatenated objects (mongoexport's default), holding
+    only about one chunk plus one document in memory.
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        in_array = None
+
+        while True:
+            # Skip separators between documents
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                buffer, pos = f.read(chunk_size), 0
+                eof = not buffer
+
+            if pos >= len(buffer):
+                return
+
+            if in_array is None:
+                in_array = buffer[pos] == "["
+                if in_array:
+                    pos += 1
+                    continue
+            if in_array and buffer[pos] == "]":
+                return
+
+            try:
+                doc, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Document spans the chunk boundary: keep the tail and read more
+                more = f.read(chunk_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+
+            pos = end
+            yield doc
+            if pos > chunk_size:
+                buffer, pos = buffer[pos:], 0
+
 
 # === Function to load JSON files ===
 def load_json_file(filepath):
-    with open(filepath, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    if isinstance(data, list):
-        return [parse_mongo_json(doc) for doc in data]
-    else:
-        return [parse_mongo_json(data)]
+    return list(iter_json_documents(filepath))
 
-# === Main load function ===
-def load_data():
-    base_dir = "/home/ubuntu/Demand Genius/Demand-Genius/data"  # Folder where JSON files are stored
 
-    file_mapping = {
-        "categories.json": "categories",
-        "category_attributes.json": "category_attributes",
-        "sitemaps.json": "sitemaps"
-    }
+def insert_in_batches(collection, documents, batch_size: int = INSERT_BATCH_SIZE) -> int:
+    """Unordered insert_many per fixed-size batch; duplicates are skipped, not fatal."""
+    inserted = 0
+    batch: List[Dict] = []
+
+    def flush():
+        nonlocal inserted
+        try:
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get("nInserted", 0)
+            print(f"⚠️ {len(e.details.get('writeErrors', []))} docs rejected in '{collection.name}'")
+
+    for doc in documents:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    return inserted
+
 
-    for filename, collection_name in file_mapping.items():
+# === Full reload: staging collection + rename ===
+def copy_indexes(source, target):
+    """Recreate source's secondary indexes on target (built once, after the bulk insert)."""
+    for name, info in source.index_information().items():
+        if name == "_id_":
+            continue
+        options = {k: info[k] for k in ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression") if k in info}
+        target.create_index(info["key"], name=name, **options)
+
+
+def swap_load(collection_name: str, file_path: str, batch_size: int = INSERT_BATCH_SIZE, database=None) -> int:
+    """
+    Load into '<name>__staging', copy the live indexes, then renameCollection
+    with dropTarget: readers see the old data until the rename, never an empty collection.
+    """
+    database = database if database is not None else db
+    staging = database[collection_name + STAGING_SUFFIX]
+    staging.drop()
+    count = insert_in_batches(staging, iter_json_documents(file_path), batch_size)
+    if not count:
+        print(f"⚠️ No docs loaded for '{collection_name}'; keeping the live collection.")
+        return 0
+    if collection_name in database.list_collection_names():
+        copy_indexes(database[collection_name], staging)
+    staging.rename(collection_name, dropTarget=True)
+    return count
+
+
+# === Incremental mode: upsert changed, delete vanished ===
+def _fingerprint(doc: Dict) -> bytes:
+    return hashlib.sha256(bson_encode(doc)).digest()
+
+
+def _is_changed(incoming: Dict, existing: Dict) -> bool:
+    """
+    updatedAt decides when both sides have it; otherwise compare a hash of the
+    file's fields. Fields added server-side (e.g. embeddings) are not compared,
+    so unchanged docs keep them.
+    """
+    if existing is None:
+        return True
+    new_ts, old_ts = incoming.get("updatedAt"), existing.get("updatedAt")
+    if isinstance(new_ts, datetime) and isinstance(old_ts, datetime):
+        # Mongo stores naive UTC at millisecond precision
+        if new_ts.tzinfo is not None:
+            new_ts = new_ts.astimezone(timezone.utc).replace(tzinfo=None)
+        return new_ts.replace(microsecond=new_ts.microsecond // 1000 * 1000) != old_ts
+    return _fingerprint(incoming) != _fingerprint({k: existing.get(k) for k in incoming})
+
+
+def _natural_key(doc: Dict, fields: Sequence[str]) -> Tuple:
+    return tuple(str(doc.get(f)) for f in fields)
+
+
+def assign_ids(collection, batch: List[Dict], natural_key: Sequence[str]) -> None:
+    """
+    Give docs without an _id the _id of the stored doc with the same natural
+    key, or a new ObjectId the first time they are seen.
+    """
+    missing = [doc for doc in batch if "_id" not in doc]
+    if not missing:
+        return
+    known: Dict[Tuple, object] = {}
+    if natural_key:
+        query = {"$or": [{f: doc.get(f) for f in natural_key} for doc in missing]}
+        projection = {f: 1 for f in natural_key}
+        known = {_natural_key(d, natural_key): d["_id"] for d in collection.find(query, projection)}
+    for doc in missing:
+        key = _natural_key(doc, natural_key) if natural_key else None
+        doc["_id"] = known.get(key) or ObjectId()
+        if key is not None:
+            known[key] = doc["_id"]
+
+
+def incremental_load(
+    collection,
+    documents,
+    batch_size: int = INSERT_BATCH_SIZE,
+    natural_key: Sequence[str] = ()
+) -> Dict[str, int]:
+    """
+    Replace changed docs, skip unchanged ones, delete docs missing from the
+    file. Replaced docs keep their DERIVED_FIELDS (unless the file has them)
+    so a metadata edit doesn't throw away the stored embedding; the embedding
+    hash decides whether it is recomputed.
+    """
+    stats = {"seen": 0, "upserted": 0, "unchanged": 0, "deleted": 0}
+    seen: Set = set()
+
+    def flush(batch: List[Dict]):
+        assign_ids(collection, batch, natural_key)
+        ids = [doc["_id"] for doc in batch]
+        projection = {k: 1 for doc in batch for k in doc}
+        projection.update({k: 1 for k in DERIVED_FIELDS})
+        existing = {d["_id"]: d for d in collection.find({"_id": {"$in": ids}}, projection)}
+        ops = []
+        for doc in batch:
+            seen.add(doc["_id"])
+            old = existing.get(doc["_id"])
+            if not _is_changed(doc, old):
+                continue
+            if old is not None:
+                doc.update({k: old[k] for k in DERIVED_FIELDS if k in old and k not in doc})
+            ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        if ops:
+            collection.bulk_write(ops, ordered=False)
+        stats["upserted"] += len(ops)
+        stats["unchanged"] += len(batch) - len(ops)
+
+    batch: List[Dict] = []
+    for doc in documents:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    stats["seen"] = len(seen)
+
+    # Remove docs that are no longer in the export
+    vanished: List = []
+    for doc in collection.find({}, {"_id": 1}):
+        if doc["_id"] not in seen:
+            vanished.append(doc["_id"])
+            if len(vanished) >= batch_size:
+                stats["deleted"] += collection.delete_many({"_id": {"$in": vanished}}).deleted_count
+                vanished = []
+    if vanished:
+        stats["deleted"] += collection.delete_many({"_id": {"$in": vanished}}).deleted_count
+    return stats
+
+
+# === Main load function ===
+def load_data(base_dir: str = DATA_DIR, batch_size: int = INSERT_BATCH_SIZE, mode: str = "swap", database=None):
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode '{mode}'. Options: {LOAD_MODES}")
+    database = database if database is not None else db
+
+    for filename, collection_name in FILE_MAPPING.items():
         file_path = os.path.join(base_dir, filename)
         if not os.path.exists(file_path):
             print(f"⚠️ File not found: {file_path}")
             continue
 
-        # Drop collection if it exists
-        if collection_name in db.list_collection_names():
-            db[collection_name].drop()
-            print(f"🗑️ Dropped existing '{collection_name}' collection.")
+        started = time.perf_counter()
+        if mode == "incremental":
+            stats = incremental_load(
+                database[collection_name], iter_json_documents(file_path), batch_size, NATURAL_KEYS.get(collection_name, ())
+            )
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            print(f"🔄 '{collection_name}': {stats['upserted']} upserted, {stats['unchanged']} unchanged, "
+                  f"{stats['deleted']} deleted ({stats['seen'] / elapsed:.0f} docs/sec).")
+        else:
+            count = swap_load(collection_name, file_path, batch_size, database)
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            print(f"✅ Swapped in {count} docs for '{collection_name}' collection ({count / elapsed:.0f} docs/sec).")
 
-        # Load and insert new data
-        documents = load_json_file(file_path)
-        if documents:
-            db[collection_name].insert_many(documents)
-            print(f"✅ Inserted {len(documents)} docs into '{collection_name}' collection.")
 
 if __name__ == "__main__":
-    load_data()
+    parser = argparse.ArgumentParser(description="Load JSON exports into MongoDB")
+    parser.add_argument("--mode", choices=LOAD_MODES, default="swap")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--batch-size", type=int, default=INSERT_BATCH_SIZE)
+    args = parser.parse_args()
+    load_data(args.data_dir, args.batch_size, args.mode)
@@ -0,0 +1,258 @@
+# app/db/parallel_load.py
+"""
+Multi-process loader for large JSON exports.
+
+- Each file is split into byte ranges at document boundaries: lines starting
+  with "{" or ",{" at the indentation of the file's first document (one doc
+  per line / NDJSON, mongoexport --pretty, json.dump(indent=...)). A file
+  with no such lines is loaded as one range, with a warning
+- A process pool parses ranges ($oid/$date conversion included) and returns
+  batches already BSON-encoded, so the parent never re-encodes documents
+- Insert threads drain a bounded queue; when inserts fall behind, the queue
+  fills and no new ranges are submitted (backpressure)
+- Every file loads into a staging collection that is renamed over the live
+  one, unless some documents were rejected for reasons other than duplicate keys
+
+    python -m app.db.parallel_load --processes 8 --insert-workers 8
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+from bson import encode as bson_encode
+from bson.raw_bson import RawBSONDocument
+from pymongo.errors import BulkWriteError
+
+from app.db.load_data import (
+    DATA_DIR,
+    FILE_MAPPING,
+    INSERT_BATCH_SIZE,
+    STAGING_SUFFIX,
+    _decoder,
+    copy_indexes,
+    db,
+)
+
+CHUNK_BYTES = int(os.getenv("LOAD_CHUNK_BYTES", str(64 << 20)))  # 64 MiB
+_SEPARATORS = " \t\r\n,[]"
+_INDENT = b" \t"
+DUPLICATE_KEY = 11000
+
+ByteRange = Tuple[int, int]
+
+
+# === Splitting ===
+def record_indent(f) -> Optional[bytes]:
+    """Leading whitespace of the first document's opening line ("[{" counts), or None if there is none."""
+    f.seek(0)
+    for line in f:
+        body = line.lstrip(_INDENT)
+        if body.lstrip(b"[").lstrip(_INDENT).startswith(b"{"):
+            return line[:len(line) - len(body)]
+    return None
+
+
+def chunk_ranges(filepath: str, chunk_bytes: int = CHUNK_BYTES) -> List[ByteRange]:
+    """
+    Byte ranges that each start at a document boundary: a line that opens a
+    document at the same indentation as the first one. Nested objects are
+    indented deeper, so they never match. A file with no line breaks between
+    documents (compact single-line array) comes back as one range.
+    """
+    size = os.path.getsize(filepath)
+    starts = [0]
+    with open(filepath, "rb") as f:
+        indent = record_indent(f)
+        boundaries = (indent + b"{", indent + b",{") if indent is not None else ()
+        target = chunk_bytes
+        while boundaries and target < size:
+            f.seek(target)
+            f.readline()  # finish the partial line
+            pos = f.tell()
+            line = f.readline()
+            while line and not line.startswith(boundaries):
+                pos = f.tell()
+                line = f.readline()
+            if not line:
+                break
+            if pos > starts[-1]:
+                starts.append(pos)
+            target = max(pos, target) + chunk_bytes
+    if len(starts) == 1 and size > chunk_bytes:
+        print(f"⚠️ No document boundaries found in {filepath}; parsing it as a single range.")
+    return list(zip(starts, starts[1:] + [size]))
+
+
+# === Parsing (runs in worker processes) ===
+def parse_range(filepath: str, start: int, end: int, batch_size: int = INSERT_BATCH_SIZE) -> List[List[bytes]]:
+    """Decode the documents in [start, end) and return them BSON-encoded, in batches."""
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode("utf-8")
+
+    batches: List[List[bytes]] = []
+    batch: List[bytes] = []
+    pos, length = 0, len(text)
+    while True:
+        while pos < length and text[pos] in _SEPARATORS:
+            pos += 1
+        if pos >= length:
+            break
+        doc, pos = _decoder.raw_decode(text, pos)
+        batch.append(bson_encode(doc))
+        if len(batch) >= batch_size:
+            batches.append(batch)
+            batch = []
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# === Loading ===
+class _FileState:
+    __slots__ = ("collection_name", "ranges", "inserted", "duplicates", "rejected")
+
+    def __init__(self, collection_name: str, ranges: int):
+        self.collection_name = collection_name
+        self.ranges = ranges
+        self.inserted = 0
+        self.duplicates = 0
+        self.rejected = 0  # anything but duplicate keys; blocks the swap
+
+
+def _insert_worker(work: "queue.Queue", database, states: Dict[str, _FileState], lock: threading.Lock, errors: List[BaseException]):
+    while True:
+        item = work.get()
+        if item is None:
+            return
+        collection_name, raw_batch = item
+        staging = database[collection_name + STAGING_SUFFIX]
+        docs = [RawBSONDocument(raw) for raw in raw_batch]
+        duplicates = rejected = 0
+        try:
+            inserted = len(staging.insert_many(docs, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            inserted = e.details.get("nInserted", 0)
+            for error in e.details.get("writeErrors", []):
+                if error.get("code") == DUPLICATE_KEY:
+                    duplicates += 1
+                else:
+                    rejected += 1
+        except BaseException as e:  # surfaced to the caller after the queue drains
+            errors.append(e)
+            inserted, rejected = 0, len(docs)
+        with lock:
+            states[collection_name].inserted += inserted
+            states[collection_name].duplicates += duplicates
+            states[collection_name].rejected += rejected
+
+
+def publish(database, state: _FileState, started: float) -> Optional[Dict[str, float]]:
+    """
+    Rename the staging collection over the live one, or drop it when nothing
+    was loaded or some documents were rejected for non-duplicate errors.
+    """
+    staging = database[state.collection_name + STAGING_SUFFIX]
+    if state.rejected:
+        staging.drop()
+        print(f"❌ {state.rejected} docs rejected for '{state.collection_name}'; keeping the live collection.")
+        return None
+    if not state.inserted:
+        print(f"⚠️ No docs loaded for '{state.collection_name}'; keeping the live collection.")
+        return None
+    if state.collection_name in database.list_collection_names():
+        copy_indexes(database[state.collection_name], staging)
+    staging.rename(state.collection_name, dropTarget=True)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Swapped in {state.inserted} docs for '{state.collection_name}' collection "
+          f"({state.inserted / max(elapsed, 1e-9):.0f} docs/sec).")
+    return {"docs": state.inserted, "duplicates": state.duplicates, "seconds": round(elapsed, 3)}
+
+
+def parallel_load(
+    base_dir: str = DATA_DIR,
+    processes: Optional[int] = None,
+    insert_workers: int = 4,
+    chunk_bytes: int = CHUNK_BYTES,
+    batch_size: int = INSERT_BATCH_SIZE,
+    max_queued_batches: Optional[int] = None,
+    database=None
+) -> Dict[str, Dict[str, float]]:
+    """
+    Load every file in FILE_MAPPING concurrently. Returns per-collection
+    {"docs", "duplicates", "seconds"} for the collections swapped in; a
+    collection is swapped in only if all its batches were written without
+    non-duplicate errors.
+    """
+    database = database if database is not None else db
+    processes = processes or os.cpu_count() or 1
+    max_queued_batches = max_queued_batches or insert_workers * 4
+
+    tasks: List[Tuple[str, str, ByteRange]] = []
+    states: Dict[str, _FileState] = {}
+    for filename, collection_name in FILE_MAPPING.items():
+        file_path = os.path.join(base_dir, filename)
+        if not os.path.exists(file_path):
+            print(f"⚠️ File not found: {file_path}")
+            continue
+        ranges = chunk_ranges(file_path, chunk_bytes)
+        states[collection_name] = _FileState(collection_name, len(ranges))
+        database[collection_name + STAGING_SUFFIX].drop()
+        tasks.extend((collection_name, file_path, r) for r in ranges)
+
+    work: "queue.Queue" = queue.Queue(maxsize=max_queued_batches)
+    lock = threading.Lock()
+    errors: List[BaseException] = []
+    threads = [
+        threading.Thread(target=_insert_worker, args=(work, database, states, lock, errors), daemon=True)
+        for _ in range(insert_workers)
+    ]
+    for t in threads:
+        t.start()
+
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            pending = {}
+            next_task = 0
+            while next_task < len(tasks) or pending:
+                # At most 2 ranges per process parsed ahead of the inserters
+                while next_task < len(tasks) and len(pending) < processes * 2:
+                    collection_name, file_path, (start, end) = tasks[next_task]
+                    pending[pool.submit(parse_range, file_path, start, end, batch_size)] = collection_name
+                    next_task += 1
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collection_name = pending.pop(future)
+                    for raw_batch in future.result():
+                        work.put((collection_name, raw_batch))  # blocks while inserters are behind
+    finally:
+        for _ in threads:
+            work.put(None)
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+
+    results: Dict[str, Dict[str, float]] = {}
+    for collection_name, state in states.items():
+        result = publish(database, state, started)
+        if result is not None:
+            results[collection_name] = result
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel JSON export loader")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--insert-workers", type=int, default=4)
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES >> 20)
+    parser.add_argument("--batch-size", type=int, default=INSERT_BATCH_SIZE)
+    args = parser.parse_args()
+    parallel_load(args.data_dir, args.processes, args.insert_workers, args.chunk_mb << 20, args.batch_size)
@@ -0,0 +1,112 @@
+# app/db/stub_embedding_server.py
+"""
+Local stand-in for the OpenAI /v1/embeddings endpoint.
+
+Returns deterministic vectors derived from each input's hash, so batching,
+bulk writes and throughput can be exercised without network access:
+
+    python -m app.db.stub_embedding_server --port 8089 --latency-ms 50
+    OPENAI_BASE_URL=http://localhost:8089/v1 OPENAI_API_KEY=stub python -m app.db.generate_embedding
+"""
+import argparse
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import numpy as np
+
+DEFAULT_DIMENSIONS = 1536
+
+
+def stub_vector(text: str, dimensions: int = DEFAULT_DIMENSIONS) -> np.ndarray:
+    """Unit-length float32 vector seeded by the text hash."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+class StubEmbeddingHandler(BaseHTTPRequestHandler):
+    dimensions = DEFAULT_DIMENSIONS
+    latency_s = 0.0
+    max_inputs = 2048
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        inputs = body.get("input", [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if len(inputs) > self.max_inputs:
+            self._send(400, {"error": {"message": f"Too many inputs: {len(inputs)} > {self.max_inputs}"}})
+            return
+
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+        as_base64 = body.get("encoding_format") == "base64"
+        data = []
+        for i, text in enumerate(inputs):
+            vec = stub_vector(text, self.dimensions)
+            embedding = base64.b64encode(vec.astype("<f4").tobytes()).decode("ascii") if as_base64 else vec.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        tokens = sum(max(1, len(text) // 4) for text in inputs)
+        self._send(200, {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    def _send(self, status: int, payload: dict):
+        raw = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(
+    port: int = 0,
+    dimensions: int = DEFAULT_DIMENSIONS,
+    latency_ms: float = 0.0,
+    handler_cls=StubEmbeddingHandler
+) -> ThreadingHTTPServer:
+    """Start the stub in a background thread; base URL is http://127.0.0.1:<server.server_port>/v1."""
+    handler = type("ConfiguredStubHandler", (handler_cls,), {
+        "dimensions": dimensions,
+        "latency_s": latency_ms / 1000.0
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Stub OpenAI embeddings endpoint")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    server = start_stub_server(args.port, args.dimensions, args.latency_ms)
+    print(f"🧪 Stub embeddings at http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
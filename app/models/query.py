@@ -0,0 +1,25 @@
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class QueryRequest(BaseModel):
+    tenant: str = Field(..., description="Tenant ObjectId (hex)")
+    query: Optional[str] = Field(None, description="Natural-language query; parsed unless `parsed` is given")
+    parsed: Optional[Dict[str, Any]] = Field(None, description="Output of a previous /parse call, skips the LLM")
+    priority: Literal["interactive", "batch"] = "interactive"
+
+
+class ParseRequest(BaseModel):
+    tenant: str = Field(..., description="Tenant ObjectId (hex)")
+    query: str
+    priority: Literal["interactive", "batch"] = "interactive"
+
+
+class SearchRequest(QueryRequest):
+    k: int = Field(10, ge=1, le=1000)
+
+
+class ExportRequest(QueryRequest):
+    format: Literal["ndjson", "csv"] = "ndjson"
+    limit: Optional[int] = Field(None, ge=1, description="Defaults to the parsed query's limit, else every match")
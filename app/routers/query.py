@@ -0,0 +1,87 @@
+"""
+Query endpoints. Handlers are plain `def`s: pymongo and NumPy block, so
+Starlette runs them in its worker thread pool (size: API_THREADS).
+"""
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.models.query import ExportRequest, ParseRequest, QueryRequest, SearchRequest
+from app.services.retrieval_service import EXPORT_FORMATS, to_jsonable
+from app.services.service_state import ServiceState
+
+router = APIRouter()
+
+
+def get_state(request: Request) -> ServiceState:
+    return request.app.state.service
+
+
+def ready_state(request: Request) -> ServiceState:
+    """Reject work until warm-up has finished, so nothing hits a cold index."""
+    state = get_state(request)
+    if not state.ready.is_set():
+        raise HTTPException(status_code=503, detail=state.status(), headers={"Retry-After": "5"})
+    return state
+
+
+def resolve_parsed(body: QueryRequest, state: ServiceState) -> Dict[str, Any]:
+    if body.parsed is not None:
+        return body.parsed
+    if not body.query:
+        raise HTTPException(status_code=422, detail="Either `query` or `parsed` is required")
+    return state.parse(body.tenant, body.query, body.priority)
+
+
+# ----------------------------
+# Health
+# ----------------------------
+@router.get("/health/live")
+def live():
+    return {"status": "ok"}
+
+
+@router.get("/health/ready")
+def ready(state: ServiceState = Depends(get_state)):
+    if not state.ready.is_set():
+        raise HTTPException(status_code=503, detail=state.status())
+    return state.status()
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+@router.post("/parse")
+def parse(body: ParseRequest, state: ServiceState = Depends(ready_state)):
+    return to_jsonable(state.parse(body.tenant, body.query, body.priority))
+
+
+@router.post("/search")
+def search(body: SearchRequest, state: ServiceState = Depends(ready_state)):
+    parsed = resolve_parsed(body, state)
+    return {"parsed": to_jsonable(parsed), "results": to_jsonable(state.search(parsed, body.tenant, body.k, body.priority))}
+
+
+@router.post("/count")
+def count(body: QueryRequest, state: ServiceState = Depends(ready_state)):
+    parsed = resolve_parsed(body, state)
+    return {"parsed": to_jsonable(parsed), "count": state.count(parsed, body.tenant, body.priority)}
+
+
+@router.post("/aggregate")
+def aggregate(body: QueryRequest, state: ServiceState = Depends(ready_state)):
+    parsed = resolve_parsed(body, state)
+    return {"parsed": to_jsonable(parsed), "result": to_jsonable(state.aggregate(parsed, body.tenant, body.priority))}
+
+
+@router.post("/export")
+def export(body: ExportRequest, state: ServiceState = Depends(ready_state)):
+    """Every matching page as NDJSON or CSV, streamed from the cursor."""
+    parsed = resolve_parsed(body, state)
+    chunks = state.export(parsed, body.tenant, body.format, body.limit, body.priority)
+    _, media_type = EXPORT_FORMATS[body.format]
+    return StreamingResponse(
+        chunks, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="export.{body.format}"'}
+    )
@@ -0,0 +1,454 @@
+"""
+Approximate nearest-neighbour index (IVF with optional residual PQ) over
+sitemap embeddings, for tenants too large for brute-force cosine.
+
+- Coarse quantizer: spherical k-means into `nlist` inverted lists
+- Lists stored contiguously (sorted by list) so each probe is one slice
+- Optional product quantization of residuals (pq_m bytes per vector)
+- `nprobe` trades recall for latency at query time
+- Built offline, saved as plain .npy files and memory-mapped at query time
+- New pages are added incrementally to pending buffers until compact()
+- synced_at (saved with the index) lets VectorStoreRegistry catch an opened
+  index up with pages embedded after it was built
+
+    python -m app.services.ann_index --tenant <id> --nlist 1024 --pq-m 64
+"""
+import argparse
+import json
+import logging
+import math
+import os
+from datetime import datetime, timezone
+from threading import RLock
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from bson import ObjectId
+
+from app.services.get_category_id import to_object_id
+from app.services.vector_store import VECTOR_STORE_DIR, SearchHit, TenantVectorStore, normalize_rows, top_k
+
+logger = logging.getLogger(__name__)
+
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", VECTOR_STORE_DIR)
+# Below this many vectors exact search is fast enough
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "50000"))
+PQ_CENTROIDS = 256
+ASSIGN_CHUNK = 32768
+
+
+# ----------------------------
+# k-means
+# ----------------------------
+def assign_clusters(x: np.ndarray, centroids: np.ndarray, spherical: bool = True) -> np.ndarray:
+    """Nearest centroid per row (max inner product if spherical, else min L2), chunked."""
+    out = np.empty(x.shape[0], dtype=np.int32)
+    c_norms = None if spherical else (centroids * centroids).sum(axis=1)
+    for start in range(0, x.shape[0], ASSIGN_CHUNK):
+        sims = x[start:start + ASSIGN_CHUNK] @ centroids.T
+        if spherical:
+            out[start:start + ASSIGN_CHUNK] = np.argmax(sims, axis=1)
+        else:
+            out[start:start + ASSIGN_CHUNK] = np.argmin(c_norms - 2.0 * sims, axis=1)
+    return out
+
+
+def kmeans(x: np.ndarray, k: int, iters: int = 20, spherical: bool = True, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means; empty clusters are re-seeded from random points."""
+    rng = np.random.default_rng(seed)
+    n = x.shape[0]
+    k = min(k, n)
+    centroids = x[rng.choice(n, k, replace=False)].astype(np.float32, copy=True)
+
+    for _ in range(iters):
+        assign = assign_clusters(x, centroids, spherical)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=k)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+
+        sums = np.add.reduceat(x[order], starts, axis=0)
+        centroids[nonempty] = sums / counts[nonempty, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = x[rng.choice(n, len(empty), replace=False)]
+        if spherical:
+            normalize_rows(centroids)
+    return centroids
+
+
+# ----------------------------
+# Index
+# ----------------------------
+class _Lists:
+    """
+    Everything search reads besides centroids and codebooks: the contiguous
+    lists, their tombstones and the pending inserts. compact() builds a new one
+    and swaps it in with one assignment, so a concurrent search works on either
+    the old or the new lists, never a mix.
+    """
+    __slots__ = (
+        "offsets", "data", "raw_ids", "deleted", "deleted_count",
+        "pending_lists", "pending_ids", "pending_data", "pending_removed", "pending_cache"
+    )
+
+    def __init__(self, offsets: np.ndarray, data: Optional[np.ndarray], raw_ids: np.ndarray):
+        self.offsets = offsets
+        self.data = data                              # (n, d) f32 or (n, m) u8
+        self.raw_ids = raw_ids
+        self.deleted: Optional[np.ndarray] = None     # bool mask over rows, lazily allocated
+        self.deleted_count = 0
+        # Incremental inserts not yet merged into the contiguous lists
+        self.pending_lists: List[int] = []
+        self.pending_ids: List[ObjectId] = []
+        self.pending_data: List[np.ndarray] = []
+        self.pending_removed = 0
+        self.pending_cache: Optional[Tuple[np.ndarray, np.ndarray, int]] = None
+
+
+class IVFIndex:
+    """
+    Inverted-file index. Rows are grouped by coarse list; list l occupies
+    rows offsets[l]:offsets[l + 1] of `data` (float32 vectors, or uint8 PQ
+    codes of the residual to the list centroid when pq_m > 0).
+    """
+
+    def __init__(self, dimensions: int, nlist: int, pq_m: int = 0, nprobe: int = 8):
+        if pq_m and dimensions % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide dimensions={dimensions}")
+        self.dimensions = dimensions
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.nprobe = nprobe
+
+        self.centroids: Optional[np.ndarray] = None   # (nlist, d)
+        self.codebooks: Optional[np.ndarray] = None   # (m, 256, d/m)
+        self._lists = _Lists(np.zeros(nlist + 1, dtype=np.int64), None, np.empty((0, 12), dtype=np.uint8))
+        # Newest embeddingUpdatedAt the index reflects (naive UTC)
+        self.synced_at: Optional[datetime] = None
+        self._id_rows: Optional[Dict[ObjectId, Tuple[bool, int]]] = None
+        self._lock = RLock()
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._lists.offsets
+
+    @property
+    def data(self) -> Optional[np.ndarray]:
+        return self._lists.data
+
+    @property
+    def raw_ids(self) -> np.ndarray:
+        return self._lists.raw_ids
+
+    @property
+    def size(self) -> int:
+        lists = self._lists
+        return lists.raw_ids.shape[0] - lists.deleted_count + len(lists.pending_lists) - lists.pending_removed
+
+    def doc_ids(self) -> Set[ObjectId]:
+        """Ids of every live row (main lists and pending inserts)."""
+        with self._lock:
+            return set(self._ensure_id_rows())
+
+    @staticmethod
+    def default_nlist(n: int) -> int:
+        return max(1, min(int(4 * math.sqrt(n)), 65536))
+
+    # ----------------------------
+    # Build
+    # ----------------------------
+    @classmethod
+    def build(
+        cls,
+        ids: Sequence[ObjectId],
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        pq_m: int = 0,
+        nprobe: int = 8,
+        train_size: int = 100_000,
+        iters: int = 20,
+        seed: int = 0
+    ) -> "IVFIndex":
+        vectors = normalize_rows(np.array(vectors, dtype=np.float32))
+        n, d = vectors.shape
+        index = cls(d, nlist or cls.default_nlist(n), pq_m, nprobe)
+
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, min(n, train_size), replace=False)] if n > train_size else vectors
+        index.centroids = kmeans(sample, index.nlist, iters, spherical=True, seed=seed)
+        index.nlist = index.centroids.shape[0]
+
+        lists = assign_clusters(vectors, index.centroids)
+        if pq_m:
+            residuals = sample - index.centroids[assign_clusters(sample, index.centroids)]
+            index.codebooks = index._train_pq(residuals, iters, seed)
+
+        order = np.argsort(lists, kind="stable")
+        counts = np.bincount(lists, minlength=index.nlist)
+        sorted_vectors = vectors[order]
+        index._lists = _Lists(
+            np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+            index._encode(sorted_vectors, lists[order]) if pq_m else sorted_vectors,
+            np.frombuffer(b"".join(ids[i].binary for i in order), dtype=np.uint8).reshape(-1, 12)
+        )
+        return index
+
+    @classmethod
+    def from_store(cls, store: TenantVectorStore, **kwargs) -> "IVFIndex":
+        index = cls.build(store.ids, store.matrix, **kwargs)
+        index.synced_at = store.synced_at
+        return index
+
+    def _train_pq(self, residuals: np.ndarray, iters: int, seed: int) -> np.ndarray:
+        dsub = self.dimensions // self.pq_m
+        books = np.empty((self.pq_m, PQ_CENTROIDS, dsub), dtype=np.float32)
+        for j in range(self.pq_m):
+            sub = np.ascontiguousarray(residuals[:, j * dsub:(j + 1) * dsub])
+            trained = kmeans(sub, PQ_CENTROIDS, iters, spherical=False, seed=seed + j)
+            books[j, :trained.shape[0]] = trained
+            books[j, trained.shape[0]:] = trained[0]
+        return books
+
+    def _encode(self, vectors: np.ndarray, lists: np.ndarray) -> np.ndarray:
+        dsub = self.dimensions // self.pq_m
+        residuals = vectors - self.centroids[lists]
+        codes = np.empty((vectors.shape[0], self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            sub = np.ascontiguousarray(residuals[:, j * dsub:(j + 1) * dsub])
+            codes[:, j] = assign_clusters(sub, self.codebooks[j], spherical=False)
+        return codes
+
+    # ----------------------------
+    # Incremental updates
+    # ----------------------------
+    def add(self, ids: Sequence[ObjectId], vectors: np.ndarray) -> None:
+        """Insert newly embedded pages (re-adding an id replaces its old row)."""
+        vectors = normalize_rows(np.array(vectors, dtype=np.float32, ndmin=2))
+        lists = assign_clusters(vectors, self.centroids)
+        encoded = self._encode(vectors, lists) if self.pq_m else vectors
+
+        with self._lock:
+            id_rows = self._ensure_id_rows()
+            state = self._lists
+            for doc_id, list_no, row in zip(ids, lists, encoded):
+                self._remove_locked(doc_id)
+                id_rows[doc_id] = (True, len(state.pending_ids))
+                state.pending_ids.append(doc_id)
+                state.pending_lists.append(int(list_no))
+                state.pending_data.append(row)
+
+    def remove(self, doc_id: ObjectId) -> bool:
+        with self._lock:
+            return self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: ObjectId) -> bool:
+        location = self._ensure_id_rows().pop(doc_id, None)
+        if location is None:
+            return False
+        pending, row = location
+        state = self._lists
+        if pending:
+            state.pending_lists[row] = -1  # never probed
+            state.pending_removed += 1
+            state.pending_cache = None
+        else:
+            if state.deleted is None:
+                state.deleted = np.zeros(state.raw_ids.shape[0], dtype=bool)
+            state.deleted[row] = True
+            state.deleted_count += 1
+        return True
+
+    def _ensure_id_rows(self) -> Dict[ObjectId, Tuple[bool, int]]:
+        if self._id_rows is None:
+            state = self._lists
+            self._id_rows = {ObjectId(raw.tobytes()): (False, i) for i, raw in enumerate(state.raw_ids)}
+            for i, doc_id in enumerate(state.pending_ids):
+                if state.pending_lists[i] >= 0:
+                    self._id_rows[doc_id] = (True, i)
+        return self._id_rows
+
+    def compact(self) -> None:
+        """Merge pending inserts and drop deleted rows, restoring one contiguous slice per list."""
+        with self._lock:
+            state = self._lists
+            keep = np.ones(state.raw_ids.shape[0], dtype=bool) if state.deleted is None else ~state.deleted
+            main_lists = np.repeat(np.arange(self.nlist), np.diff(state.offsets))[keep]
+            data = [np.asarray(state.data[keep])]
+            raw_ids = [state.raw_ids[keep]]
+            lists = [main_lists]
+
+            live = [i for i, l in enumerate(state.pending_lists) if l >= 0]
+            if live:
+                data.append(np.vstack([state.pending_data[i] for i in live]))
+                raw_ids.append(np.frombuffer(b"".join(state.pending_ids[i].binary for i in live), dtype=np.uint8).reshape(-1, 12))
+                lists.append(np.array([state.pending_lists[i] for i in live]))
+
+            all_lists = np.concatenate(lists)
+            order = np.argsort(all_lists, kind="stable")
+            self._lists = _Lists(
+                np.concatenate(([0], np.cumsum(np.bincount(all_lists, minlength=self.nlist)))).astype(np.int64),
+                np.concatenate(data)[order],
+                np.concatenate(raw_ids)[order]
+            )
+            self._id_rows = None
+
+    # ----------------------------
+    # Search
+    # ----------------------------
+    def search(
+        self,
+        query,
+        k: int = 10,
+        nprobe: Optional[int] = None,
+        rerank_store: Optional[TenantVectorStore] = None,
+        refine: int = 4
+    ) -> List[SearchHit]:
+        """
+        Top-k by (approximate) cosine. With PQ, pass the tenant's exact
+        TenantVectorStore as rerank_store to re-score a k * refine shortlist.
+        """
+        if self.pq_m and rerank_store is not None:
+            shortlist = self.search(query, k * refine, nprobe)
+            rows = [rerank_store.row_of(doc_id) for doc_id, _ in shortlist]
+            kept = [(doc_id, row) for (doc_id, _), row in zip(shortlist, rows) if row is not None]
+            if kept:
+                q = np.array(query, dtype=np.float32).reshape(-1)
+                exact = rerank_store.matrix[[row for _, row in kept]] @ (q / (np.linalg.norm(q) or 1.0))
+                return [(kept[i][0], float(exact[i])) for i in top_k(exact, k)]
+            return shortlist[:k]
+
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        q = np.array(query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(q)
+        if norm:
+            q /= norm
+
+        state = self._lists  # one read: compact() may swap in new lists meanwhile
+        coarse = self.centroids @ q
+        probe = top_k(coarse, nprobe)
+        table = self._pq_table(q) if self.pq_m else None
+
+        scores, rows = [], []
+        for list_no in probe:
+            start, end = state.offsets[list_no], state.offsets[list_no + 1]
+            if start == end:
+                continue
+            scores.append(self._score(state.data[start:end], q, coarse[list_no], table))
+            rows.append(np.arange(start, end))
+
+        candidate_scores = np.concatenate(scores) if scores else np.empty(0, dtype=np.float32)
+        candidate_rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        if state.deleted is not None and len(candidate_rows):
+            candidate_scores = np.where(state.deleted[candidate_rows], -np.inf, candidate_scores)
+
+        hits = [
+            (ObjectId(state.raw_ids[candidate_rows[i]].tobytes()), float(candidate_scores[i]))
+            for i in top_k(candidate_scores, k) if np.isfinite(candidate_scores[i])
+        ] if len(candidate_rows) else []
+
+        pending_hits = self._search_pending(state, q, coarse, probe, table, k)
+        if pending_hits:
+            hits = sorted(hits + pending_hits, key=lambda h: -h[1])[:k]
+        return hits
+
+    def _score(self, block: np.ndarray, q: np.ndarray, coarse_score: float, table: Optional[np.ndarray]) -> np.ndarray:
+        if table is None:
+            return block @ q
+        # Asymmetric distance: q . (centroid + residual) = q . centroid + sum_j table[j, code_j]
+        return coarse_score + table[np.arange(self.pq_m), block].sum(axis=1)
+
+    def _pq_table(self, q: np.ndarray) -> np.ndarray:
+        dsub = self.dimensions // self.pq_m
+        return np.einsum("mcd,md->mc", self.codebooks, q.reshape(self.pq_m, dsub))
+
+    def _search_pending(self, state: _Lists, q, coarse, probe, table, k) -> List[SearchHit]:
+        if not state.pending_ids:
+            return []
+        with self._lock:
+            # Rebuilt after removals (pending_cache = None) or when inserts were appended
+            if state.pending_cache is None or state.pending_cache[2] != len(state.pending_ids):
+                state.pending_cache = (np.array(state.pending_lists), np.vstack(state.pending_data), len(state.pending_ids))
+            lists, data, _ = state.pending_cache
+            ids = state.pending_ids
+        mask = np.isin(lists, probe)
+        if not mask.any():
+            return []
+        rows = np.flatnonzero(mask)
+        if table is None:
+            scores = data[rows] @ q
+        else:
+            scores = coarse[lists[rows]] + table[np.arange(self.pq_m), data[rows]].sum(axis=1)
+        return [(ids[rows[i]], float(scores[i])) for i in top_k(scores, k)]
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def save(self, directory: str, name: str) -> str:
+        """Write <name>.ivf.*.npy files (pending inserts are compacted first)."""
+        if self._lists.pending_ids or self._lists.deleted is not None:
+            self.compact()
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f"{name}.ivf")
+        np.save(f"{base}.centroids.npy", self.centroids)
+        np.save(f"{base}.offsets.npy", self.offsets)
+        np.save(f"{base}.data.npy", self.data)
+        np.save(f"{base}.ids.npy", self.raw_ids)
+        if self.pq_m:
+            np.save(f"{base}.codebooks.npy", self.codebooks)
+        with open(f"{base}.meta.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "dimensions": self.dimensions,
+                "nlist": self.nlist,
+                "pq_m": self.pq_m,
+                "nprobe": self.nprobe,
+                "synced_at": self.synced_at.isoformat() if self.synced_at else None
+            }, f)
+        return base
+
+    @classmethod
+    def open(cls, directory: str, name: str, mmap: bool = True) -> Optional["IVFIndex"]:
+        base = os.path.join(directory, f"{name}.ivf")
+        if not os.path.exists(f"{base}.meta.json"):
+            return None
+        with open(f"{base}.meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        mode = "r" if mmap else None
+        index = cls(meta["dimensions"], meta["nlist"], meta["pq_m"], meta["nprobe"])
+        index.centroids = np.load(f"{base}.centroids.npy")
+        index._lists = _Lists(
+            np.load(f"{base}.offsets.npy"),
+            np.load(f"{base}.data.npy", mmap_mode=mode),
+            np.load(f"{base}.ids.npy", mmap_mode=mode)
+        )
+        if index.pq_m:
+            index.codebooks = np.load(f"{base}.codebooks.npy")
+        if meta.get("synced_at"):
+            index.synced_at = datetime.fromisoformat(meta["synced_at"])
+        else:
+            # Saved before synced_at was recorded: the file time is the best bound we have
+            mtime = os.path.getmtime(f"{base}.meta.json")
+            index.synced_at = datetime.fromtimestamp(mtime, timezone.utc).replace(tzinfo=None)
+        return index
+
+
+def open_tenant_index(tenant_id: Union[str, ObjectId], directory: str = ANN_INDEX_DIR) -> Optional[IVFIndex]:
+    return IVFIndex.open(directory, str(to_object_id(tenant_id)))
+
+
+if __name__ == "__main__":
+    from app.services.mongo_client import get_mongo_client
+
+    parser = argparse.ArgumentParser(description="Build an IVF(-PQ) index for one tenant's sitemap embeddings")
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--pq-m", type=int, default=0, help="PQ sub-vectors (bytes/vector); 0 stores float32")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--directory", default=ANN_INDEX_DIR)
+    args = parser.parse_args()
+
+    store = TenantVectorStore.from_collection(get_mongo_client()["sitemaps"], args.tenant)
+    index = IVFIndex.from_store(store, nlist=args.nlist, pq_m=args.pq_m, nprobe=args.nprobe)
+    path = index.save(args.directory, str(store.tenant_id))
+    print(f"✅ Built IVF index for {store.size} vectors ({index.nlist} lists, pq_m={index.pq_m}) at {path}")
@@ -1,28 +1,298 @@
+import logging
+import sys
+from threading import RLock
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
 from bson import ObjectId
 from pymongo.collection import Collection
-from typing import Optional
+from pymongo.database import Database
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_COLLECTION = "categories"
+CATEGORY_ATTR_COLLECTION = "category_attributes"
+
+
+def normalize_key(name: str) -> str:
+    """
+    Case/whitespace-insensitive lookup key:
+    "  Funnel   STAGE " -> "funnel stage"
+    """
+    return sys.intern(" ".join(str(name).split()).casefold())
+
+
+def to_object_id(value: Union[str, ObjectId]) -> ObjectId:
+    if isinstance(value, ObjectId):
+        return value
+    try:
+        return ObjectId(str(value))
+    except Exception as e:
+        raise ValueError(f"Invalid id; expected ObjectId or hex string. Got: {value}") from e
+
+
+class _TenantCategories:
+    """
+    Immutable per-tenant maps. A refresh builds a new instance and swaps it in,
+    so readers never see a half-loaded tenant.
+    """
+    __slots__ = ("category_ids", "category_names", "attribute_ids", "attributes", "attributes_by_name", "vocabulary")
+
+    def __init__(self):
+        # normalized category name -> category ObjectId
+        self.category_ids: Dict[str, ObjectId] = {}
+        # category ObjectId -> display name
+        self.category_names: Dict[ObjectId, str] = {}
+        # (category ObjectId, normalized attribute name) -> attribute ObjectId
+        self.attribute_ids: Dict[Tuple[ObjectId, str], ObjectId] = {}
+        # attribute ObjectId -> (category ObjectId, display name)
+        self.attributes: Dict[ObjectId, Tuple[ObjectId, str]] = {}
+        # normalized attribute name -> {category ObjectId: attribute ObjectId}
+        self.attributes_by_name: Dict[str, Dict[ObjectId, ObjectId]] = {}
+        # category display name -> attribute display names, built on first tenant_vocabulary()
+        self.vocabulary: Optional[Dict[str, List[str]]] = None
+
+
+class CategoryIndex:
+    """
+    Process-wide, multi-tenant index of categories and category attributes.
+
+    Provides O(1) lookups for:
+    - category name -> category ObjectId
+    - (category, attribute name) -> attribute ObjectId
+    - attribute ObjectId -> (category name, attribute name)
+
+    Names are matched case/whitespace-insensitively. Used to resolve filters
+    straight to attribute ids so pipelines can $match instead of $lookup.
+    """
+
+    def __init__(self):
+        self._tenants: Dict[ObjectId, _TenantCategories] = {}
+        # attribute ObjectId -> tenant ObjectId (attribute ids are globally unique)
+        self._attribute_tenant: Dict[ObjectId, ObjectId] = {}
+        self._lock = RLock()
+
+    # ----------------------------
+    # Loading
+    # ----------------------------
+    def load_all(self, db: Database) -> int:
+        """
+        Bulk load every tenant with two collection scans. Returns the number of tenants loaded.
+        """
+        built: Dict[ObjectId, _TenantCategories] = {}
+
+        for cat in db[CATEGORY_COLLECTION].find({}, {"name": 1, "tenant": 1}):
+            self._add_category(built.setdefault(cat.get("tenant"), _TenantCategories()), cat)
+
+        for attr in db[CATEGORY_ATTR_COLLECTION].find({}, {"name": 1, "tenant": 1, "category": 1}):
+            tenant = built.get(attr.get("tenant"))
+            if tenant is not None:
+                self._add_attribute(tenant, attr)
+
+        with self._lock:
+            for tenant_oid in list(self._tenants):
+                if tenant_oid not in built:
+                    self._drop(tenant_oid)
+            for tenant_oid, tenant in built.items():
+                self._swap(tenant_oid, tenant)
+
+        logger.info(f"Loaded category index for {len(built)} tenants")
+        return len(built)
+
+    def refresh_tenant(self, db: Database, tenant_id: Union[str, ObjectId]) -> None:
+        """Reload a single tenant (e.g. after its categories were edited)."""
+        tenant_oid = to_object_id(tenant_id)
+        tenant = _TenantCategories()
+
+        for cat in db[CATEGORY_COLLECTION].find({"tenant": tenant_oid}, {"name": 1}):
+            self._add_category(tenant, cat)
+
+        for attr in db[CATEGORY_ATTR_COLLECTION].find({"tenant": tenant_oid}, {"name": 1, "category": 1}):
+            self._add_attribute(tenant, attr)
+
+        with self._lock:
+            self._swap(tenant_oid, tenant)
+
+    def drop_tenant(self, tenant_id: Union[str, ObjectId]) -> None:
+        with self._lock:
+            self._drop(to_object_id(tenant_id))
+
+    def has_tenant(self, tenant_id: Union[str, ObjectId]) -> bool:
+        return to_object_id(tenant_id) in self._tenants
+
+    def tenants(self) -> List[ObjectId]:
+        return list(self._tenants)
+
+    # ----------------------------
+    # Lookups
+    # ----------------------------
+    def get_category_id(self, tenant_id: Union[str, ObjectId], category_name: str) -> Optional[ObjectId]:
+        tenant = self._tenants.get(to_object_id(tenant_id))
+        if tenant is None:
+            return None
+        return tenant.category_ids.get(normalize_key(category_name))
+
+    def get_attribute_id(
+        self,
+        tenant_id: Union[str, ObjectId],
+        category: Union[str, ObjectId],
+        attribute_name: str
+    ) -> Optional[ObjectId]:
+        tenant = self._tenants.get(to_object_id(tenant_id))
+        if tenant is None:
+            return None
+        category_id = self._resolve_category(tenant, category)
+        if category_id is None:
+            return None
+        return tenant.attribute_ids.get((category_id, normalize_key(attribute_name)))
+
+    def get_attribute_ids(
+        self,
+        tenant_id: Union[str, ObjectId],
+        category: Union[str, ObjectId],
+        attribute_names: Iterable[str]
+    ) -> List[ObjectId]:
+        """Resolve several attribute names of one category; unknown names are dropped."""
+        tenant = self._tenants.get(to_object_id(tenant_id))
+        if tenant is None:
+            return []
+        category_id = self._resolve_category(tenant, category)
+        if category_id is None:
+            return []
+
+        ids = []
+        for name in attribute_names:
+            attr_id = tenant.attribute_ids.get((category_id, normalize_key(name)))
+            if attr_id is not None and attr_id not in ids:
+                ids.append(attr_id)
+        return ids
+
+    def get_attribute(self, attribute_id: Union[str, ObjectId]) -> Optional[Tuple[str, str]]:
+        """Reverse lookup: attribute ObjectId -> (category name, attribute name)."""
+        attr_oid = to_object_id(attribute_id)
+        tenant = self._tenants.get(self._attribute_tenant.get(attr_oid))
+        if tenant is None:
+            return None
+        entry = tenant.attributes.get(attr_oid)
+        if entry is None:
+            return None
+        category_id, attribute_name = entry
+        return tenant.category_names.get(category_id), attribute_name
+
+    def find_attributes(self, tenant_id: Union[str, ObjectId], attribute_name: str) -> List[Tuple[str, ObjectId]]:
+        """(category name, attribute ObjectId) for every category of the tenant having this attribute name."""
+        tenant = self._tenants.get(to_object_id(tenant_id))
+        if tenant is None:
+            return []
+        return [
+            (tenant.category_names[category_id], attr_id)
+            for category_id, attr_id in tenant.attributes_by_name.get(normalize_key(attribute_name), {}).items()
+        ]
+
+    def get_category_attributes(
+        self,
+        tenant_id: Union[str, ObjectId],
+        category: Union[str, ObjectId]
+    ) -> List[Tuple[ObjectId, str]]:
+        """All (attribute ObjectId, attribute name) pairs of a category, in load order."""
+        tenant = self._tenants.get(to_object_id(tenant_id))
+        if tenant is None:
+            return []
+        category_id = self._resolve_category(tenant, category)
+        return [
+            (attr_id, name)
+            for attr_id, (cat_id, name) in tenant.attributes.items()
+            if cat_id == category_id
+        ]
+
+    def tenant_vocabulary(self, tenant_id: Union[str, ObjectId]) -> Dict[str, List[str]]:
+        """Category name -> attribute names (sorted), the parser's per-tenant filter vocabulary."""
+        tenant = self._tenants.get(to_object_id(tenant_id))
+        if tenant is None:
+            return {}
+        if tenant.vocabulary is None:
+            vocabulary: Dict[str, List[str]] = {name: [] for name in tenant.category_names.values()}
+            for category_id, name in tenant.attributes.values():
+                vocabulary[tenant.category_names[category_id]].append(name)
+            tenant.vocabulary = {category: sorted(names) for category, names in vocabulary.items() if names}
+        return tenant.vocabulary
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    @staticmethod
+    def _resolve_category(tenant: _TenantCategories, category: Union[str, ObjectId]) -> Optional[ObjectId]:
+        if isinstance(category, ObjectId):
+            return category if category in tenant.category_names else None
+        return tenant.category_ids.get(normalize_key(category))
+
+    @staticmethod
+    def _add_category(tenant: _TenantCategories, doc: dict) -> None:
+        name = (doc.get("name") or "").strip()
+        if not name:
+            return
+        tenant.category_ids[normalize_key(name)] = doc["_id"]
+        tenant.category_names[doc["_id"]] = sys.intern(name)
+
+    @staticmethod
+    def _add_attribute(tenant: _TenantCategories, doc: dict) -> None:
+        name = (doc.get("name") or "").strip()
+        category_id = doc.get("category")
+        if not name or category_id not in tenant.category_names:
+            return
+        key = normalize_key(name)
+        tenant.attribute_ids[(category_id, key)] = doc["_id"]
+        tenant.attributes[doc["_id"]] = (category_id, sys.intern(name))
+        tenant.attributes_by_name.setdefault(key, {})[category_id] = doc["_id"]
+
+    def _swap(self, tenant_oid: ObjectId, tenant: _TenantCategories) -> None:
+        # Publish the new maps first so lock-free readers never find the tenant missing
+        old = self._tenants.get(tenant_oid)
+        for attr_id in tenant.attributes:
+            self._attribute_tenant[attr_id] = tenant_oid
+        self._tenants[tenant_oid] = tenant
+        if old is None:
+            return
+        for attr_id in old.attributes:
+            if attr_id not in tenant.attributes and self._attribute_tenant.get(attr_id) == tenant_oid:
+                del self._attribute_tenant[attr_id]
+
+    def _drop(self, tenant_oid: ObjectId) -> None:
+        old = self._tenants.pop(tenant_oid, None)
+        if old is None:
+            return
+        for attr_id in old.attributes:
+            if self._attribute_tenant.get(attr_id) == tenant_oid:
+                del self._attribute_tenant[attr_id]
+
+
+# Single process-wide instance
+category_index = CategoryIndex()
+
+
+def get_category_index() -> CategoryIndex:
+    return category_index
+
 
 class CategoryExtractor:
     def __init__(self, categories_collection: Collection, tenant_id: str):
         """
-        Extractor to resolve category names into ObjectIds.
+        Single-tenant view over the shared CategoryIndex.
         """
-        self.tenant_id = ObjectId(tenant_id)
+        self.tenant_id = to_object_id(tenant_id)
         self.categories_collection = categories_collection
-        self.category_map: Dict[str, ObjectId] = {}
+        self.index = category_index
         self._load_categories()
 
     def _load_categories(self):
         """
-        Loads all categories for the tenant into a dict:
-        { "Funnel Stage": ObjectId(...), "Industry": ObjectId(...), ... }
+        Loads this tenant into the process-wide index unless it's already there
+        (CategoryIndex.refresh_tenant reloads it explicitly).
         """
-        categories = self.categories_collection.find({"tenant": self.tenant_id})
-        for c in categories:
-            self.category_map[c["name"]] = c["_id"]
+        if not self.index.has_tenant(self.tenant_id):
+            self.index.refresh_tenant(self.categories_collection.database, self.tenant_id)
 
     def get_category_id(self, category_name: str) -> Optional[ObjectId]:
         """
         Returns the ObjectId for a given category name.
         """
-        return self.category_map.get(category_name)
\ No newline at end of file
+        return self.index.get_category_id(self.tenant_id, category_name)
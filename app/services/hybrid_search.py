@@ -0,0 +1,181 @@
+"""
+Hybrid structured + semantic retrieval.
+
+Structured filters from parse_query_with_enhanced_tools (category attributes,
+geoFocus, contentType, dates) are evaluated on the tenant's TenantSnapshot and
+projected onto the vector rows; cosine similarity is then computed only for
+the masked rows. One in-process pass, no Mongo pipeline and no per-result
+vector fetch. Filter freshness is the snapshot's (refresh() / change stream),
+so metadata edits on already-embedded pages are seen without re-reading Mongo.
+"""
+import logging
+from threading import RLock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+from bson import ObjectId
+
+from app.db.embedding_codec import decode_embedding
+from app.services.get_category_id import CategoryIndex, category_index as default_category_index, to_object_id
+from app.services.tenant_snapshot import SnapshotView, TenantSnapshotRegistry, filter_spec, tenant_snapshots
+from app.services.vector_store import SearchHit, TenantVectorStore, VectorStoreRegistry, top_k, vector_stores
+
+logger = logging.getLogger(__name__)
+
+# With an ANN index, over-fetch this many times k before applying the mask
+ANN_OVERFETCH = 10
+
+
+class RowAlignment:
+    """Snapshot row -> vector store row (-1 = page has no embedding)."""
+
+    def __init__(self, layout: int, store_version: int):
+        self.layout = layout
+        self.store_version = store_version
+        self.rows = np.empty(0, dtype=np.int64)
+
+    def extend(self, snapshot_ids: List[ObjectId], upto: int, store: TenantVectorStore) -> None:
+        """Map snapshot rows [len(self.rows), upto); snapshot rows are append-only within a layout."""
+        start = len(self.rows)
+        if upto <= start:
+            return
+        mapped = np.fromiter(
+            ((row if (row := store.row_of(doc_id)) is not None else -1) for doc_id in snapshot_ids[start:upto]),
+            dtype=np.int64, count=upto - start
+        )
+        self.rows = np.concatenate([self.rows, mapped])
+
+
+class HybridSearcher:
+    """Evaluates filters on tenant snapshots and runs masked semantic search."""
+
+    def __init__(
+        self,
+        registry: VectorStoreRegistry = vector_stores,
+        category_index: CategoryIndex = default_category_index,
+        db=None,
+        snapshots: TenantSnapshotRegistry = tenant_snapshots
+    ):
+        self.registry = registry
+        self.category_index = category_index
+        self.snapshots = snapshots
+        self._db = db
+        self._alignments: Dict[ObjectId, RowAlignment] = {}
+        self._content_types: Dict[ObjectId, Dict[str, List[Any]]] = {}
+        self._lock = RLock()
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = self.registry.collection.database
+        return self._db
+
+    def store_rows(self, view: SnapshotView, store: TenantVectorStore) -> np.ndarray:
+        """
+        Vector store row of every snapshot row in the view. Rebuilt when the
+        snapshot renumbers or the store adds/moves rows, extended when the
+        snapshot only appended.
+        """
+        with self._lock:
+            alignment = self._alignments.get(store.tenant_id)
+            if alignment is None or alignment.layout != view.layout or alignment.store_version != store.version:
+                alignment = RowAlignment(view.layout, store.version)
+                self._alignments[store.tenant_id] = alignment
+            alignment.extend(view.ids, view.rows, store)
+            return alignment.rows[:view.rows]
+
+    def content_type_values(self, tenant_id: ObjectId, names: Iterable[str]) -> List[Any]:
+        """Page Type names -> stored contentType values (ids from content_types, plus the raw names)."""
+        lookup = self._content_types.get(tenant_id)
+        if lookup is None:
+            lookup = {}
+            for ct in self.db["content_types"].find({"tenant": tenant_id}, {"name": 1}):
+                lookup.setdefault((ct.get("name") or "").strip().lower(), []).append(ct["_id"])
+            self._content_types[tenant_id] = lookup
+        values: List[Any] = []
+        for name in names:
+            values.append(name)
+            values.extend(lookup.get(str(name).strip().lower(), []))
+        return values
+
+    # ----------------------------
+    # Filters -> mask
+    # ----------------------------
+    def build_mask(self, parsed_query: Dict, store: TenantVectorStore) -> Optional[np.ndarray]:
+        """
+        Mask over the store's rows: AND across filters, OR within one filter's
+        values (filter_spec). None means "no filters". Unresolvable category
+        values match nothing (same as the $lookup pipeline).
+        """
+        spec = filter_spec(parsed_query, store.tenant_id, self.category_index, self.content_type_values)
+        if spec.empty:
+            return None
+        view = self.snapshots.get(store.tenant_id).view()
+        rows = self.store_rows(view, store)[view.filter_mask(spec)]
+        size = store.size
+        mask = np.zeros(size, dtype=bool)
+        mask[rows[(rows >= 0) & (rows < size)]] = True
+        return mask
+
+    # ----------------------------
+    # Search
+    # ----------------------------
+    def search(
+        self,
+        parsed_query: Dict,
+        tenant_id: Union[str, ObjectId],
+        query_embedding,
+        k: int = 10,
+        nprobe: Optional[int] = None
+    ) -> List[SearchHit]:
+        tenant_oid = to_object_id(tenant_id)
+        store = self.registry.get(tenant_oid)
+        if not self.category_index.has_tenant(tenant_oid):
+            self.category_index.refresh_tenant(self.db, tenant_oid)
+
+        mask = self.build_mask(parsed_query, store)
+        if mask is None:
+            return self.registry.search(tenant_oid, query_embedding, k, nprobe)
+
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return []
+
+        ann = self.registry.get_ann(tenant_oid)
+        if ann is not None and len(rows) > ANN_OVERFETCH * k and len(rows) >= ann.size // 4:
+            # Broad filter: ANN shortlist, then keep masked rows
+            hits = [
+                hit for hit in ann.search(query_embedding, k * ANN_OVERFETCH, nprobe, rerank_store=store)
+                if (row := store.row_of(hit[0])) is not None and row < len(mask) and mask[row]
+            ]
+            if len(hits) >= k:
+                return hits[:k]
+
+        q = decode_embedding(query_embedding).astype(np.float32, copy=True)
+        q /= np.linalg.norm(q) or 1.0
+        scores = store.matrix[rows] @ q
+        ids = store.ids
+        return [(ids[rows[i]], float(scores[i])) for i in top_k(scores, k)]
+
+
+hybrid_searcher = HybridSearcher()
+
+
+def hybrid_search(
+    parsed_query: Dict,
+    tenant_id: Union[str, ObjectId],
+    k: int = 10,
+    embed_fn: Optional[Callable[[str], Iterable[float]]] = None,
+    searcher: HybridSearcher = hybrid_searcher
+) -> List[SearchHit]:
+    """
+    Rank the tenant's content matching parsed_query's structured filters by
+    semantic similarity to parsed_query["query_text"].
+    """
+    if embed_fn is None:
+        from app.services.query_embedding_cache import embed_query
+        embed_fn = embed_query
+    embedding = embed_fn(parsed_query.get("query_text", ""))
+    if embedding is None:
+        return []
+    return searcher.search(parsed_query, tenant_id, embedding, k)
@@ -0,0 +1,151 @@
+"""
+Record / replay / passthrough transport for the parser's chat-completions client.
+
+- passthrough: calls go straight to the real client (default)
+- record: calls go to the real client; tool-call arguments and latency are
+  appended to LLM_RECORDING_PATH, keyed by a hash of the request
+- replay: responses come from the recording, no network and no API key;
+  an unrecorded request raises ReplayMiss. LLM_REPLAY_LATENCY_MS sleeps a
+  fixed time per call, or "recorded" sleeps the latency seen when recording
+
+    LLM_TRANSPORT_MODE=record LLM_RECORDING_PATH=data/llm_recording.jsonl python run_flow.py
+    LLM_TRANSPORT_MODE=replay LLM_REPLAY_LATENCY_MS=recorded python -m benchmarks.api_load ...
+
+The request hash covers model, messages, tools and tool_choice, so a changed
+prompt or tenant vocabulary is a miss rather than a stale answer.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+PASSTHROUGH = "passthrough"
+RECORD = "record"
+REPLAY = "replay"
+TRANSPORT_MODES = (PASSTHROUGH, RECORD, REPLAY)
+
+LLM_TRANSPORT_MODE = os.getenv("LLM_TRANSPORT_MODE", PASSTHROUGH)
+LLM_RECORDING_PATH = os.getenv("LLM_RECORDING_PATH", "data/llm_recording.jsonl")
+LLM_REPLAY_LATENCY_MS = os.getenv("LLM_REPLAY_LATENCY_MS", "0")  # number or "recorded"
+
+HASHED_FIELDS = ("model", "messages", "tools", "tool_choice")
+
+
+class ReplayMiss(KeyError):
+    pass
+
+
+def request_hash(request: Dict[str, Any]) -> str:
+    canonical = json.dumps({k: request.get(k) for k in HASHED_FIELDS}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def tool_calls_of(response) -> List[Dict[str, str]]:
+    calls = response.choices[0].message.tool_calls or []
+    return [{"name": call.function.name, "arguments": call.function.arguments} for call in calls]
+
+
+def response_from(tool_calls: List[Dict[str, str]]):
+    """Just enough of a ChatCompletion for callers that read choices[0].message.tool_calls."""
+    calls = [
+        SimpleNamespace(type="function", function=SimpleNamespace(name=call["name"], arguments=call["arguments"]))
+        for call in tool_calls
+    ]
+    message = SimpleNamespace(role="assistant", content=None, tool_calls=calls)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="tool_calls")])
+
+
+class RecordingStore:
+    """request hash -> {"tool_calls", "latency_s"}, persisted as append-only JSONL (last write wins)."""
+
+    def __init__(self, path: str = LLM_RECORDING_PATH):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["hash"]] = entry
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def put(self, key: str, tool_calls: List[Dict[str, str]], latency_s: float, model: Optional[str] = None) -> None:
+        entry = {"hash": key, "model": model, "tool_calls": tool_calls, "latency_s": round(latency_s, 4)}
+        with self._lock:
+            self._entries[key] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RecordReplayClient:
+    """
+    Drop-in for the parts of the OpenAI client the parser uses
+    (client.chat.completions.create). The real client is only built when a
+    call needs it, so replay runs without credentials.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        mode: str = LLM_TRANSPORT_MODE,
+        store: Optional[RecordingStore] = None,
+        replay_latency_ms: str = LLM_REPLAY_LATENCY_MS
+    ):
+        if mode not in TRANSPORT_MODES:
+            raise ValueError(f"Unknown LLM transport mode '{mode}'. Options: {TRANSPORT_MODES}")
+        self.mode = mode
+        self.store = store if store is not None or mode == PASSTHROUGH else RecordingStore()
+        self.replay_latency_ms = str(replay_latency_ms)
+        self._client_factory = client_factory
+        self._client = None
+        self._counters = {"calls": 0, "recorded": 0, "replayed": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def create(self, **request):
+        self._count("calls")
+        if self.mode == PASSTHROUGH:
+            return self.client.chat.completions.create(**request)
+
+        key = request_hash(request)
+        if self.mode == REPLAY:
+            entry = self.store.get(key)
+            if entry is None:
+                self._count("misses")
+                raise ReplayMiss(f"No recorded response for request {key[:12]} in {self.store.path}")
+            delay = entry.get("latency_s", 0.0) if self.replay_latency_ms == "recorded" else float(self.replay_latency_ms) / 1000.0
+            if delay > 0:
+                time.sleep(delay)
+            self._count("replayed")
+            return response_from(entry["tool_calls"])
+
+        started = time.perf_counter()
+        response = self.client.chat.completions.create(**request)
+        self.store.put(key, tool_calls_of(response), time.perf_counter() - started, request.get("model"))
+        self._count("recorded")
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {"mode": self.mode, "recordings": len(self.store) if self.store is not None else 0, **counters}
@@ -1,5 +1,32 @@
+import os
+from threading import Lock
+
 from pymongo import MongoClient
 
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+
+# One pooled client per URI for the whole process (MongoClient is thread-safe)
+_clients = {}
+_lock = Lock()
+
+
+def get_client(uri="mongodb://localhost:27017"):
+    client = _clients.get(uri)
+    if client is None:
+        with _lock:
+            client = _clients.get(uri)
+            if client is None:
+                client = MongoClient(uri, maxPoolSize=MONGO_MAX_POOL_SIZE)
+                _clients[uri] = client
+    return client
+
+
 def get_mongo_client(uri="mongodb://localhost:27017", db_name="my_database"):
-    client = MongoClient(uri)
-    return client[db_name]
+    return get_client(uri)[db_name]
+
+
+def close_clients():
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -1,8 +1,9 @@
 from bson import ObjectId
 from pprint import pprint
+from app.services.temporal_filter import build_temporal_match, resolve_temporal
 
 
-def build_structured_pipeline(parsed_query: dict, tenant_id: str):
+def build_structured_pipeline(parsed_query: dict, tenant_id: str, now=None):
     """
     Convert query_parser output into a MongoDB aggregation pipeline.
     Handles both standard filters and aggregation queries.
@@ -12,6 +13,12 @@ def build_structured_pipeline(parsed_query: dict, tenant_id: str):
     # Step 1: Always filter by tenant
     pipeline.append({"$match": {"tenant": ObjectId(tenant_id)}})
 
+    # Step 1b: Date range from constraints.temporal, before any join
+    temporal = (parsed_query.get("constraints") or {}).get("temporal")
+    temporal_stage = build_temporal_match(resolve_temporal(temporal, now))
+    if temporal_stage:
+        pipeline.append(temporal_stage)
+
     # Step 2: Apply required joins (category_attribute, categories, etc.)
     for join in parsed_query.get("database_mapping", {}).get("required_joins", []):
         if join["collection"] == "category_attributes":
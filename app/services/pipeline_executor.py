@@ -1,5 +1,5 @@
 # app/services/pipeline_executor.py
-from mongo_client import get_mongo_client
+from app.services.mongo_client import get_mongo_client
 import pprint
 
 def execute_pipeline_count(pipeline, tenant_id, collection_name="sitemaps"):
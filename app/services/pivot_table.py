@@ -0,0 +1,163 @@
+"""
+Dense two-dimensional count matrix (e.g. Funnel Stage x Primary Audience)
+built from build_pivot_pipeline output. Every attribute in the tenant's
+vocabulary gets a row/column, so missing combinations are explicit zeros, and
+gaps, percentages and rankings are computed on the NumPy array.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from bson import ObjectId
+
+from app.services.get_category_id import to_object_id
+from app.services.try_query_builder import pivot_dimensions
+
+
+class PivotTable:
+    def __init__(
+        self,
+        row_dimension: str,
+        column_dimension: str,
+        row_labels: Sequence[str],
+        column_labels: Sequence[str],
+        counts: np.ndarray
+    ):
+        self.row_dimension = row_dimension
+        self.column_dimension = column_dimension
+        self.row_labels = list(row_labels)
+        self.column_labels = list(column_labels)
+        self.counts = counts
+
+    @classmethod
+    def from_aggregation(
+        cls,
+        result: Sequence[Dict],
+        row_dimension: str,
+        column_dimension: str,
+        row_attributes: Sequence[Tuple[ObjectId, str]],
+        column_attributes: Sequence[Tuple[ObjectId, str]]
+    ) -> "PivotTable":
+        """result: [{"_id": {"r": attr_id, "c": attr_id}, "count": n}]; pairs outside the vocabulary are ignored."""
+        row_pos = {attr_id: i for i, (attr_id, _) in enumerate(row_attributes)}
+        column_pos = {attr_id: j for j, (attr_id, _) in enumerate(column_attributes)}
+        counts = np.zeros((len(row_attributes), len(column_attributes)), dtype=np.int64)
+
+        cells = [
+            (row_pos[doc["_id"]["r"]], column_pos[doc["_id"]["c"]], doc["count"])
+            for doc in result
+            if doc["_id"].get("r") in row_pos and doc["_id"].get("c") in column_pos
+        ]
+        if cells:
+            i, j, n = (np.array(col, dtype=np.int64) for col in zip(*cells))
+            np.add.at(counts, (i, j), n)
+        return cls(
+            row_dimension,
+            column_dimension,
+            [name for _, name in row_attributes],
+            [name for _, name in column_attributes],
+            counts
+        )
+
+    @classmethod
+    def for_query(
+        cls,
+        result: Sequence[Dict],
+        parser_output: Dict,
+        tenant_id: Union[str, ObjectId],
+        category_index: Any
+    ) -> Optional["PivotTable"]:
+        """Shape the output of build_structured_pipeline's pivot path; None if the query isn't a pivot."""
+        dimensions = pivot_dimensions(parser_output)
+        if dimensions is None:
+            return None
+        tenant_oid = to_object_id(tenant_id)
+        rows, columns = dimensions
+        return cls.from_aggregation(
+            result, rows, columns,
+            category_index.get_category_attributes(tenant_oid, rows),
+            category_index.get_category_attributes(tenant_oid, columns)
+        )
+
+    # ----------------------------
+    # Totals / percentages
+    # ----------------------------
+    @property
+    def row_totals(self) -> np.ndarray:
+        return self.counts.sum(axis=1)
+
+    @property
+    def column_totals(self) -> np.ndarray:
+        return self.counts.sum(axis=0)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def percentages(self, axis: Optional[int] = None) -> np.ndarray:
+        """Share of the grand total (axis=None), of each row (axis=1) or of each column (axis=0), in %."""
+        if axis is None:
+            denominator = np.array(self.total, dtype=np.float64)
+        else:
+            denominator = self.counts.sum(axis=axis, keepdims=True).astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shares = np.where(denominator > 0, self.counts / denominator * 100.0, 0.0)
+        return np.round(shares, 2)
+
+    # ----------------------------
+    # Gaps / ranking
+    # ----------------------------
+    def _select(self, labels: List[str], wanted: Optional[Sequence[str]]) -> np.ndarray:
+        if not wanted:
+            return np.arange(len(labels))
+        keys = {str(w).strip().casefold() for w in wanted}
+        return np.array([i for i, label in enumerate(labels) if label.strip().casefold() in keys], dtype=np.int64)
+
+    def gaps(
+        self,
+        max_count: int = 0,
+        max_share: Optional[float] = None,
+        rows: Optional[Sequence[str]] = None,
+        columns: Optional[Sequence[str]] = None,
+        axis: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        Cells with count <= max_count, or (if max_share is given) whose share of
+        their row (axis=1) / column (axis=0) is <= max_share %. Restrict to some
+        rows/columns by label, e.g. rows=["BOFU"]. Sorted emptiest first.
+        """
+        row_idx, column_idx = self._select(self.row_labels, rows), self._select(self.column_labels, columns)
+        counts = self.counts[np.ix_(row_idx, column_idx)]
+        shares = self.percentages(axis)[np.ix_(row_idx, column_idx)]
+        hit = counts <= max_count
+        if max_share is not None:
+            hit |= shares <= max_share
+
+        i, j = np.nonzero(hit)
+        order = np.lexsort((j, i, counts[i, j]))
+        return [
+            {
+                self.row_dimension: self.row_labels[row_idx[i[k]]],
+                self.column_dimension: self.column_labels[column_idx[j[k]]],
+                "count": int(counts[i[k], j[k]]),
+                "share": float(shares[i[k], j[k]]),
+            }
+            for k in order
+        ]
+
+    def rank(self, axis: int = 0, descending: bool = True) -> List[Tuple[str, int]]:
+        """Rows (axis=0) or columns (axis=1) by total count."""
+        totals = self.row_totals if axis == 0 else self.column_totals
+        labels = self.row_labels if axis == 0 else self.column_labels
+        order = np.argsort(-totals if descending else totals, kind="stable")
+        return [(labels[i], int(totals[i])) for i in order]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.row_dimension,
+            "columns": self.column_dimension,
+            "row_labels": self.row_labels,
+            "column_labels": self.column_labels,
+            "counts": self.counts.tolist(),
+            "row_totals": self.row_totals.tolist(),
+            "column_totals": self.column_totals.tolist(),
+        }
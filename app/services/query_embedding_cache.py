@@ -0,0 +1,196 @@
+"""
+Bounded LRU cache of query embeddings keyed by (model, normalized text).
+
+- Values are stored as read-only float32 arrays
+- Optional on-disk tier (one .npy per key) survives restarts
+- Concurrent misses for the same key are coalesced into one embedding call
+- Hit/miss/coalesce/eviction counters via stats()
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+QUERY_CACHE_DIR = os.getenv("QUERY_EMBEDDING_CACHE_DIR")  # unset = memory only
+
+CacheKey = Tuple[str, str]
+
+
+def normalize_query(text: str) -> str:
+    """Case/whitespace-insensitive form used for the cache key."""
+    return " ".join(str(text).split()).casefold()
+
+
+class _InFlight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_entries: int = QUERY_CACHE_SIZE, directory: Optional[str] = QUERY_CACHE_DIR):
+        self.max_entries = max_entries
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._entries: "OrderedDict[CacheKey, np.ndarray]" = OrderedDict()
+        self._in_flight: Dict[CacheKey, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "evictions": 0,
+            "errors": 0,
+            "compute_seconds": 0.0,
+        }
+
+    @staticmethod
+    def make_key(model: str, text: str) -> CacheKey:
+        return model, normalize_query(text)
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = self.make_key(model, text)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+            return value
+
+    def put(self, model: str, text: str, embedding: Iterable[float]) -> np.ndarray:
+        key = self.make_key(model, text)
+        value = self._freeze(embedding)
+        with self._lock:
+            self._insert(key, value)
+        self._write_disk(key, value)
+        return value
+
+    def get_or_compute(self, model: str, text: str, embed_fn: Callable[[str], Optional[Iterable[float]]]) -> Optional[np.ndarray]:
+        """
+        Cached embedding for (model, text); on a miss, exactly one caller runs
+        embed_fn while concurrent callers for the same key wait for its result.
+        """
+        key = self.make_key(model, text)
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return value
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _InFlight()
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = self._read_disk(key)
+            if value is not None:
+                with self._lock:
+                    self._counters["disk_hits"] += 1
+            else:
+                started = time.perf_counter()
+                raw = embed_fn(text)
+                elapsed = time.perf_counter() - started
+                value = self._freeze(raw) if raw is not None else None
+                with self._lock:
+                    self._counters["misses"] += 1
+                    self._counters["compute_seconds"] += elapsed
+                if value is not None:
+                    self._write_disk(key, value)
+
+            with self._lock:
+                if value is not None:
+                    self._insert(key, value)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["disk_hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # ----------------------------
+    # Internals
+    # ----------------------------
+    @staticmethod
+    def _freeze(embedding: Iterable[float]) -> np.ndarray:
+        value = np.array(embedding, dtype=np.float32).reshape(-1)
+        value.setflags(write=False)
+        return value
+
+    def _insert(self, key: CacheKey, value: np.ndarray) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _disk_path(self, key: CacheKey) -> Optional[str]:
+        if not self.directory:
+            return None
+        digest = hashlib.sha256(f"{key[0]}\x00{key[1]}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.npy")
+
+    def _read_disk(self, key: CacheKey) -> Optional[np.ndarray]:
+        path = self._disk_path(key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            return self._freeze(np.load(path))
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key: CacheKey, value: np.ndarray) -> None:
+        path = self._disk_path(key)
+        if not path:
+            return
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, value)
+        os.replace(tmp, path)  # atomic: readers never see a partial file
+
+
+# Single process-wide cache
+query_embedding_cache = QueryEmbeddingCache()
+
+
+def embed_query(text: str, cache: QueryEmbeddingCache = query_embedding_cache) -> Optional[np.ndarray]:
+    """Embed a search query with the same model as get_embedding, via the cache."""
+    from app.db.generate_embedding import EMBEDDING_MODEL, get_embedding
+    if not str(text).strip():
+        return None
+    return cache.get_or_compute(EMBEDDING_MODEL, text, get_embedding)
@@ -0,0 +1,198 @@
+"""
+Structured retrieval for list queries, streamed straight from the cursor.
+
+- iter_structured_results() yields documents batch by batch (constant memory,
+  first row after the first batch instead of after the whole result)
+- iter_ndjson() / iter_csv() serialize any document iterator lazily for exports;
+  iter_export() combines both for POST /export and the CLI below
+- structured_search() is the materialized convenience wrapper
+
+    python -m app.services.retrieval_service --tenant <id> --parsed parsed.json --format csv --output pages.csv
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from bson import Binary, ObjectId
+
+from app.services.get_category_id import category_index as default_category_index, to_object_id
+from app.services.try_query_builder import build_structured_pipeline
+
+DEFAULT_BATCH_SIZE = 500
+# Large/internal fields never worth shipping in a listing
+EXCLUDED_FIELDS = ("embedding", "embeddingHash", "embeddingModel", "embeddingUpdatedAt", "embeddingCheckedAt")
+SORTABLE_FIELDS = ("createdAt", "updatedAt", "title", "fullUrl")
+CSV_FIELDS = ("_id", "title", "fullUrl", "contentType", "geoFocus", "createdAt", "updatedAt")
+
+
+def build_structured_match(
+    parsed_query: Dict,
+    tenant_id: Union[str, ObjectId],
+    category_index=default_category_index,
+    now: Optional[datetime] = None
+) -> List[Dict]:
+    """Filtering stages only (tenant, date range, categories, direct fields) — no aggregation."""
+    # Grouping/compare fields would route build_structured_pipeline to the pivot or compare pipelines
+    mapping = {**(parsed_query.get("database_mapping") or {}), "aggregation_fields": []}
+    # Joins without values only fed the grouping; as lookups they'd just $unwind every page
+    mapping["required_joins"] = [j for j in mapping.get("required_joins") or [] if j.get("values")]
+    list_query = {
+        **parsed_query,
+        "aggregation_requested": False,
+        "operation_type": "list",
+        "comparison_entities": [],
+        "database_mapping": mapping,
+    }
+    return build_structured_pipeline(list_query, str(to_object_id(tenant_id)), category_index, now)
+
+
+def build_list_pipeline(
+    parsed_query: Dict,
+    tenant_id: Union[str, ObjectId],
+    category_index=default_category_index,
+    now: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> List[Dict]:
+    pipeline = build_structured_match(parsed_query, tenant_id, category_index, now)
+
+    constraints = parsed_query.get("constraints") or {}
+    sort_by = constraints.get("sort_by")
+    if sort_by in SORTABLE_FIELDS:
+        pipeline.append({"$sort": {sort_by: -1 if constraints.get("sort_order") == "desc" else 1, "_id": 1}})
+    limit = limit or constraints.get("limit")
+    if limit:
+        pipeline.append({"$limit": int(limit)})
+    pipeline.append({"$project": {field: 0 for field in EXCLUDED_FIELDS}})
+    return pipeline
+
+
+def iter_structured_results(
+    parsed_query: Dict,
+    tenant_id: Union[str, ObjectId],
+    collection,
+    category_index=default_category_index,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    now: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> Iterator[Dict]:
+    """Yield matching documents as the server returns them, batch_size per round trip."""
+    pipeline = build_list_pipeline(parsed_query, tenant_id, category_index, now, limit)
+    with collection.aggregate(pipeline, batchSize=batch_size, allowDiskUse=True) as cursor:
+        yield from cursor
+
+
+def structured_search(
+    parsed_query: Dict,
+    tenant_id: Union[str, ObjectId],
+    collection,
+    category_index=default_category_index,
+    limit: Optional[int] = None
+) -> List[Dict]:
+    return list(iter_structured_results(parsed_query, tenant_id, collection, category_index, limit=limit))
+
+
+# ----------------------------
+# Serialization
+# ----------------------------
+def to_jsonable(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, (Binary, bytes)):
+        return None
+    return value
+
+
+def iter_ndjson(docs: Iterable[Dict]) -> Iterator[str]:
+    """One JSON object per line."""
+    for doc in docs:
+        yield json.dumps(to_jsonable(doc), ensure_ascii=False) + "\n"
+
+
+def _csv_cell(value: Any) -> Any:
+    value = to_jsonable(value)
+    if isinstance(value, list):
+        return "|".join(str(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return "" if value is None else value
+
+
+def iter_csv(docs: Iterable[Dict], fields: Sequence[str] = CSV_FIELDS) -> Iterator[str]:
+    """Header row, then one row per document; list values are '|'-joined."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def _flush() -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(fields)
+    yield _flush()
+    for doc in docs:
+        writer.writerow([_csv_cell(doc.get(field)) for field in fields])
+        yield _flush()
+
+
+def write_stream(chunks: Iterable[str], fp) -> int:
+    """Write serialized chunks to a text file object; returns the number of chunks."""
+    count = 0
+    for chunk in chunks:
+        fp.write(chunk)
+        count += 1
+    return count
+
+
+EXPORT_FORMATS: Dict[str, Tuple[Callable[[Iterable[Dict]], Iterator[str]], str]] = {
+    "ndjson": (iter_ndjson, "application/x-ndjson"),
+    "csv": (iter_csv, "text/csv"),
+}
+
+
+def iter_export(
+    parsed_query: Dict,
+    tenant_id: Union[str, ObjectId],
+    collection,
+    fmt: str = "ndjson",
+    category_index=default_category_index,
+    limit: Optional[int] = None
+) -> Iterator[str]:
+    """Matching documents serialized as `fmt` chunks, read from the cursor as they are consumed."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Options: {sorted(EXPORT_FORMATS)}")
+    serialize, _ = EXPORT_FORMATS[fmt]
+    return serialize(iter_structured_results(parsed_query, tenant_id, collection, category_index, limit=limit))
+
+
+if __name__ == "__main__":
+    from app.services.mongo_client import get_mongo_client
+
+    parser = argparse.ArgumentParser(description="Export the pages matching a parsed query")
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--parsed", required=True, help="JSON file with a parsed query (output of /parse)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--output", help="Defaults to stdout")
+    args = parser.parse_args()
+
+    with open(args.parsed, encoding="utf-8") as f:
+        parsed = json.load(f)
+    db = get_mongo_client(os.getenv("MONGO_URI", "mongodb://localhost:27017"), os.getenv("DB_NAME", "my_database"))
+    chunks = iter_export(parsed, args.tenant, db["sitemaps"], args.format, limit=args.limit)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as out:
+            write_stream(chunks, out)
+    else:
+        write_stream(chunks, sys.stdout)
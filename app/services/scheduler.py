@@ -0,0 +1,225 @@
+"""
+Per-tenant weighted fair admission for LLM calls and database work.
+
+Each pool (llm_pool, db_pool) runs at most `concurrency` jobs at once. When a
+slot frees, the next job is chosen by:
+
+- priority: interactive before batch, except that every BATCH_EVERY-th
+  dispatch goes to batch when both are waiting, so batch never starves
+- tenant: within a priority, weighted fair queueing on virtual time; a tenant's
+  clock advances 1/weight per dispatched job, and the tenant with the smallest
+  clock goes next, so a tenant with 100 queued jobs can't delay a tenant with 1
+- FIFO within one tenant and priority
+
+A tenant with MAX_QUEUED_PER_TENANT waiting jobs gets SchedulerFull; a job
+waiting longer than its timeout gets SchedulerTimeout. stats() reports queue
+depth per tenant and wait-time percentiles per priority.
+
+    SCHEDULER_LLM_CONCURRENCY=8 SCHEDULER_DB_CONCURRENCY=16 TENANT_WEIGHTS="6875f3af...:2,68a0...:0.5"
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Union
+
+import numpy as np
+from bson import ObjectId
+
+PRIORITIES = ("interactive", "batch")
+LLM_CONCURRENCY = int(os.getenv("SCHEDULER_LLM_CONCURRENCY", "8"))
+DB_CONCURRENCY = int(os.getenv("SCHEDULER_DB_CONCURRENCY", "16"))
+MAX_QUEUED_PER_TENANT = int(os.getenv("SCHEDULER_MAX_QUEUED_PER_TENANT", "200"))
+QUEUE_TIMEOUT = float(os.getenv("SCHEDULER_QUEUE_TIMEOUT_SECONDS", "60"))
+BATCH_EVERY = int(os.getenv("SCHEDULER_BATCH_EVERY", "4"))
+WAIT_SAMPLES = 2048
+
+
+class SchedulerFull(Exception):
+    pass
+
+
+class SchedulerTimeout(Exception):
+    pass
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """"tenantA:2,tenantB:0.5" -> {"tenantA": 2.0, "tenantB": 0.5}"""
+    weights = {}
+    for item in spec.split(","):
+        tenant, _, weight = item.strip().partition(":")
+        if tenant and weight:
+            weights[tenant] = float(weight)
+    return weights
+
+
+TENANT_WEIGHTS = parse_weights(os.getenv("TENANT_WEIGHTS", ""))
+
+
+class _Ticket:
+    __slots__ = ("tenant", "priority", "enqueued", "granted")
+
+    def __init__(self, tenant: str, priority: str):
+        self.tenant = tenant
+        self.priority = priority
+        self.enqueued = time.perf_counter()
+        self.granted = False
+
+
+class FairScheduler:
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        weights: Optional[Dict[str, float]] = None,
+        max_queued_per_tenant: int = MAX_QUEUED_PER_TENANT,
+        batch_every: int = BATCH_EVERY
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.weights = dict(TENANT_WEIGHTS if weights is None else weights)
+        self.max_queued_per_tenant = max_queued_per_tenant
+        self.batch_every = batch_every
+
+        self._cond = threading.Condition()
+        self._running = 0
+        self._dispatched = 0
+        # priority -> tenant -> FIFO of waiting tickets
+        self._queues: Dict[str, Dict[str, Deque[_Ticket]]] = {p: {} for p in PRIORITIES}
+        # priority -> tenant -> virtual time
+        self._vtime: Dict[str, Dict[str, float]] = {p: {} for p in PRIORITIES}
+        self._clock: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._waits: Dict[str, Deque[float]] = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITIES}
+        self._counters = {"completed": 0, "rejected": 0, "timed_out": 0, "errors": 0}
+
+    # ----------------------------
+    # Public
+    # ----------------------------
+    def run(
+        self,
+        tenant_id: Union[str, ObjectId],
+        fn: Callable[[], Any],
+        priority: str = "interactive",
+        timeout: Optional[float] = QUEUE_TIMEOUT
+    ) -> Any:
+        """Wait for a slot under the fair policy, run fn in the calling thread, release the slot."""
+        self.acquire(tenant_id, priority, timeout)
+        try:
+            return fn()
+        except Exception:
+            with self._cond:
+                self._counters["errors"] += 1
+            raise
+        finally:
+            self.release()
+
+    def acquire(self, tenant_id: Union[str, ObjectId], priority: str = "interactive", timeout: Optional[float] = QUEUE_TIMEOUT) -> float:
+        """Returns seconds spent queued."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'. Options: {PRIORITIES}")
+        tenant = str(tenant_id)
+        ticket = _Ticket(tenant, priority)
+        deadline = None if timeout is None else ticket.enqueued + timeout
+
+        with self._cond:
+            queue = self._queues[priority].get(tenant)
+            waiting = sum(len(q.get(tenant, ())) for q in self._queues.values())
+            if waiting >= self.max_queued_per_tenant:
+                self._counters["rejected"] += 1
+                raise SchedulerFull(f"{self.name}: tenant {tenant} has {waiting} queued jobs")
+            if queue is None:
+                queue = self._queues[priority][tenant] = deque()
+                # A tenant becoming active starts at the current clock: no credit for idle time
+                self._vtime[priority][tenant] = max(self._vtime[priority].get(tenant, 0.0), self._clock[priority])
+            queue.append(ticket)
+            self._dispatch()
+
+            while not ticket.granted:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    self._cancel(ticket)
+                    self._counters["timed_out"] += 1
+                    raise SchedulerTimeout(f"{self.name}: queued longer than {timeout}s")
+                self._cond.wait(remaining)
+
+            waited = time.perf_counter() - ticket.enqueued
+            self._waits[priority].append(waited)
+            return waited
+
+    def release(self) -> None:
+        with self._cond:
+            self._running -= 1
+            self._counters["completed"] += 1
+            self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            depth = {p: {t: len(q) for t, q in queues.items()} for p, queues in self._queues.items()}
+            waits = {p: np.array(samples, dtype=np.float64) * 1000.0 for p, samples in self._waits.items()}
+            stats: Dict[str, Any] = {
+                "concurrency": self.concurrency,
+                "running": self._running,
+                "queued": sum(sum(d.values()) for d in depth.values()),
+                "queue_depth": depth,
+                **self._counters,
+            }
+        stats["wait_ms"] = {
+            p: {
+                "samples": int(len(ms)),
+                "p50": round(float(np.percentile(ms, 50)), 3),
+                "p95": round(float(np.percentile(ms, 95)), 3),
+                "p99": round(float(np.percentile(ms, 99)), 3),
+                "max": round(float(ms.max()), 3),
+            } if len(ms) else {"samples": 0}
+            for p, ms in waits.items()
+        }
+        return stats
+
+    # ----------------------------
+    # Internals (caller holds self._cond)
+    # ----------------------------
+    def _pick_priority(self) -> Optional[str]:
+        waiting = [p for p in PRIORITIES if self._queues[p]]
+        if not waiting:
+            return None
+        if len(waiting) > 1 and self.batch_every and self._dispatched % self.batch_every == self.batch_every - 1:
+            return "batch"
+        return waiting[0]
+
+    def _dispatch(self) -> None:
+        granted = False
+        while self._running < self.concurrency:
+            priority = self._pick_priority()
+            if priority is None:
+                break
+            queues, vtime = self._queues[priority], self._vtime[priority]
+            tenant = min(queues, key=lambda t: vtime[t])
+            ticket = queues[tenant].popleft()
+            if not queues[tenant]:
+                del queues[tenant]
+
+            self._clock[priority] = vtime[tenant]
+            vtime[tenant] += 1.0 / max(self.weights.get(tenant, 1.0), 1e-6)
+            ticket.granted = True
+            self._running += 1
+            self._dispatched += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _cancel(self, ticket: _Ticket) -> None:
+        queues = self._queues[ticket.priority]
+        queue = queues.get(ticket.tenant)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del queues[ticket.tenant]
+
+
+# Separate pools: slow LLM calls never hold database slots and vice versa
+llm_pool = FairScheduler("llm", LLM_CONCURRENCY)
+db_pool = FairScheduler("db", DB_CONCURRENCY)
+
+
+def scheduler_stats() -> Dict[str, Dict[str, Any]]:
+    return {pool.name: pool.stats() for pool in (llm_pool, db_pool)}
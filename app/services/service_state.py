@@ -0,0 +1,244 @@
+"""
+Warm, process-wide state behind the HTTP service (app/api.py).
+
+Everything the scripts rebuild per run is built once here and reused by every
+request: the pooled Mongo client, the category index (tenant vocabularies),
+per-tenant snapshots, vector stores and their snapshot -> vector row alignment, and the
+parser (whose import loads the fuzzy-matching vocabulary).
+
+- warm() runs in a background thread; `ready` is set when it finishes, so the
+  service can answer liveness probes while it loads
+- WARM_TENANTS (comma-separated ids) are loaded up front; other tenants load on
+  their first request
+- FOLLOW_CHANGES=1 keeps snapshots and vector stores current from change streams
+- parses run in llm_pool and count/search/aggregate in db_pool (app/services/scheduler.py)
+"""
+import logging
+import os
+import time
+from threading import Event, Thread
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from bson import ObjectId
+
+from app.services.get_category_id import category_index as default_category_index, to_object_id
+from app.services.hybrid_search import HybridSearcher, hybrid_search
+from app.services.mongo_client import get_mongo_client
+from app.services.pivot_table import PivotTable
+from app.services.retrieval_service import iter_export, structured_search
+from app.services.scheduler import FairScheduler, db_pool as default_db_pool, llm_pool as default_llm_pool
+from app.services.single_flight import coalesced_aggregate, coalesced_parse, coalescing_stats
+from app.services.temporal_filter import ensure_temporal_indexes
+from app.services.tenant_snapshot import TenantSnapshotRegistry, answer_aggregation, snapshot_mask
+from app.services.trend_rollups import answer_trend, ensure_rollup_indexes
+from app.services.try_query_builder import build_structured_pipeline, comparison_table, pivot_dimensions
+from app.services.vector_store import VectorStoreRegistry
+
+logger = logging.getLogger(__name__)
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "my_database")
+WARM_TENANTS = [t.strip() for t in os.getenv("WARM_TENANTS", "").split(",") if t.strip()]
+FOLLOW_CHANGES = os.getenv("FOLLOW_CHANGES", "0") == "1"
+
+
+# (query text, tenant vocabulary: category name -> values) -> parsed query
+ParseFn = Callable[[str, Dict[str, List[str]]], Dict]
+
+
+def _default_parse_fn() -> ParseFn:
+    # Imported lazily: the parser builds the OpenAI client at import
+    from app.services.try_query_parser import parse_query_with_enhanced_tools
+    return parse_query_with_enhanced_tools
+
+
+class ServiceState:
+    def __init__(
+        self,
+        db=None,
+        parse_fn: Optional[ParseFn] = None,
+        warm_tenants: Optional[List[str]] = None,
+        follow_changes: bool = FOLLOW_CHANGES,
+        category_index=default_category_index,
+        llm_pool: FairScheduler = default_llm_pool,
+        db_pool: FairScheduler = default_db_pool
+    ):
+        self.db = db if db is not None else get_mongo_client(MONGO_URI, DB_NAME)
+        self.category_index = category_index
+        self.snapshots = TenantSnapshotRegistry(self.db)
+        self.vector_stores = VectorStoreRegistry(self.db)
+        self.searcher = HybridSearcher(self.vector_stores, category_index, self.db, self.snapshots)
+        self.warm_tenants = WARM_TENANTS if warm_tenants is None else warm_tenants
+        self.follow_changes = follow_changes
+        self.llm_pool = llm_pool
+        self.db_pool = db_pool
+
+        self._parse_fn = parse_fn
+        self._page_types: Dict[ObjectId, List[str]] = {}  # tenant -> content type names
+        self.ready = Event()
+        self.error: Optional[str] = None
+        self.warmed: Dict[str, float] = {}  # tenant -> seconds spent warming
+        self._stop = Event()
+        self._threads: List[Thread] = []
+
+    # ----------------------------
+    # Lifecycle
+    # ----------------------------
+    @property
+    def parse_fn(self) -> ParseFn:
+        if self._parse_fn is None:
+            self._parse_fn = _default_parse_fn()
+        return self._parse_fn
+
+    def warm(self) -> None:
+        try:
+            # Backs the date-range $match pushed down after the tenant match (no-op when present)
+            ensure_temporal_indexes(self.db["sitemaps"])
+            ensure_rollup_indexes(self.db)
+            self.category_index.load_all(self.db)
+            self.parse_fn
+            for tenant in self.warm_tenants:
+                self.warm_tenant(tenant)
+            if self.follow_changes:
+                for registry in (self.snapshots, self.vector_stores):
+                    thread = Thread(target=registry.follow_changes, args=(self._stop,), daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+            self.ready.set()
+            logger.info(f"Service ready ({len(self.warmed)} tenants warm)")
+        except Exception as e:
+            self.error = repr(e)
+            logger.exception("Warm-up failed")
+
+    def warm_tenant(self, tenant_id: Union[str, ObjectId]) -> None:
+        started = time.perf_counter()
+        tenant_oid = to_object_id(tenant_id)
+        snapshot = self.snapshots.get(tenant_oid)
+        self.searcher.store_rows(snapshot.view(), self.vector_stores.get(tenant_oid))
+        self.vector_stores.get_ann(tenant_oid)
+        self.vocabulary(tenant_oid)
+        self.warmed[str(tenant_oid)] = round(time.perf_counter() - started, 3)
+
+    def start(self) -> Thread:
+        thread = Thread(target=self.warm, name="service-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready.is_set(),
+            "error": self.error,
+            "warm_tenants": self.warmed,
+            "coalescing": coalescing_stats(),
+            "scheduler": {pool.name: pool.stats() for pool in (self.llm_pool, self.db_pool)},
+        }
+
+    # ----------------------------
+    # Requests
+    # ----------------------------
+    def _ensure_tenant(self, tenant_oid: ObjectId) -> None:
+        if not self.category_index.has_tenant(tenant_oid):
+            self.category_index.refresh_tenant(self.db, tenant_oid)
+
+    def vocabulary(self, tenant_id: Union[str, ObjectId]) -> Dict[str, List[str]]:
+        """
+        Parser vocabulary of a tenant: attribute names per category (CategoryIndex),
+        Language from the snapshot's geoFocus values and Page Type from content_types.
+        """
+        tenant_oid = to_object_id(tenant_id)
+        self._ensure_tenant(tenant_oid)
+        vocabulary = dict(self.category_index.tenant_vocabulary(tenant_oid))
+        languages = self.snapshots.get(tenant_oid).view().value_counts("geoFocus")
+        if any(languages.values()):
+            vocabulary["Language"] = sorted(str(name) for name, count in languages.items() if count)
+        page_types = self._page_types.get(tenant_oid)
+        if page_types is None:
+            names = {(ct.get("name") or "").strip() for ct in self.db["content_types"].find({"tenant": tenant_oid}, {"name": 1})}
+            page_types = self._page_types[tenant_oid] = sorted(name for name in names if name)
+        if page_types:
+            vocabulary["Page Type"] = page_types
+        return vocabulary
+
+    def parse(self, tenant_id: Union[str, ObjectId], query: str, priority: str = "interactive") -> Dict:
+        """
+        Identical concurrent queries of a tenant share one LLM call, which waits
+        for an llm_pool slot and parses against the tenant's own vocabulary.
+        """
+        return coalesced_parse(
+            tenant_id, query,
+            lambda text: self.llm_pool.run(tenant_id, lambda: self.parse_fn(text, self.vocabulary(tenant_id)), priority)
+        )
+
+    def count(self, parsed_query: Dict, tenant_id: Union[str, ObjectId], priority: str = "interactive") -> int:
+        return self.db_pool.run(tenant_id, lambda: self._count(parsed_query, tenant_id), priority)
+
+    def aggregate(self, parsed_query: Dict, tenant_id: Union[str, ObjectId], priority: str = "interactive") -> Any:
+        return self.db_pool.run(tenant_id, lambda: self._aggregate(parsed_query, tenant_id), priority)
+
+    def search(self, parsed_query: Dict, tenant_id: Union[str, ObjectId], k: int = 10, priority: str = "interactive") -> List[Dict]:
+        return self.db_pool.run(tenant_id, lambda: self._search(parsed_query, tenant_id, k), priority)
+
+    def export(
+        self,
+        parsed_query: Dict,
+        tenant_id: Union[str, ObjectId],
+        fmt: str = "ndjson",
+        limit: Optional[int] = None,
+        priority: str = "interactive"
+    ) -> Iterator[str]:
+        """
+        Serialized matching pages. The tenant loads in db_pool; the cursor is
+        read as the caller consumes the chunks (the response streams).
+        """
+        tenant_oid = to_object_id(tenant_id)
+        self.db_pool.run(tenant_id, lambda: self._ensure_tenant(tenant_oid), priority)
+        return iter_export(parsed_query, tenant_oid, self.db["sitemaps"], fmt, self.category_index, limit)
+
+    def _count(self, parsed_query: Dict, tenant_id: Union[str, ObjectId]) -> int:
+        tenant_oid = to_object_id(tenant_id)
+        self._ensure_tenant(tenant_oid)
+        view = self.snapshots.get(tenant_oid).view()
+        mask = snapshot_mask(parsed_query, view, self.category_index, self.searcher.content_type_values)
+        return view.count(mask)
+
+    def _aggregate(self, parsed_query: Dict, tenant_id: Union[str, ObjectId]) -> Any:
+        """Snapshot answer when possible; compare/pivot and the rest run on Mongo."""
+        tenant_oid = to_object_id(tenant_id)
+        self._ensure_tenant(tenant_oid)
+        if parsed_query.get("user_intent") == "trend_analysis":
+            return answer_trend(parsed_query, tenant_oid, self.db, self.category_index)
+
+        content_types = self.searcher.content_type_values
+        compare = parsed_query.get("operation_type") == "compare" and parsed_query.get("comparison_entities")
+        pivot = pivot_dimensions(parsed_query)
+        if not compare and not pivot:
+            rows = answer_aggregation(
+                parsed_query, tenant_oid, self.snapshots, self.category_index, content_type_values=content_types
+            )
+            if rows is not None:
+                return rows
+
+        pipeline = build_structured_pipeline(parsed_query, str(tenant_oid), self.category_index, content_type_values=content_types)
+        result = coalesced_aggregate(self.db["sitemaps"], pipeline, tenant_oid, allowDiskUse=True)
+        if compare:
+            return comparison_table(result, parsed_query, str(tenant_oid), self.category_index, content_types)
+        if pivot:
+            return PivotTable.for_query(result, parsed_query, tenant_oid, self.category_index).to_dict()
+        return result
+
+    def _search(self, parsed_query: Dict, tenant_id: Union[str, ObjectId], k: int = 10) -> List[Dict]:
+        """Hybrid semantic search; plain structured listing when there is no query embedding."""
+        tenant_oid = to_object_id(tenant_id)
+        self._ensure_tenant(tenant_oid)
+        hits = hybrid_search(parsed_query, tenant_oid, k, searcher=self.searcher)
+        if not hits:
+            return structured_search(parsed_query, tenant_oid, self.db["sitemaps"], self.category_index, limit=k)
+
+        docs = {
+            d["_id"]: d
+            for d in self.db["sitemaps"].find({"_id": {"$in": [doc_id for doc_id, _ in hits]}}, {"title": 1, "fullUrl": 1})
+        }
+        return [{**docs.get(doc_id, {"_id": doc_id}), "score": score} for doc_id, score in hits]
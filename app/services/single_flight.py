@@ -0,0 +1,129 @@
+"""
+Single-flight request coalescing.
+
+Concurrent calls with the same key share one execution: the first caller
+(leader) runs the function, the others wait and receive its result or its
+exception. Nothing is cached — once the leader finishes, the next call runs
+again. Results are shared objects; callers must treat them as read-only.
+
+- parse_flights: (tenant, normalized query) -> parser output
+- pipeline_flights: (tenant, collection, pipeline hash) -> aggregation result
+"""
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+import bson
+from bson import ObjectId
+
+from app.services.query_embedding_cache import normalize_query
+
+
+class InFlight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, InFlight] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "compute_seconds": 0.0,
+        }
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._counters["calls"] += 1
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = InFlight()
+                self._counters["executions"] += 1
+            else:
+                self._counters["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        started = time.perf_counter()
+        try:
+            flight.value = fn()
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self._counters["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._counters["compute_seconds"] += time.perf_counter() - started
+                self._in_flight.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._in_flight)
+        stats["compute_seconds"] = round(stats["compute_seconds"], 3)
+        stats["coalesce_rate"] = round(stats["coalesced"] / stats["calls"], 4) if stats["calls"] else 0.0
+        return stats
+
+
+# ----------------------------
+# Keys
+# ----------------------------
+def pipeline_hash(pipeline: List[Dict]) -> str:
+    """Stable digest of a pipeline (BSON keeps key order, ObjectIds and dates exact)."""
+    return hashlib.sha256(bson.encode({"pipeline": pipeline})).hexdigest()
+
+
+def parse_key(tenant_id: Union[str, ObjectId], query: str) -> Tuple[str, str]:
+    return str(tenant_id), normalize_query(query)
+
+
+def pipeline_key(tenant_id: Union[str, ObjectId], collection_name: str, pipeline: List[Dict]) -> Tuple[str, str, str]:
+    return str(tenant_id), collection_name, pipeline_hash(pipeline)
+
+
+# Process-wide groups
+parse_flights = SingleFlight("parse")
+pipeline_flights = SingleFlight("pipeline")
+
+
+def coalesced_parse(
+    tenant_id: Union[str, ObjectId],
+    query: str,
+    parse_fn: Callable[[str], Dict],
+    flights: SingleFlight = parse_flights
+) -> Dict:
+    return flights.do(parse_key(tenant_id, query), lambda: parse_fn(query))
+
+
+def coalesced_aggregate(
+    collection,
+    pipeline: List[Dict],
+    tenant_id: Union[str, ObjectId],
+    flights: SingleFlight = pipeline_flights,
+    **kwargs
+) -> List[Dict]:
+    """list(collection.aggregate(pipeline)), shared by identical concurrent pipelines of a tenant."""
+    key = pipeline_key(tenant_id, collection.name, pipeline)
+    return flights.do(key, lambda: list(collection.aggregate(pipeline, **kwargs)))
+
+
+def coalescing_stats() -> Dict[str, Dict[str, float]]:
+    return {flights.name: flights.stats() for flights in (parse_flights, pipeline_flights)}
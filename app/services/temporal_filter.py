@@ -0,0 +1,251 @@
+"""
+Compile the parser's constraints.temporal into a date-range $match.
+
+- before / after / range use start_date / end_date; a bound given as a year,
+  month or day covers that whole period ("after 2024" starts 2025-01-01)
+- relative resolves relative_period ("last quarter", "past 30 days", "this year", ...)
+  against a single `now` per request
+- Ranges are half-open [start, end) in naive UTC, matching how Mongo stores dates;
+  "after <timestamp>" starts one millisecond (Mongo's resolution) later
+- dd/mm/yyyy vs mm/dd/yyyy is read from the values when one part is over 12,
+  otherwise SLASH_DATE_ORDER decides ("dmy" or "mdy")
+- The $match goes right after the tenant match so {tenant: 1, <field>: 1} serves both
+"""
+import calendar
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+DATE_FIELDS = ("createdAt", "updatedAt")
+DEFAULT_DATE_FIELD = "createdAt"
+
+SLASH_DATE_ORDER = os.getenv("SLASH_DATE_ORDER", "dmy")
+
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%B %d %Y", "%b %d %Y", "%d %B %Y", "%d %b %Y", "%B %Y", "%b %Y", "%Y-%m", "%Y")
+_SLASH_DATE_RE = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})$")
+_ORDINAL_RE = re.compile(r"(\d+)(st|nd|rd|th)\b", re.IGNORECASE)
+_LAST_N_RE = re.compile(r"^(?:last|past|previous)\s+(\d+)\s+(day|week|month|quarter|year)s?$")
+_UNITS = ("day", "week", "month", "quarter", "year")
+
+
+class TemporalRange(NamedTuple):
+    field: str
+    start: Optional[datetime]  # inclusive
+    end: Optional[datetime]    # exclusive
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# ----------------------------
+# Date parsing
+# ----------------------------
+def _granularity(fmt: str) -> str:
+    if "%d" in fmt:
+        return "day"
+    return "month" if "%m" in fmt or "%B" in fmt or "%b" in fmt else "year"
+
+
+def _parse_slash_date(text: str) -> Optional[datetime]:
+    """dd/mm/yyyy or mm/dd/yyyy: a part over 12 must be the day, else SLASH_DATE_ORDER."""
+    match = _SLASH_DATE_RE.match(text)
+    if not match:
+        return None
+    first, second, year = (int(g) for g in match.groups())
+    day_first = first > 12 or (second <= 12 and SLASH_DATE_ORDER != "mdy")
+    day, month = (first, second) if day_first else (second, first)
+    try:
+        return datetime(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_date(value: Any) -> Optional[Tuple[datetime, Optional[str]]]:
+    """
+    Parse an LLM-provided date. Returns (datetime in naive UTC, granularity)
+    where granularity is "year", "month" or "day" for values without a time
+    and None for timestamps; None if it can't be read.
+    """
+    if isinstance(value, datetime):
+        return value, None
+    text = str(value or "").strip()
+    if not text:
+        return None
+
+    cleaned = _ORDINAL_RE.sub(r"\1", text).replace(",", " ")
+    cleaned = " ".join(cleaned.split())
+    slash_date = _parse_slash_date(cleaned)
+    if slash_date is not None:
+        return slash_date, "day"
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, fmt), _granularity(fmt)
+        except ValueError:
+            continue
+
+    try:
+        parsed = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed, "day" if len(text) <= 10 else None
+
+
+def _add_months(dt: datetime, months: int) -> datetime:
+    month_index = dt.month - 1 + months
+    year, month = dt.year + month_index // 12, month_index % 12 + 1
+    return dt.replace(year=year, month=month, day=min(dt.day, calendar.monthrange(year, month)[1]))
+
+
+def period_start(now: datetime, unit: str) -> datetime:
+    """Start of the day/week (Monday)/month/quarter/year containing now."""
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if unit == "day":
+        return day
+    if unit == "week":
+        return day - timedelta(days=day.weekday())
+    if unit == "month":
+        return day.replace(day=1)
+    if unit == "quarter":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day.replace(month=1, day=1)
+
+
+def shift_period(dt: datetime, unit: str, n: int) -> datetime:
+    if unit == "day":
+        return dt + timedelta(days=n)
+    if unit == "week":
+        return dt + timedelta(weeks=n)
+    return _add_months(dt, n * {"month": 1, "quarter": 3, "year": 12}[unit])
+
+
+def resolve_relative_period(period: str, now: Optional[datetime] = None) -> Optional[Tuple[datetime, datetime]]:
+    """
+    "today", "yesterday", "this|last <unit>", "last|past N <unit>s", "ytd",
+    "year to date". Calendar periods ("last quarter") are whole periods;
+    rolling ones ("past 30 days") end at now.
+    """
+    now = now or utc_now()
+    text = " ".join(str(period or "").lower().replace("-", " ").split())
+    if not text:
+        return None
+
+    if text == "today":
+        return period_start(now, "day"), now
+    if text == "yesterday":
+        today = period_start(now, "day")
+        return today - timedelta(days=1), today
+    if text in ("ytd", "year to date"):
+        return period_start(now, "year"), now
+
+    parts = text.split()
+    if len(parts) == 2 and parts[1] in _UNITS:
+        which, unit = parts
+        current = period_start(now, unit)
+        if which in ("this", "current"):
+            return current, now
+        if which in ("last", "previous", "past"):
+            return shift_period(current, unit, -1), current
+
+    match = _LAST_N_RE.match(text)
+    if match:
+        n, unit = int(match.group(1)), match.group(2)
+        return shift_period(now, unit, -n), now
+    return None
+
+
+# ----------------------------
+# Constraint -> range -> $match
+# ----------------------------
+def resolve_temporal(temporal: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> Optional[TemporalRange]:
+    """Resolve constraints.temporal once; None when absent or unreadable."""
+    if not temporal:
+        return None
+    kind = temporal.get("type")
+    field = temporal.get("date_field") if temporal.get("date_field") in DATE_FIELDS else DEFAULT_DATE_FIELD
+    start = parse_date(temporal.get("start_date"))
+    end = parse_date(temporal.get("end_date"))
+
+    def _period_end(parsed: Tuple[datetime, Optional[str]]) -> datetime:
+        """End of the period the value names: the next day/month/year, or the timestamp itself."""
+        value, granularity = parsed
+        return shift_period(value, granularity, 1) if granularity else value
+
+    def _after(parsed: Tuple[datetime, Optional[str]]) -> datetime:
+        """First instant strictly after the value: its period's end, or the timestamp + 1 ms."""
+        return _period_end(parsed) if parsed[1] else parsed[0] + timedelta(milliseconds=1)
+
+    if kind == "relative":
+        bounds = resolve_relative_period(temporal.get("relative_period", ""), now)
+        return TemporalRange(field, *bounds) if bounds else None
+    if kind == "after":
+        # "after Jan 1st" starts the next day, "after 2024" the next year; the parser may put the date in either slot
+        parsed = start or end
+        return TemporalRange(field, _after(parsed), None) if parsed else None
+    if kind == "before":
+        parsed = end or start
+        return TemporalRange(field, None, parsed[0]) if parsed else None
+    if kind == "range" and (start or end):
+        return TemporalRange(field, start[0] if start else None, _period_end(end) if end else None)
+    return None
+
+
+def build_temporal_match(temporal_range: Optional[TemporalRange]) -> Dict[str, Any]:
+    """{"$match": {field: {"$gte": start, "$lt": end}}}, or {} when there is nothing to filter."""
+    if temporal_range is None:
+        return {}
+    condition: Dict[str, Any] = {}
+    if temporal_range.start is not None:
+        condition["$gte"] = temporal_range.start
+    if temporal_range.end is not None:
+        condition["$lt"] = temporal_range.end
+    return {"$match": {temporal_range.field: condition}} if condition else {}
+
+
+def ensure_temporal_indexes(collection) -> List[str]:
+    """Compound {tenant, <date field>} indexes backing the pushed-down range."""
+    return [collection.create_index([("tenant", 1), (field, 1)]) for field in DATE_FIELDS]
+
+
+# ----------------------------
+# Scan reporting
+# ----------------------------
+def _sum_key(node: Any, key: str) -> int:
+    if isinstance(node, dict):
+        return sum(v if k == key and isinstance(v, int) else _sum_key(v, key) for k, v in node.items())
+    if isinstance(node, list):
+        return sum(_sum_key(v, key) for v in node)
+    return 0
+
+
+def docs_examined(collection, pipeline: List[Dict]) -> int:
+    """totalDocsExamined from an executionStats explain of the aggregation."""
+    explain = collection.database.command(
+        "explain",
+        {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}},
+        verbosity="executionStats"
+    )
+    return _sum_key(explain, "totalDocsExamined")
+
+
+def find_temporal_stage(pipeline: List[Dict]) -> Optional[Dict[str, Any]]:
+    """The $match build_temporal_match produced, if the pipeline has one."""
+    for stage in pipeline:
+        match = stage.get("$match")
+        if isinstance(match, dict) and len(match) == 1 and next(iter(match)) in DATE_FIELDS:
+            return stage
+    return None
+
+
+def scan_reduction(collection, pipeline: List[Dict], temporal_stage: Dict[str, Any]) -> Dict[str, Any]:
+    """Docs examined with vs without the temporal stage (pipeline must contain it)."""
+    without = [stage for stage in pipeline if stage is not temporal_stage]
+    before, after = docs_examined(collection, without), docs_examined(collection, pipeline)
+    return {
+        "docs_examined_without": before,
+        "docs_examined_with": after,
+        "reduction": round(1 - after / before, 4) if before else 0.0,
+    }
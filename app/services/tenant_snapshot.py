@@ -0,0 +1,474 @@
+"""
+In-memory columnar snapshot of a tenant's sitemap metadata for analytics.
+
+- categoryAttribute: dictionary-encoded to int32 codes in a CSR layout
+  (attr_indptr offsets + attr_indices values, attr_rows = row of each entry)
+- contentType / geoFocus: one int32 code per row (-1 = missing)
+- createdAt / updatedAt: datetime64[ms] columns (NaT = missing)
+
+Writes are appended (an updated doc gets a new row, the old one is tombstoned)
+and folded into the arrays lazily; the arrays are compacted once a quarter of
+the rows are dead. Readers take a SnapshotView (one flush under the lock), so
+a mask and the counts computed from it always see the same rows.
+Count / group-by / rank / identify_gaps are bincounts over a boolean row mask,
+see answer_aggregation().
+
+parse_query_with_enhanced_tools filters are translated once by filter_spec();
+both the snapshot and hybrid search evaluate that FilterSpec.
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from threading import Event, RLock
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from bson import ObjectId
+
+from app.services.get_category_id import CategoryIndex, category_index as default_category_index, to_object_id
+from app.services.temporal_filter import DATE_FIELDS, TemporalRange, resolve_temporal, utc_now
+
+logger = logging.getLogger(__name__)
+
+VALUE_FIELDS = ("contentType", "geoFocus")
+SNAPSHOT_PROJECTION = {"categoryAttribute": 1, **{f: 1 for f in VALUE_FIELDS}, **{f: 1 for f in DATE_FIELDS}}
+LOAD_BATCH_SIZE = 5000
+COMPACT_RATIO = 0.25
+
+_NAT = np.datetime64("NaT", "ms")
+
+
+def _to_datetime64(value: Any) -> np.datetime64:
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.replace(tzinfo=None) - value.utcoffset()
+        return np.datetime64(value, "ms")
+    return _NAT
+
+
+class TenantSnapshot:
+    def __init__(self, tenant_id: Union[str, ObjectId]):
+        self.tenant_id = to_object_id(tenant_id)
+        self.version = 0
+        # Bumped when rows are renumbered (reset / compaction); otherwise rows only get appended
+        self.layout = 0
+        self.synced_at: Optional[datetime] = None
+        self._lock = RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._ids: List[ObjectId] = []
+        self._rows: Dict[ObjectId, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+
+        self.attr_codes: Dict[ObjectId, int] = {}
+        self.attr_ids: List[ObjectId] = []
+        self.attr_indptr = np.zeros(1, dtype=np.int64)
+        self.attr_indices = np.empty(0, dtype=np.int32)
+        self.attr_rows = np.empty(0, dtype=np.int32)
+
+        self.value_codes: Dict[str, Dict[Any, int]] = {f: {} for f in VALUE_FIELDS}
+        self.value_names: Dict[str, List[Any]] = {f: [] for f in VALUE_FIELDS}
+        self.value_columns: Dict[str, np.ndarray] = {f: np.empty(0, dtype=np.int32) for f in VALUE_FIELDS}
+        self.date_columns: Dict[str, np.ndarray] = {f: np.empty(0, dtype="datetime64[ms]") for f in DATE_FIELDS}
+
+        self._pending: List[Optional[Tuple]] = []  # encoded rows not yet in the arrays (None = superseded)
+        self._dead = 0
+        self.layout += 1
+
+    @property
+    def size(self) -> int:
+        """Live documents."""
+        return len(self._ids) - self._dead
+
+    # ----------------------------
+    # Loading / writes
+    # ----------------------------
+    @classmethod
+    def from_collection(cls, collection, tenant_id: Union[str, ObjectId]) -> "TenantSnapshot":
+        snapshot = cls(tenant_id)
+        snapshot.refresh(collection, full=True)
+        return snapshot
+
+    def refresh(self, collection, full: bool = False) -> int:
+        """Pull docs with updatedAt after the last sync (everything if full=True)."""
+        started = utc_now()
+        query: Dict[str, Any] = {"tenant": self.tenant_id}
+        if self.synced_at is not None and not full:
+            query["updatedAt"] = {"$gt": self.synced_at}
+        if full:
+            with self._lock:
+                self._reset()
+                self.version += 1
+
+        latest = None if full else self.synced_at
+        batch: List[Dict] = []
+        changed = 0
+        for doc in collection.find(query, SNAPSHOT_PROJECTION, batch_size=LOAD_BATCH_SIZE):
+            batch.append(doc)
+            updated_at = doc.get("updatedAt")
+            if updated_at is not None and (latest is None or updated_at > latest):
+                latest = updated_at
+            if len(batch) >= LOAD_BATCH_SIZE:
+                changed += self.upsert_many(batch)
+                batch = []
+        if batch:
+            changed += self.upsert_many(batch)
+        # Without updatedAt on any doc (or no docs yet) synced_at would stay None
+        # and every refresh would reload the whole tenant
+        self.synced_at = latest if latest is not None else started
+        return changed
+
+    def upsert_many(self, docs: Iterable[Dict]) -> int:
+        count = 0
+        with self._lock:
+            for doc in docs:
+                old = self._rows.get(doc["_id"])
+                if old is not None:
+                    self._kill(old)
+                self._rows[doc["_id"]] = len(self._ids)
+                self._ids.append(doc["_id"])
+                self._pending.append(self._encode(doc))
+                count += 1
+            if count:
+                self.version += 1
+        return count
+
+    def remove(self, doc_id: ObjectId) -> bool:
+        with self._lock:
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                return False
+            self._kill(row)
+            self.version += 1
+            return True
+
+    def _kill(self, row: int) -> None:
+        base = len(self.alive)
+        if row < base:
+            if self.alive[row]:
+                self.alive[row] = False
+                self._dead += 1
+        elif self._pending[row - base] is not None:
+            self._pending[row - base] = None
+            self._dead += 1
+
+    def _encode(self, doc: Dict) -> Tuple:
+        codes = []
+        for attr_id in doc.get("categoryAttribute") or []:
+            code = self.attr_codes.get(attr_id)
+            if code is None:
+                code = self.attr_codes[attr_id] = len(self.attr_ids)
+                self.attr_ids.append(attr_id)
+            codes.append(code)
+        values = []
+        for field in VALUE_FIELDS:
+            value = doc.get(field)
+            if value is None:
+                values.append(-1)
+                continue
+            codes_for_field = self.value_codes[field]
+            if value not in codes_for_field:
+                codes_for_field[value] = len(codes_for_field)
+                self.value_names[field].append(value)
+            values.append(codes_for_field[value])
+        dates = [_to_datetime64(doc.get(field)) for field in DATE_FIELDS]
+        return codes, values, dates
+
+    def _flush(self) -> None:
+        """Fold pending rows into the arrays (caller holds the lock)."""
+        if self._pending:
+            pending, self._pending = self._pending, []
+            n = len(pending)
+            empty = ([], [-1] * len(VALUE_FIELDS), [_NAT] * len(DATE_FIELDS))
+            rows = [entry or empty for entry in pending]
+            lengths = np.fromiter((len(r[0]) for r in rows), dtype=np.int64, count=n)
+            base = len(self.alive)
+
+            self.attr_indices = np.concatenate([self.attr_indices, np.fromiter((c for r in rows for c in r[0]), dtype=np.int32, count=int(lengths.sum()))])
+            self.attr_rows = np.concatenate([self.attr_rows, np.repeat(np.arange(base, base + n, dtype=np.int32), lengths)])
+            self.attr_indptr = np.concatenate([self.attr_indptr, self.attr_indptr[-1] + np.cumsum(lengths)])
+            for i, field in enumerate(VALUE_FIELDS):
+                self.value_columns[field] = np.concatenate([self.value_columns[field], np.array([r[1][i] for r in rows], dtype=np.int32)])
+            for i, field in enumerate(DATE_FIELDS):
+                self.date_columns[field] = np.concatenate([self.date_columns[field], np.array([r[2][i] for r in rows], dtype="datetime64[ms]")])
+            self.alive = np.concatenate([self.alive, np.fromiter((entry is not None for entry in pending), dtype=bool, count=n)])
+
+        if self._dead and self._dead > COMPACT_RATIO * len(self.alive):
+            self._compact()
+
+    def _compact(self) -> None:
+        keep = self.alive
+        new_row = np.cumsum(keep) - 1
+        entries = keep[self.attr_rows]
+        lengths = np.diff(self.attr_indptr)[keep]
+
+        self.attr_indices = self.attr_indices[entries]
+        self.attr_rows = new_row[self.attr_rows[entries]].astype(np.int32)
+        self.attr_indptr = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        for field in VALUE_FIELDS:
+            self.value_columns[field] = self.value_columns[field][keep]
+        for field in DATE_FIELDS:
+            self.date_columns[field] = self.date_columns[field][keep]
+
+        self._ids = [self._ids[i] for i in np.flatnonzero(keep)]
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self.alive = np.ones(len(self._ids), dtype=bool)
+        self._dead = 0
+        self.layout += 1
+
+    def view(self) -> "SnapshotView":
+        """Flush once and freeze the arrays; later writes don't affect the view."""
+        with self._lock:
+            self._flush()
+            return SnapshotView(self)
+
+
+class SnapshotView:
+    """
+    A consistent read of a TenantSnapshot. _flush/_compact replace arrays rather
+    than editing them, except `alive` (tombstones), which is copied here.
+    """
+
+    def __init__(self, snapshot: TenantSnapshot):
+        self.tenant_id = snapshot.tenant_id
+        self.version = snapshot.version
+        self.layout = snapshot.layout
+        self.rows = len(snapshot.alive)
+        self.ids = snapshot._ids
+        self.alive = snapshot.alive.copy()
+        self.attr_codes = snapshot.attr_codes
+        self.attr_indices = snapshot.attr_indices
+        self.attr_rows = snapshot.attr_rows
+        self.value_codes = snapshot.value_codes
+        self.value_names = {f: list(names) for f, names in snapshot.value_names.items()}
+        self.value_columns = dict(snapshot.value_columns)
+        self.date_columns = dict(snapshot.date_columns)
+
+    # ----------------------------
+    # Masks
+    # ----------------------------
+    def attribute_mask(self, attribute_ids: Iterable[ObjectId]) -> np.ndarray:
+        """Rows having ANY of the attribute ids."""
+        wanted = [self.attr_codes[a] for a in attribute_ids if a in self.attr_codes]
+        mask = np.zeros(self.rows, dtype=bool)
+        if wanted:
+            mask[self.attr_rows[np.isin(self.attr_indices, wanted)]] = True
+        return mask
+
+    def value_mask(self, field: str, values: Iterable[Any]) -> np.ndarray:
+        codes = self.value_codes.get(field, {})
+        wanted = [codes[v] for v in values if v in codes]
+        if not wanted:
+            return np.zeros(self.rows, dtype=bool)
+        return np.isin(self.value_columns[field], wanted)
+
+    def date_mask(self, temporal_range: TemporalRange) -> np.ndarray:
+        column = self.date_columns[temporal_range.field]
+        mask = ~np.isnat(column)
+        if temporal_range.start is not None:
+            mask &= column >= np.datetime64(temporal_range.start, "ms")
+        if temporal_range.end is not None:
+            mask &= column < np.datetime64(temporal_range.end, "ms")
+        return mask
+
+    def filter_mask(self, spec: Optional["FilterSpec"] = None) -> np.ndarray:
+        """Live rows matching every group / field (OR within one, AND across)."""
+        mask = self.alive.copy()
+        if spec is None:
+            return mask
+        for ids in spec.attribute_groups:
+            mask &= self.attribute_mask(ids)
+        for field, values in spec.value_filters.items():
+            mask &= self.value_mask(field, values)
+        if spec.temporal_range is not None:
+            mask &= self.date_mask(spec.temporal_range)
+        return mask
+
+    # ----------------------------
+    # Aggregates
+    # ----------------------------
+    def count(self, mask: Optional[np.ndarray] = None) -> int:
+        return int(np.count_nonzero(self.alive if mask is None else mask))
+
+    def attribute_counts(self, attribute_ids: Sequence[ObjectId], mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Docs per attribute id (aligned with attribute_ids; unknown ids count 0)."""
+        mask = self.alive if mask is None else mask
+        totals = np.bincount(self.attr_indices[mask[self.attr_rows]], minlength=len(self.attr_codes))
+        codes = np.array([self.attr_codes.get(a, -1) for a in attribute_ids], dtype=np.int64)
+        return np.where(codes >= 0, totals[np.maximum(codes, 0)] if len(totals) else 0, 0)
+
+    def value_counts(self, field: str, mask: Optional[np.ndarray] = None) -> Dict[Any, int]:
+        mask = self.alive if mask is None else mask
+        column = self.value_columns[field][mask]
+        counts = np.bincount(column[column >= 0], minlength=len(self.value_names[field]))
+        return {name: int(c) for name, c in zip(self.value_names[field], counts)}
+
+
+class TenantSnapshotRegistry:
+    """Process-wide snapshots, built from Mongo on first use and kept current by refresh()/apply_change()."""
+
+    def __init__(self, db=None, collection_name: str = "sitemaps"):
+        self._db = db
+        self.collection_name = collection_name
+        self._snapshots: Dict[ObjectId, TenantSnapshot] = {}
+        self._lock = RLock()
+
+    @property
+    def collection(self):
+        if self._db is None:
+            from app.services.mongo_client import get_mongo_client
+            self._db = get_mongo_client()
+        return self._db[self.collection_name]
+
+    def get(self, tenant_id: Union[str, ObjectId]) -> TenantSnapshot:
+        tenant_oid = to_object_id(tenant_id)
+        snapshot = self._snapshots.get(tenant_oid)
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshots.get(tenant_oid)
+            if snapshot is None:
+                snapshot = TenantSnapshot.from_collection(self.collection, tenant_oid)
+                self._snapshots[tenant_oid] = snapshot
+                logger.info(f"Snapshot ready for tenant {tenant_oid}: {snapshot.size} docs")
+        return snapshot
+
+    def refresh(self, tenant_id: Optional[Union[str, ObjectId]] = None) -> int:
+        snapshots = [self.get(tenant_id)] if tenant_id is not None else list(self._snapshots.values())
+        return sum(snapshot.refresh(self.collection) for snapshot in snapshots)
+
+    def apply_change(self, change: dict) -> None:
+        """Apply one change-stream event from the sitemaps collection."""
+        doc_id = change.get("documentKey", {}).get("_id")
+        if change.get("operationType") == "delete":
+            for snapshot in list(self._snapshots.values()):
+                snapshot.remove(doc_id)
+            return
+        doc = change.get("fullDocument") or {}
+        snapshot = self._snapshots.get(doc.get("tenant"))
+        if snapshot is not None:
+            snapshot.upsert_many([doc])
+
+    def follow_changes(self, stop: Optional[Event] = None) -> None:
+        """Keep loaded snapshots in sync via a change stream (requires a replica set)."""
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        with self.collection.watch(pipeline, full_document="updateLookup") as stream:
+            while stop is None or not stop.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self.apply_change(change)
+
+
+# Single process-wide registry
+tenant_snapshots = TenantSnapshotRegistry()
+
+
+# ----------------------------
+# parse_query_with_enhanced_tools output -> answer
+# ----------------------------
+@dataclass
+class FilterSpec:
+    """A parsed query's filters, resolved to stored values: AND across entries, OR within one."""
+    attribute_groups: List[List[ObjectId]] = field(default_factory=list)
+    value_filters: Dict[str, List[Any]] = field(default_factory=dict)
+    temporal_range: Optional[TemporalRange] = None
+
+    @property
+    def empty(self) -> bool:
+        return not self.attribute_groups and not self.value_filters and self.temporal_range is None
+
+
+def filter_spec(
+    parsed_query: Dict,
+    tenant_id: Union[str, ObjectId],
+    category_index: CategoryIndex = default_category_index,
+    content_type_values: Optional[Callable[[ObjectId, Iterable[str]], List[Any]]] = None,
+    now: Optional[datetime] = None
+) -> FilterSpec:
+    """
+    Same filter semantics as the structured pipeline. Unresolvable category
+    values give an empty group, which matches nothing (like the $lookup).
+    """
+    tenant_oid = to_object_id(tenant_id)
+    mapping = parsed_query.get("database_mapping", {}) or {}
+    spec = FilterSpec()
+
+    for join in mapping.get("required_joins", []):
+        values = join.get("values") or []
+        if not values:
+            continue
+        if join.get("collection") == "category_attributes":
+            spec.attribute_groups.append(category_index.get_attribute_ids(tenant_oid, join.get("category", ""), values))
+        elif join.get("field") == "contentType":
+            if content_type_values is None:
+                from app.services.hybrid_search import hybrid_searcher
+                content_type_values = hybrid_searcher.content_type_values
+            spec.value_filters["contentType"] = content_type_values(tenant_oid, values)
+    for field_name, values in (mapping.get("direct_fields") or {}).items():
+        if values and field_name in VALUE_FIELDS:
+            spec.value_filters[field_name] = list(values)
+
+    spec.temporal_range = resolve_temporal((parsed_query.get("constraints") or {}).get("temporal"), now)
+    return spec
+
+
+def snapshot_mask(
+    parsed_query: Dict,
+    view: SnapshotView,
+    category_index: CategoryIndex = default_category_index,
+    content_type_values: Optional[Callable[[ObjectId, Iterable[str]], List[Any]]] = None,
+    now: Optional[datetime] = None
+) -> np.ndarray:
+    """parsed_query's filters as a row mask over the view."""
+    return view.filter_mask(filter_spec(parsed_query, view.tenant_id, category_index, content_type_values, now))
+
+
+def category_distribution(
+    view: SnapshotView,
+    category: str,
+    mask: np.ndarray,
+    category_index: CategoryIndex = default_category_index
+) -> Tuple[List[str], np.ndarray]:
+    """(attribute names, doc counts) for every attribute of the category, zeros included."""
+    attributes = category_index.get_category_attributes(view.tenant_id, category)
+    names = [name for _, name in attributes]
+    return names, view.attribute_counts([attr_id for attr_id, _ in attributes], mask)
+
+
+def answer_aggregation(
+    parsed_query: Dict,
+    tenant_id: Union[str, ObjectId],
+    registry: TenantSnapshotRegistry = tenant_snapshots,
+    category_index: CategoryIndex = default_category_index,
+    now: Optional[datetime] = None,
+    content_type_values: Optional[Callable[[ObjectId, Iterable[str]], List[Any]]] = None
+) -> Optional[List[Dict]]:
+    """
+    Answer count / aggregate / rank / identify_gaps from the snapshot, in the
+    shape apply_aggregation's pipelines return. None when the query needs Mongo
+    (not an aggregation, or grouping by more than one category).
+    """
+    operation = parsed_query.get("operation_type")
+    agg_fields = (parsed_query.get("database_mapping", {}) or {}).get("aggregation_fields", [])
+    if operation not in ("count", "aggregate", "rank", "identify_gaps") and not parsed_query.get("aggregation_requested"):
+        return None
+    if len(agg_fields) > 1:
+        return None
+
+    tenant_oid = to_object_id(tenant_id)
+    view = registry.get(tenant_oid).view()
+    if not category_index.has_tenant(tenant_oid):
+        category_index.refresh_tenant(registry.collection.database, tenant_oid)
+    mask = snapshot_mask(parsed_query, view, category_index, content_type_values, now)
+
+    if operation == "count" or not agg_fields:
+        return [{"total_results": view.count(mask)}]
+
+    names, counts = category_distribution(view, agg_fields[0], mask, category_index)
+    if operation == "identify_gaps":
+        order = np.argsort(counts, kind="stable")
+    else:
+        order = np.argsort(-counts, kind="stable")
+    rows = [{"_id": names[i], "count": int(counts[i])} for i in order]
+    return rows[:1] if operation == "rank" else rows
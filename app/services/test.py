@@ -1,7 +1,7 @@
 # test_pipeline.py
-from try_query_parser import parse_query_with_enhanced_tools
-from pipeline_builder import build_structured_pipeline
-from pipeline_executor import execute_pipeline_count
+from app.services.try_query_parser import parse_query_with_enhanced_tools
+from app.services.pipeline_builder import build_structured_pipeline
+from app.services.pipeline_executor import execute_pipeline_count
 from bson import ObjectId
 from pprint import pprint
 
@@ -0,0 +1,328 @@
+"""
+Time-bucketed content counts for trend_analysis queries.
+
+Rollup rows live in `trend_rollups`, one per (tenant, period, date field,
+bucket, category attribute); rows with attribute=None hold the bucket's
+document count. Buckets come from $dateTrunc (weeks start Monday, same as
+temporal_filter.period_start).
+
+- A bucket is closed once it ends more than TREND_LATE_ARRIVAL_DAYS ago; closed
+  rows are never recomputed (rebuild=True forces it)
+- refresh_rollups() recomputes only buckets from the previous closing point on,
+  so each refresh scans recent sitemaps instead of the whole tenant
+- Refreshes of one (tenant, period, field) hold a lease in `trend_rollup_state`
+  (TREND_REFRESH_LEASE_SECONDS); a refresh that finds it held is skipped
+- read_trend() refreshes when older than TREND_MAX_STALENESS_SECONDS, then reads
+  a few hundred rollup rows; buckets only partly inside [since, until) are
+  counted live over the covered part instead of read whole
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from bson import ObjectId
+from pymongo import ASCENDING, ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.services.get_category_id import CategoryIndex, category_index as default_category_index, normalize_key, to_object_id
+from app.services.temporal_filter import DEFAULT_DATE_FIELD, period_start, resolve_temporal, shift_period, utc_now
+from app.services.try_query_builder import build_shared_filter_stages
+
+ROLLUP_COLLECTION = "trend_rollups"
+ROLLUP_STATE_COLLECTION = "trend_rollup_state"
+PERIODS = ("day", "week", "month", "quarter", "year")
+DEFAULT_PERIOD = "month"
+LATE_ARRIVAL_GRACE = timedelta(days=int(os.getenv("TREND_LATE_ARRIVAL_DAYS", "2")))
+MAX_STALENESS = timedelta(seconds=int(os.getenv("TREND_MAX_STALENESS_SECONDS", "300")))
+REFRESH_LEASE = timedelta(seconds=int(os.getenv("TREND_REFRESH_LEASE_SECONDS", "300")))
+
+_PERIOD_WORDS = {
+    "day": ("daily", "per day", "by day", "each day"),
+    "week": ("weekly", "per week", "by week", "each week", "week over week"),
+    "month": ("monthly", "per month", "by month", "each month", "month over month"),
+    "quarter": ("quarterly", "per quarter", "by quarter", "each quarter", "quarter over quarter"),
+    "year": ("yearly", "annually", "per year", "by year", "each year", "year over year"),
+}
+
+RollupRow = Tuple[datetime, Optional[ObjectId], int]  # (bucket, attribute or None for totals, count)
+
+
+def _state_id(tenant_oid: ObjectId, period: str, field: str) -> str:
+    return f"{tenant_oid}:{period}:{field}"
+
+
+def ensure_rollup_indexes(db) -> None:
+    db[ROLLUP_COLLECTION].create_index(
+        [("tenant", ASCENDING), ("period", ASCENDING), ("field", ASCENDING), ("bucket", ASCENDING), ("attribute", ASCENDING)],
+        unique=True
+    )
+
+
+# ----------------------------
+# Bucketing pipeline
+# ----------------------------
+def build_bucket_pipeline(match_stages: List[Dict], period: str, field: str = DEFAULT_DATE_FIELD) -> List[Dict]:
+    """
+    match_stages (tenant match and any filters) + $dateTrunc bucketing, then one
+    $facet producing per-attribute and per-bucket total counts.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period '{period}'. Options: {PERIODS}")
+    trunc: Dict[str, Any] = {"date": f"${field}", "unit": period}
+    if period == "week":
+        trunc["startOfWeek"] = "monday"
+    return [
+        *match_stages,
+        {"$match": {field: {"$type": "date"}}},
+        {"$project": {"_id": 0, "bucket": {"$dateTrunc": trunc}, "categoryAttribute": 1}},
+        {"$facet": {
+            "attributes": [
+                {"$unwind": "$categoryAttribute"},
+                {"$group": {"_id": {"bucket": "$bucket", "attribute": "$categoryAttribute"}, "count": {"$sum": 1}}},
+            ],
+            "totals": [{"$group": {"_id": "$bucket", "count": {"$sum": 1}}}],
+        }},
+    ]
+
+
+def bucket_rows(result: List[Dict]) -> List[RollupRow]:
+    facet = result[0] if result else {}
+    rows: List[RollupRow] = [(doc["_id"]["bucket"], doc["_id"]["attribute"], doc["count"]) for doc in facet.get("attributes", [])]
+    rows.extend((doc["_id"], None, doc["count"]) for doc in facet.get("totals", []))
+    return rows
+
+
+# ----------------------------
+# Maintenance
+# ----------------------------
+def _acquire_lease(db, state_id: str, refresh_id: ObjectId) -> Optional[Dict]:
+    """Take the refresh lease for state_id; the state doc on success, None while another refresh holds it."""
+    clock = utc_now()
+    try:
+        return db[ROLLUP_STATE_COLLECTION].find_one_and_update(
+            {"_id": state_id, "$or": [{"leaseUntil": None}, {"leaseUntil": {"$lt": clock}}]},
+            {"$set": {"leaseId": refresh_id, "leaseUntil": clock + REFRESH_LEASE}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None
+
+
+def refresh_rollups(
+    db,
+    tenant_id: Union[str, ObjectId],
+    period: str = DEFAULT_PERIOD,
+    field: str = DEFAULT_DATE_FIELD,
+    now: Optional[datetime] = None,
+    rebuild: bool = False
+) -> Dict[str, Any]:
+    """
+    Recompute open buckets (all buckets on first run or rebuild) and close the
+    ones past the grace period. Returns {"skipped": True} when another refresh
+    of the same (tenant, period, field) holds the lease.
+    """
+    tenant_oid = to_object_id(tenant_id)
+    now = now or utc_now()
+    state_id = _state_id(tenant_oid, period, field)
+    refresh_id = ObjectId()
+    state = _acquire_lease(db, state_id, refresh_id)
+    if state is None:
+        return {"skipped": True}
+
+    since = None if rebuild else state.get("closedThrough")
+    horizon = period_start(now - LATE_ARRIVAL_GRACE, period)  # buckets starting before this are closed
+
+    match: Dict[str, Any] = {"tenant": tenant_oid}
+    if since is not None:
+        match[field] = {"$gte": since}
+    rows = bucket_rows(list(db["sitemaps"].aggregate(build_bucket_pipeline([{"$match": match}], period, field), allowDiskUse=True)))
+
+    key = {"tenant": tenant_oid, "period": period, "field": field}
+    ops = [
+        ReplaceOne(
+            {**key, "bucket": bucket, "attribute": attribute},
+            {**key, "bucket": bucket, "attribute": attribute, "count": count, "closed": bucket < horizon,
+             "computedAt": now, "refreshId": refresh_id},
+            upsert=True
+        )
+        for bucket, attribute, count in rows
+    ]
+    if ops:
+        db[ROLLUP_COLLECTION].bulk_write(ops, ordered=False)
+
+    # Rows in the recomputed range that this refresh didn't rewrite now have no documents
+    stale = {**key, "refreshId": {"$ne": refresh_id}}
+    if since is not None:
+        stale["bucket"] = {"$gte": since}
+    deleted = db[ROLLUP_COLLECTION].delete_many(stale).deleted_count
+
+    db[ROLLUP_STATE_COLLECTION].update_one(
+        {"_id": state_id, "leaseId": refresh_id},
+        {"$set": {"closedThrough": horizon, "refreshedAt": now}, "$unset": {"leaseId": "", "leaseUntil": ""}}
+    )
+    return {"recomputed_from": since, "closed_through": horizon, "rows": len(rows), "deleted": deleted}
+
+
+def _live_rows(db, tenant_oid: ObjectId, period: str, field: str, start: Optional[datetime], end: Optional[datetime]) -> List[RollupRow]:
+    """Bucket counts straight from sitemaps for [start, end) (open ends unbounded)."""
+    match: Dict[str, Any] = {"tenant": tenant_oid}
+    bounds = {op: value for op, value in (("$gte", start), ("$lt", end)) if value is not None}
+    if bounds:
+        match[field] = bounds
+    return bucket_rows(list(db["sitemaps"].aggregate(build_bucket_pipeline([{"$match": match}], period, field), allowDiskUse=True)))
+
+
+def read_trend(
+    db,
+    tenant_id: Union[str, ObjectId],
+    period: str = DEFAULT_PERIOD,
+    field: str = DEFAULT_DATE_FIELD,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    now: Optional[datetime] = None,
+    max_staleness: timedelta = MAX_STALENESS
+) -> List[RollupRow]:
+    """
+    Bucket rows for [since, until), refreshing first if they're older than
+    max_staleness. Whole buckets come from the rollups; a bucket cut by since
+    or until is counted live over the part inside the range.
+    """
+    tenant_oid = to_object_id(tenant_id)
+    now = now or utc_now()
+    state = db[ROLLUP_STATE_COLLECTION].find_one({"_id": _state_id(tenant_oid, period, field)})
+    if state is None or state.get("refreshedAt") is None or now - state["refreshedAt"] > max_staleness:
+        refresh_rollups(db, tenant_oid, period, field, now)
+
+    # [first, last) is the run of whole buckets inside the range
+    first = period_start(since, period) if since is not None else None
+    if first is not None and first < since:
+        first = shift_period(first, period, 1)
+    last = period_start(until, period) if until is not None else None
+    if first is not None and last is not None and first >= last:
+        return _live_rows(db, tenant_oid, period, field, since, until)
+
+    rows: List[RollupRow] = []
+    if first is not None and first > since:
+        rows.extend(_live_rows(db, tenant_oid, period, field, since, first))
+    if last is not None and last < until:
+        rows.extend(_live_rows(db, tenant_oid, period, field, last, until))
+
+    query: Dict[str, Any] = {"tenant": tenant_oid, "period": period, "field": field}
+    if first is not None or last is not None:
+        query["bucket"] = {}
+        if first is not None:
+            query["bucket"]["$gte"] = first
+        if last is not None:
+            query["bucket"]["$lt"] = last
+    cursor = db[ROLLUP_COLLECTION].find(query, {"_id": 0, "bucket": 1, "attribute": 1, "count": 1})
+    rows.extend((doc["bucket"], doc.get("attribute"), doc["count"]) for doc in cursor)
+    return rows
+
+
+# ----------------------------
+# Series
+# ----------------------------
+def bucket_range(first: datetime, last: datetime, period: str) -> List[datetime]:
+    buckets, current = [], period_start(first, period)
+    while current <= last:
+        buckets.append(current)
+        current = shift_period(current, period, 1)
+    return buckets
+
+
+def trend_series(
+    rows: Sequence[RollupRow],
+    attributes: Sequence[Tuple[ObjectId, str]],
+    period: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Dense series: every bucket in range and every attribute, zeros included."""
+    bucket_values = [bucket for bucket, _, _ in rows]
+    if not bucket_values and (since is None or until is None):
+        return {"period": period, "buckets": [], "series": {name: [] for _, name in attributes}, "totals": []}
+    first = since or min(bucket_values)
+    last = (until - timedelta(microseconds=1)) if until else max(bucket_values)
+    buckets = bucket_range(first, last, period)
+
+    bucket_pos = {bucket: i for i, bucket in enumerate(buckets)}
+    attr_pos = {attr_id: i for i, (attr_id, _) in enumerate(attributes)}
+    counts = np.zeros((len(attributes), len(buckets)), dtype=np.int64)
+    totals = np.zeros(len(buckets), dtype=np.int64)
+    for bucket, attribute, count in rows:
+        j = bucket_pos.get(bucket)
+        if j is None:
+            continue
+        if attribute is None:
+            totals[j] += count
+        elif attribute in attr_pos:
+            counts[attr_pos[attribute], j] += count
+
+    return {
+        "period": period,
+        "buckets": [bucket.isoformat() for bucket in buckets],
+        "series": {name: counts[i].tolist() for i, (_, name) in enumerate(attributes)},
+        "totals": totals.tolist(),
+    }
+
+
+def infer_period(parsed_query: Dict) -> str:
+    text = (parsed_query.get("query_text") or "").lower()
+    for period, words in _PERIOD_WORDS.items():
+        if any(word in text for word in words):
+            return period
+    return DEFAULT_PERIOD
+
+
+def answer_trend(
+    parsed_query: Dict,
+    tenant_id: Union[str, ObjectId],
+    db,
+    category_index: CategoryIndex = default_category_index,
+    period: Optional[str] = None,
+    now: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Trend of content counts per attribute of the query's category over time.
+    Reads rollups when the only filters are on that category (they just pick
+    series); other filters need a live $dateTrunc aggregation over sitemaps.
+    """
+    tenant_oid = to_object_id(tenant_id)
+    now = now or utc_now()
+    period = period or infer_period(parsed_query)
+    mapping = parsed_query.get("database_mapping", {}) or {}
+    joins = [j for j in mapping.get("required_joins", []) if j.get("collection") == "category_attributes"]
+
+    category = (mapping.get("aggregation_fields") or [None])[0] or next((j.get("category") for j in joins), None)
+    attributes = category_index.get_category_attributes(tenant_oid, category) if category else []
+    selected = [j for j in joins if j.get("values") and normalize_key(j.get("category") or "") == normalize_key(category or "")]
+    if selected:
+        wanted = {a for j in selected for a in category_index.get_attribute_ids(tenant_oid, category, j["values"])}
+        attributes = [(attr_id, name) for attr_id, name in attributes if attr_id in wanted]
+
+    temporal_range = resolve_temporal((parsed_query.get("constraints") or {}).get("temporal"), now)
+    field = temporal_range.field if temporal_range else DEFAULT_DATE_FIELD
+    since = temporal_range.start if temporal_range else None
+    until = temporal_range.end if temporal_range else None
+
+    other_filters = any(
+        j.get("values") and normalize_key(j.get("category") or "") != normalize_key(category or "")
+        for j in mapping.get("required_joins", [])
+    ) or any(values for values in (mapping.get("direct_fields") or {}).values())
+
+    if other_filters:
+        stages = build_shared_filter_stages(
+            parsed_query, str(tenant_oid), category_index, now,
+            keep=lambda f, values, cat: normalize_key(cat or "") != normalize_key(category or "")
+        )
+        rows = bucket_rows(list(db["sitemaps"].aggregate(build_bucket_pipeline(stages, period, field), allowDiskUse=True)))
+        source = "live"
+    else:
+        rows = read_trend(db, tenant_oid, period, field, since, until, now)
+        source = "rollup"
+
+    series = trend_series(rows, attributes, period, period_start(since, period) if since else None, until)
+    series.update(category=category, source=source)
+    return series
@@ -1,6 +1,8 @@
-from typing import Any, Dict, List, Union, Optional
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Tuple, Union, Optional
 from bson import ObjectId
-from typing import Dict, Optional
+from app.services.get_category_id import normalize_key
+from app.services.temporal_filter import build_temporal_match, resolve_temporal
 
 
 # -------------------------
@@ -18,15 +20,46 @@ FILTER_MAPPING = {
 }
 
 
-    
-# for joining the categories with sitemaps      
+def resolve_category_filter(
+    join: Dict[str, Any],
+    tenant_oid: ObjectId,
+    category_index: Any
+) -> Optional[Dict[str, Any]]:
+    """
+    Turn a category_attributes join with values into a plain
+    {"$match": {"categoryAttribute": {"$in": [attribute ids]}}} using the
+    in-memory CategoryIndex. Returns None when the join can't be fully resolved
+    (no index, no values, unknown names) so the caller falls back to $lookup.
+    """
+    values = join.get("values") or []
+    category_name = join.get("category")
+    if not values or not category_name or join.get("collection") != "category_attributes":
+        return None
+    if join.get("lookup_field", "name") != "name" or not hasattr(category_index, "get_attribute_ids"):
+        return None
+
+    attribute_ids = category_index.get_attribute_ids(tenant_oid, category_name, values)
+    if len(attribute_ids) < len({normalize_key(v) for v in values}):
+        return None
+
+    return {"$match": {join["field"]: {"$in": attribute_ids}}}
+
+
+# for joining the categories with sitemaps
 def build_category_lookups( 
     required_joins: List[Dict[str, Any]],
     tenant_id: Union[str, ObjectId],
     category_index: Any,
     *,
-    as_suffix: str = "Details"
+    as_suffix: str = "Details",
+    keep_lookup: Iterable[str] = ()
 ) -> List[Dict[str, Any]]:
+    """
+    One stage per join: a $match on attribute ids when the CategoryIndex can
+    resolve every value, otherwise $lookup + $unwind. Joins of the categories
+    in keep_lookup always use $lookup, because a later $group reads their
+    `<field>Details` documents.
+    """
     # Normalize tenant_id
     if not isinstance(tenant_id, ObjectId):
         try:
@@ -37,6 +70,7 @@ def build_category_lookups(
         tenant_oid = tenant_id
 
     stages: List[Dict[str, Any]] = []
+    lookup_categories = {normalize_key(c) for c in keep_lookup}
 
     for join in (required_joins or []):
         collection: str = join.get("collection", "").strip()
@@ -50,6 +84,14 @@ def build_category_lookups(
             # Skip malformed join
             continue
 
+        # Fast path: resolve attribute names to ids in memory and match on the
+        # sitemap's own array instead of joining category_attributes.
+        keep = normalize_key(category_name or "") in lookup_categories
+        id_match = None if keep else resolve_category_filter(join, tenant_oid, category_index)
+        if id_match:
+            stages.append(id_match)
+            continue
+
         # Resolve category_id via category_extracter (if provided)
         category_match: Dict[str, Any] = {}
         if category_name:
@@ -126,6 +168,13 @@ def apply_direct_field_filters(filters: dict) -> dict:
     else:
         return {}
 
+def grouped_categories(parser_output: dict) -> List[str]:
+    """Aggregation fields apply_aggregation will $group on (via categoryAttributeDetails)."""
+    if parser_output.get("operation_type") not in ["aggregate", "rank"]:
+        return []
+    return parser_output.get("database_mapping", {}).get("aggregation_fields", []) or []
+
+
 def apply_aggregation(pipeline: List[Dict], parser_output: dict) -> List[Dict]:
     """
     Extend the existing pipeline to handle aggregation, counts, and top-N queries
@@ -176,19 +225,295 @@ def apply_aggregation(pipeline: List[Dict], parser_output: dict) -> List[Dict]:
 
 
 
-def build_structured_pipeline(parser_output: dict, tenant_id: str, extractor) -> list:
+# -------------------------
+# Filters for compare / pivot
+# -------------------------
+def build_shared_filter_stages(
+    parser_output: dict,
+    tenant_id: str,
+    category_index: Any,
+    now: Optional[datetime],
+    keep: Callable[[str, List[Any], Optional[str]], bool]
+) -> List[Dict[str, Any]]:
+    """
+    Tenant match, temporal range, and the category/direct filters for which
+    keep(field, values, category) is true — for modes that handle some
+    filters themselves (compare entities, pivot dimensions).
+    """
+    tenant_oid = ObjectId(str(tenant_id))
+    stages = [build_tenant_match(tenant_id)]
+    temporal = (parser_output.get("constraints") or {}).get("temporal")
+    temporal_stage = build_temporal_match(resolve_temporal(temporal, now))
+    if temporal_stage:
+        stages.append(temporal_stage)
+
+    mapping = parser_output.get("database_mapping", {}) or {}
+    joins = [
+        j for j in mapping.get("required_joins", [])
+        if j.get("values") and keep(j.get("field", ""), j["values"], j.get("category"))
+    ]
+    stages.extend(build_category_lookups(joins, tenant_oid, category_index))
+    direct = {
+        field: values for field, values in (mapping.get("direct_fields") or {}).items()
+        if values and keep(field, values, None)
+    }
+    direct_match_stage = apply_direct_field_filters(direct)
+    if direct_match_stage:
+        stages.append(direct_match_stage)
+    return stages
+
+
+# -------------------------
+# Compare mode
+# -------------------------
+def resolve_comparison_entities(
+    parser_output: dict,
+    tenant_oid: ObjectId,
+    category_index: Any,
+    content_type_values: Optional[Callable[[ObjectId, Iterable[str]], List[Any]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Map each comparison_entities name to what identifies its documents:
+    attribute ids (any category with an attribute of that name), the stored
+    contentType values of a Page Type join, or the direct field value the
+    parser mapped (as written in direct_fields, not the entity's casing).
+    Unresolvable entities keep resolved=False so they still show up in the
+    comparison table.
+    """
+    mapping = parser_output.get("database_mapping", {}) or {}
+    direct_fields = mapping.get("direct_fields", {}) or {}
+    content_type_names = [
+        value for join in mapping.get("required_joins", [])
+        if join.get("field") == "contentType" for value in join.get("values") or []
+    ]
+    entities = []
+    for name in parser_output.get("comparison_entities") or []:
+        entity: Dict[str, Any] = {"entity": name, "resolved": False}
+        key = normalize_key(name)
+        matches = category_index.find_attributes(tenant_oid, name) if hasattr(category_index, "find_attributes") else []
+        if matches:
+            entity.update(resolved=True, field="categoryAttribute", values=[attr_id for _, attr_id in matches],
+                          category=matches[0][0])
+        elif any(normalize_key(v) == key for v in content_type_names):
+            if content_type_values is None:
+                from app.services.hybrid_search import hybrid_searcher
+                content_type_values = hybrid_searcher.content_type_values
+            matched = [v for v in content_type_names if normalize_key(v) == key]
+            entity.update(resolved=True, field="contentType", values=content_type_values(tenant_oid, matched))
+        else:
+            for field, values in direct_fields.items():
+                matched = [v for v in values or [] if normalize_key(v) == key]
+                if matched:
+                    entity.update(resolved=True, field=field, values=matched)
+                    break
+        entities.append(entity)
+    return entities
+
+
+def _entity_flag(entity: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregation expression: does the current document belong to the entity?"""
+    if entity["field"] == "categoryAttribute":
+        return {"$gt": [{"$size": {"$setIntersection": [{"$ifNull": ["$categoryAttribute", []]}, entity["values"]]}}, 0]}
+    return {"$in": [f"${entity['field']}", entity["values"]]}
+
+
+def build_compare_pipeline(
+    parser_output: dict,
+    tenant_id: str,
+    category_index: Any,
+    now: Optional[datetime] = None,
+    content_type_values: Optional[Callable[[ObjectId, Iterable[str]], List[Any]]] = None
+) -> list:
+    """
+    One scan for all comparison_entities: shared filters, a per-entity boolean
+    flag, then a $facet with conditional sums for each entity's total and its
+    distribution over the first aggregation field's attributes.
+    Output: [{"totals": [{"e0": n, ...}], "distribution": [{"_id": attr_id, "e0": n, ...}]}]
+    """
+    tenant_oid = ObjectId(str(tenant_id))
+    entities = [
+        e for e in resolve_comparison_entities(parser_output, tenant_oid, category_index, content_type_values)
+        if e["resolved"]
+    ]
+    entity_names = {normalize_key(e["entity"]) for e in entities}
+
+    pipeline = build_shared_filter_stages(
+        parser_output, tenant_id, category_index, now,
+        # Filters that are just the compared entities are replaced by the per-entity flags
+        keep=lambda field, values, category: not {normalize_key(v) for v in values} <= entity_names
+    )
+
+    if not entities:
+        pipeline.append({"$facet": {"totals": [{"$limit": 0}], "distribution": [{"$limit": 0}]}})
+        return pipeline
+
+    # Only documents in at least one entity
+    pipeline.append({"$match": {"$or": [{e["field"]: {"$in": e["values"]}} for e in entities]}})
+    pipeline.append({"$addFields": {f"_e{i}": _entity_flag(e) for i, e in enumerate(entities)}})
+    sums = {f"e{i}": {"$sum": {"$cond": [f"$_e{i}", 1, 0]}} for i in range(len(entities))}
+
+    distribution: List[Dict[str, Any]] = [{"$limit": 0}]
+    agg_fields = (parser_output.get("database_mapping", {}) or {}).get("aggregation_fields") or []
+    if agg_fields and hasattr(category_index, "get_category_attributes"):
+        dimension_ids = [attr_id for attr_id, _ in category_index.get_category_attributes(tenant_oid, agg_fields[0])]
+        distribution = [
+            {"$unwind": "$categoryAttribute"},
+            {"$match": {"categoryAttribute": {"$in": dimension_ids}}},
+            {"$group": {"_id": "$categoryAttribute", **sums}},
+        ]
+
+    pipeline.append({
+        "$facet": {
+            "totals": [{"$group": {"_id": None, **sums}}],
+            "distribution": distribution,
+        }
+    })
+    return pipeline
+
+
+def comparison_table(
+    result: List[Dict[str, Any]],
+    parser_output: dict,
+    tenant_id: str,
+    category_index: Any,
+    content_type_values: Optional[Callable[[ObjectId, Iterable[str]], List[Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Shape build_compare_pipeline output as one row per entity, in the order
+    the parser listed them, with the same distribution columns (zeros
+    included) on every row.
+    """
+    tenant_oid = ObjectId(str(tenant_id))
+    entities = resolve_comparison_entities(parser_output, tenant_oid, category_index, content_type_values)
+    facet = result[0] if result else {}
+    totals = (facet.get("totals") or [{}])[0]
+    by_attr = {doc["_id"]: doc for doc in facet.get("distribution") or []}
+
+    agg_fields = parser_output.get("database_mapping", {}).get("aggregation_fields") or []
+    dimension = agg_fields[0] if agg_fields else None
+    columns = category_index.get_category_attributes(tenant_oid, dimension) if dimension and hasattr(category_index, "get_category_attributes") else []
+
+    rows = []
+    slot = 0
+    for entity in entities:
+        row = {"entity": entity["entity"], "resolved": entity["resolved"], "count": 0, "distribution": {}}
+        key = None
+        if entity["resolved"]:
+            key = f"e{slot}"
+            slot += 1
+            row["count"] = totals.get(key, 0)
+        row["distribution"] = {name: (by_attr.get(attr_id, {}).get(key, 0) if key else 0) for attr_id, name in columns}
+        rows.append(row)
+
+    grand_total = sum(row["count"] for row in rows)
+    for row in rows:
+        row["share"] = round(row["count"] / grand_total, 4) if grand_total else 0.0
+    return {"dimension": dimension, "columns": [name for _, name in columns], "rows": rows}
+
+
+# -------------------------
+# Pivot (cross-tab)
+# -------------------------
+PIVOT_OPERATIONS = ("aggregate", "rank", "identify_gaps")
+
+
+def pivot_dimensions(parser_output: dict) -> Optional[Tuple[str, str]]:
+    """
+    (row category, column category) for a two-dimensional count matrix:
+    the first two aggregation fields, or for identify_gaps with one
+    aggregation field, the category of a filter ("little or no BOFU" ->
+    Funnel Stage) against it. Only for grouping operations: list and count
+    queries keep their documents / total whatever aggregation_fields says.
+    """
+    operation = parser_output.get("operation_type")
+    if operation in ("list", "count") or not (operation in PIVOT_OPERATIONS or parser_output.get("aggregation_requested")):
+        return None
+    mapping = parser_output.get("database_mapping", {}) or {}
+    agg_fields = mapping.get("aggregation_fields") or []
+    if len(agg_fields) >= 2:
+        return agg_fields[0], agg_fields[1]
+    if len(agg_fields) == 1 and parser_output.get("operation_type") == "identify_gaps":
+        for join in mapping.get("required_joins", []):
+            category = join.get("category")
+            if join.get("values") and join.get("collection") == "category_attributes" and category != agg_fields[0]:
+                return category, agg_fields[0]
+    return None
+
+
+def build_pivot_pipeline(
+    parser_output: dict,
+    tenant_id: str,
+    category_index: Any,
+    rows: str,
+    columns: str,
+    now: Optional[datetime] = None
+) -> list:
+    """
+    Count documents per (row attribute, column attribute) pair in one
+    aggregation. Filters on the two dimensions are left out so the whole
+    matrix is computed; zero cells are filled by PivotTable from the
+    tenant's vocabulary. Output: [{"_id": {"r": attr_id, "c": attr_id}, "count": n}, ...]
+    """
+    tenant_oid = ObjectId(str(tenant_id))
+    row_ids = [attr_id for attr_id, _ in category_index.get_category_attributes(tenant_oid, rows)]
+    column_ids = [attr_id for attr_id, _ in category_index.get_category_attributes(tenant_oid, columns)]
+    dimensions = {normalize_key(rows), normalize_key(columns)}
+
+    pipeline = build_shared_filter_stages(
+        parser_output, tenant_id, category_index, now,
+        keep=lambda field, values, category: normalize_key(category or "") not in dimensions
+    )
+    pipeline.extend([
+        {"$match": {"$and": [{"categoryAttribute": {"$in": row_ids}}, {"categoryAttribute": {"$in": column_ids}}]}},
+        {"$project": {
+            "_id": 0,
+            "r": {"$setIntersection": ["$categoryAttribute", row_ids]},
+            "c": {"$setIntersection": ["$categoryAttribute", column_ids]},
+        }},
+        {"$unwind": "$r"},
+        {"$unwind": "$c"},
+        {"$group": {"_id": {"r": "$r", "c": "$c"}, "count": {"$sum": 1}}},
+    ])
+    return pipeline
+
+
+def build_structured_pipeline(
+    parser_output: dict,
+    tenant_id: str,
+    extractor,
+    now: Optional[datetime] = None,
+    content_type_values: Optional[Callable[[ObjectId, Iterable[str]], List[Any]]] = None
+) -> list:
     """
     Build the full MongoDB aggregation pipeline including:
     - Tenant match
+    - Temporal range match (constraints.temporal, resolved against `now`)
     - Category lookups
     - Direct field filters
     - Aggregation / count / rank stages based on parser output
+    - operation_type "compare": see build_compare_pipeline
+    - two category dimensions: see build_pivot_pipeline
     """
+    # Comparisons run as one faceted scan instead of one pipeline per entity
+    if parser_output.get("operation_type") == "compare" and parser_output.get("comparison_entities"):
+        return build_compare_pipeline(parser_output, tenant_id, extractor, now, content_type_values)
+
+    # Two category dimensions: full count matrix in one aggregation
+    dimensions = pivot_dimensions(parser_output)
+    if dimensions and hasattr(extractor, "get_category_attributes"):
+        return build_pivot_pipeline(parser_output, tenant_id, extractor, *dimensions, now=now)
+
     pipeline = []
 
     # 1. Always start with tenant filter
     pipeline.append(build_tenant_match(tenant_id))
 
+    # 1b. Date range right after the tenant match so {tenant, createdAt} is used
+    temporal = (parser_output.get("constraints") or {}).get("temporal")
+    temporal_stage = build_temporal_match(resolve_temporal(temporal, now))
+    if temporal_stage:
+        pipeline.append(temporal_stage)
+
     # 2. Separate category vs direct filters
     filters = parser_output.get("filters", {})
     category_filters = {}
@@ -207,7 +532,9 @@ def build_structured_pipeline(parser_output: dict, tenant_id: str, extractor) ->
     # 3. Category lookups (joins)
     required_joins = parser_output.get("database_mapping", {}).get("required_joins", [])
     if required_joins:
-        category_stages = build_category_lookups(required_joins, tenant_id, extractor)
+        category_stages = build_category_lookups(
+            required_joins, tenant_id, extractor, keep_lookup=grouped_categories(parser_output)
+        )
         pipeline.extend(category_stages)
 
     # 4. Direct field filters
@@ -3,17 +3,26 @@ import json
 from openai import OpenAI
 from rapidfuzz import process, fuzz
 from dotenv import load_dotenv
-from category_extracter import extract_categorical_fields
-from database_schema import DynamicTenantSchemaExtractor
+from app.services.category_extracter import extract_categorical_fields
+from app.services.database_schema import DynamicTenantSchemaExtractor
+from app.services.llm_transport import RecordReplayClient
 
 load_dotenv()
 
 # Load API Key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-client = OpenAI(api_key=OPENAI_API_KEY)
+# LLM_TRANSPORT_MODE: passthrough (default) / record / replay, see llm_transport.py
+client = RecordReplayClient(lambda: OpenAI(api_key=OPENAI_API_KEY))
 
-# Get tenant categories from your existing function
-tenant_categories = extract_categorical_fields()
+# Tenant categories from your existing function, extracted on first parse
+_tenant_categories = None
+
+
+def get_tenant_categories():
+    global _tenant_categories
+    if _tenant_categories is None:
+        _tenant_categories = extract_categorical_fields()
+    return _tenant_categories
 
 # ----------------------------
 # Enhanced Database Schema Mapping
@@ -143,9 +152,10 @@ def build_schema(categories):
                                     "type": "object",
                                     "properties": {
                                         "type": {"type": "string", "enum": ["before", "after", "range", "relative"]},
-                                        "start_date": {"type": "string"},
-                                        "end_date": {"type": "string"},
-                                        "relative_period": {"type": "string"}
+                                        "date_field": {"type": "string", "enum": ["createdAt", "updatedAt"]},
+                                        "start_date": {"type": "string", "description": "ISO date, YYYY-MM-DD"},
+                                        "end_date": {"type": "string", "description": "ISO date, YYYY-MM-DD"},
+                                        "relative_period": {"type": "string", "description": "e.g. 'last quarter', 'past 30 days', 'this year'"}
                                     }
                                 },
                                 "gated": {"type": "boolean"},
@@ -309,10 +319,11 @@ def normalize_filters(filters: dict) -> dict:
 # ----------------------------
 # Main Enhanced Parser
 # ----------------------------
-def parse_query_with_enhanced_tools(query_text):
+def parse_query_with_enhanced_tools(query_text, categories=None):
     """Enhanced query parser with better database integration"""
-    
-    tools_schema = build_schema(tenant_categories)
+    categories = categories if categories is not None else get_tenant_categories()
+
+    tools_schema = build_schema(categories)
     
     system_message = """You are an advanced query parser for a content analytics system. 
 
@@ -348,7 +359,7 @@ Only use the provided category values. Be precise in classification."""
     parsed_data["query_text"] = query_text
     
     # Enhanced post-processing
-    return enhanced_post_processing(parsed_data, tenant_categories) 
+    return enhanced_post_processing(parsed_data, categories) 
 
 # ----------------------------
 # Example Usage
@@ -0,0 +1,457 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from threading import Event, RLock
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from bson import ObjectId
+
+from app.db.embedding_codec import decode_embedding
+from app.services.get_category_id import to_object_id
+
+logger = logging.getLogger(__name__)
+
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "data/vector_store")
+LOAD_BATCH_SIZE = 5000
+
+SearchHit = Tuple[ObjectId, float]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows in place (zero rows stay zero) so dot product == cosine."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, via argpartition (O(n) + O(k log k))."""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class TenantVectorStore:
+    """
+    One tenant's sitemap embeddings as a contiguous float32 matrix of
+    L2-normalized rows, plus the row -> sitemap _id mapping.
+
+    Top-k cosine search is a single matvec and an argpartition. The matrix can
+    be persisted as <tenant>.npy (+ <tenant>.ids.npy sidecar) and reopened
+    memory-mapped; the first mutation copies it into RAM.
+    """
+
+    def __init__(self, tenant_id: Union[str, ObjectId], dimensions: Optional[int] = None):
+        self.tenant_id = to_object_id(tenant_id)
+        self.dimensions = dimensions
+        self.synced_at: Optional[datetime] = None
+        self._matrix: Optional[np.ndarray] = None  # (capacity, d); rows [0, size) are live
+        self._ids: List[ObjectId] = []
+        self._rows: Dict[ObjectId, int] = {}
+        # Bumped whenever rows are added, moved or removed (row-aligned side data must rebuild)
+        self.version = 0
+        self._lock = RLock()
+
+    @property
+    def size(self) -> int:
+        return len(self._ids)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Live rows as a (size, d) view."""
+        if self._matrix is None:
+            return np.empty((0, self.dimensions or 0), dtype=np.float32)
+        return self._matrix[:self.size]
+
+    @property
+    def ids(self) -> List[ObjectId]:
+        return self._ids
+
+    def row_of(self, doc_id: ObjectId) -> Optional[int]:
+        return self._rows.get(doc_id)
+
+    # ----------------------------
+    # Loading / persistence
+    # ----------------------------
+    @classmethod
+    def from_collection(cls, collection, tenant_id: Union[str, ObjectId]) -> "TenantVectorStore":
+        store = cls(tenant_id)
+        store.refresh(collection, full=True)
+        return store
+
+    def refresh(self, collection, full: bool = False) -> int:
+        """
+        Pull embeddings written since the last sync (all of them if full=True),
+        then drop rows whose page was deleted or lost its embedding (an _id-only
+        scan of the tenant). Returns the number of rows inserted, updated or removed.
+
+        A full refresh loads into a separate store and swaps it in, so searches
+        keep using the previous rows until the new ones are complete.
+        """
+        # Naive UTC, like the datetimes pymongo returns
+        started = datetime.now(timezone.utc).replace(tzinfo=None)
+        query = {"tenant": self.tenant_id, "embedding": {"$exists": True}}
+        if self.synced_at is not None and not full:
+            query["embeddingUpdatedAt"] = {"$gt": self.synced_at}
+
+        target = TenantVectorStore(self.tenant_id, self.dimensions) if full else self
+        cursor = collection.find(query, {"embedding": 1, "embeddingUpdatedAt": 1}, batch_size=LOAD_BATCH_SIZE)
+        changed = 0
+        ids: List[ObjectId] = []
+        vectors: List[np.ndarray] = []
+        latest = None if full else self.synced_at
+
+        for doc in cursor:
+            ids.append(doc["_id"])
+            vectors.append(decode_embedding(doc["embedding"]))
+            updated_at = doc.get("embeddingUpdatedAt")
+            if updated_at is not None and (latest is None or updated_at > latest):
+                latest = updated_at
+            if len(ids) >= LOAD_BATCH_SIZE:
+                changed += target.upsert_many(ids, np.vstack(vectors))
+                ids, vectors = [], []
+
+        if ids:
+            changed += target.upsert_many(ids, np.vstack(vectors))
+
+        if full:
+            with self._lock:
+                self._matrix, self._ids, self._rows = target._matrix, target._ids, target._rows
+                self.dimensions = target.dimensions
+                self.version += 1
+        else:
+            live = {doc["_id"] for doc in collection.find(
+                {"tenant": self.tenant_id, "embedding": {"$exists": True}}, {"_id": 1}, batch_size=LOAD_BATCH_SIZE
+            )}
+            changed += self.remove_many([doc_id for doc_id in list(self._ids) if doc_id not in live])
+        # Docs embedded before embeddingUpdatedAt existed carry no timestamp; without
+        # this fallback synced_at would stay None and every refresh would reload the tenant
+        self.synced_at = latest if latest is not None else started
+        return changed
+
+    def save(self, directory: str = VECTOR_STORE_DIR) -> str:
+        """Write <tenant>.npy, <tenant>.ids.npy and <tenant>.meta.json; returns the matrix path."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, str(self.tenant_id))
+        with self._lock:
+            np.save(f"{base}.npy", np.ascontiguousarray(self.matrix))
+            # (n, 12) uint8 rather than "S12": numpy strips trailing NUL bytes from S-dtypes
+            raw_ids = np.frombuffer(b"".join(oid.binary for oid in self._ids), dtype=np.uint8).reshape(-1, 12)
+            np.save(f"{base}.ids.npy", raw_ids)
+            meta = {
+                "dimensions": self.dimensions,
+                "size": self.size,
+                "synced_at": self.synced_at.isoformat() if self.synced_at else None
+            }
+        with open(f"{base}.meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return f"{base}.npy"
+
+    @classmethod
+    def open(cls, directory: str, tenant_id: Union[str, ObjectId], mmap: bool = True) -> Optional["TenantVectorStore"]:
+        """Reopen a saved store; None if it was never saved."""
+        base = os.path.join(directory, str(to_object_id(tenant_id)))
+        if not os.path.exists(f"{base}.npy"):
+            return None
+
+        store = cls(tenant_id)
+        store._matrix = np.load(f"{base}.npy", mmap_mode="r" if mmap else None)
+        store._ids = [ObjectId(raw.tobytes()) for raw in np.load(f"{base}.ids.npy")]
+        store._rows = {oid: i for i, oid in enumerate(store._ids)}
+        store.dimensions = store._matrix.shape[1] if store._matrix.ndim == 2 else None
+
+        meta_path = f"{base}.meta.json"
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                synced_at = json.load(f).get("synced_at")
+            store.synced_at = datetime.fromisoformat(synced_at) if synced_at else None
+        return store
+
+    # ----------------------------
+    # Mutation
+    # ----------------------------
+    def upsert(self, doc_id: ObjectId, embedding) -> None:
+        self.upsert_many([doc_id], decode_embedding(embedding)[np.newaxis, :])
+
+    def upsert_many(self, doc_ids: Sequence[ObjectId], vectors: np.ndarray) -> int:
+        if not len(doc_ids):
+            return 0
+        vectors = normalize_rows(np.array(vectors, dtype=np.float32, ndmin=2))
+
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+            elif vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Embedding has {vectors.shape[1]} dims; store has {self.dimensions}")
+
+            self._ensure_writable()
+            new_rows: Dict[ObjectId, int] = {}  # doc_id -> index in vectors (last one wins)
+            for i, doc_id in enumerate(doc_ids):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    new_rows[doc_id] = i
+                else:
+                    # Same page, same row: a concurrent search sees the old or new vector
+                    self._matrix[row] = vectors[i]
+
+            if new_rows:
+                start = self.size
+                self._reserve(start + len(new_rows))
+                self._matrix[start:start + len(new_rows)] = vectors[list(new_rows.values())]
+                for offset, doc_id in enumerate(new_rows):
+                    self._rows[doc_id] = start + offset
+                    self._ids.append(doc_id)
+                self.version += 1
+        return len(doc_ids)
+
+    def remove(self, doc_id: ObjectId) -> bool:
+        return self.remove_many([doc_id]) > 0
+
+    def remove_many(self, doc_ids: Iterable[ObjectId]) -> int:
+        """
+        Drop rows by moving the last rows into their slots (keeps the matrix dense).
+        Matrix and ids are copied, not edited, so a search holding the previous
+        snapshot never sees another page's vector under a removed page's id.
+        """
+        with self._lock:
+            doomed = {doc_id for doc_id in doc_ids if doc_id in self._rows}
+            if not doomed:
+                return 0
+            matrix = np.array(self.matrix, dtype=np.float32)
+            ids = list(self._ids)
+            for doc_id in doomed:
+                row = self._rows.pop(doc_id)
+                last = len(ids) - 1
+                if row != last:
+                    matrix[row] = matrix[last]
+                    ids[row] = ids[last]
+                    self._rows[ids[row]] = row
+                ids.pop()
+            self._matrix = matrix
+            self._ids = ids
+            self.version += 1
+            return len(doomed)
+
+    def _ensure_writable(self) -> None:
+        if self._matrix is not None and not self._matrix.flags.writeable:
+            # Memory-mapped (read-only) matrix: copy into RAM on first write
+            self._matrix = np.array(self._matrix[:self.size], dtype=np.float32)
+
+    def _reserve(self, rows: int) -> None:
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        grown = np.empty((max(rows, capacity * 2, 1024), self.dimensions), dtype=np.float32)
+        if self.size:
+            grown[:self.size] = self._matrix[:self.size]
+        self._matrix = grown
+
+    # ----------------------------
+    # Search
+    # ----------------------------
+    def _snapshot(self) -> Tuple[np.ndarray, List[ObjectId]]:
+        with self._lock:
+            return self.matrix, self._ids
+
+    def scores(self, query) -> np.ndarray:
+        """Cosine similarity of the query against every row."""
+        matrix, _ = self._snapshot()
+        q = decode_embedding(query).astype(np.float32, copy=True)
+        norm = np.linalg.norm(q)
+        if norm:
+            q /= norm
+        return matrix @ q
+
+    def search(self, query, k: int = 10) -> List[SearchHit]:
+        matrix, ids = self._snapshot()
+        if not len(ids) or k <= 0:
+            return []
+        q = decode_embedding(query).astype(np.float32, copy=True)
+        norm = np.linalg.norm(q)
+        if norm:
+            q /= norm
+        scores = matrix @ q
+        return [(ids[i], float(scores[i])) for i in top_k(scores, k)]
+
+    def search_batch(self, queries: np.ndarray, k: int = 10) -> List[List[SearchHit]]:
+        """Many queries with one matrix-matrix product."""
+        matrix, ids = self._snapshot()
+        if not len(ids) or k <= 0:
+            return [[] for _ in range(len(queries))]
+        q = normalize_rows(np.array(queries, dtype=np.float32, ndmin=2))
+        scores = q @ matrix.T
+        return [[(ids[i], float(row[i])) for i in top_k(row, k)] for row in scores]
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide set of tenant stores. Stores are opened from disk (memory-mapped)
+    when a snapshot exists, then caught up with Mongo; otherwise built from Mongo.
+    Prebuilt ANN indexes (ANN_INDEX_DIR) are caught up the same way on open and
+    on every refresh().
+    """
+
+    def __init__(
+        self,
+        db=None,
+        directory: str = VECTOR_STORE_DIR,
+        collection_name: str = "sitemaps",
+        ann_directory: Optional[str] = None
+    ):
+        self._db = db
+        self.directory = directory
+        self.ann_directory = ann_directory  # None: ANN_INDEX_DIR
+        self.collection_name = collection_name
+        self._stores: Dict[ObjectId, TenantVectorStore] = {}
+        self._ann: Dict[ObjectId, object] = {}  # tenant -> IVFIndex or None (no index built)
+        self._lock = RLock()
+
+    @property
+    def collection(self):
+        if self._db is None:
+            from app.services.mongo_client import get_mongo_client
+            self._db = get_mongo_client()
+        return self._db[self.collection_name]
+
+    def get(self, tenant_id: Union[str, ObjectId]) -> TenantVectorStore:
+        tenant_oid = to_object_id(tenant_id)
+        store = self._stores.get(tenant_oid)
+        if store is not None:
+            return store
+
+        with self._lock:
+            store = self._stores.get(tenant_oid)
+            if store is None:
+                store = TenantVectorStore.open(self.directory, tenant_oid)
+                if store is None:
+                    store = TenantVectorStore.from_collection(self.collection, tenant_oid)
+                else:
+                    store.refresh(self.collection)
+                self._stores[tenant_oid] = store
+                logger.info(f"Vector store ready for tenant {tenant_oid}: {store.size} vectors")
+        return store
+
+    def get_ann(self, tenant_id: Union[str, ObjectId]):
+        """The tenant's prebuilt ANN index (memory-mapped, reconciled with Mongo), or None."""
+        tenant_oid = to_object_id(tenant_id)
+        if tenant_oid in self._ann:
+            return self._ann[tenant_oid]
+
+        with self._lock:
+            if tenant_oid not in self._ann:
+                from app.services.ann_index import ANN_INDEX_DIR, open_tenant_index
+                ann = open_tenant_index(tenant_oid, self.ann_directory or ANN_INDEX_DIR)
+                if ann is not None:
+                    self._catch_up_ann(tenant_oid, ann, reconcile=True)
+                self._ann[tenant_oid] = ann
+        return self._ann[tenant_oid]
+
+    def _catch_up_ann(self, tenant_oid: ObjectId, ann, reconcile: bool = False) -> int:
+        """
+        Add pages (re-)embedded since ann.synced_at. With reconcile, also diff the
+        index's ids against Mongo's: pages embedded without a timestamp are added
+        and pages that lost their embedding are removed. Returns rows added.
+        """
+        started = datetime.now(timezone.utc).replace(tzinfo=None)
+        query = {"tenant": tenant_oid, "embedding": {"$exists": True}}
+        stale = set()
+        if ann.synced_at is not None:
+            stale.update(d["_id"] for d in self.collection.find(
+                {**query, "embeddingUpdatedAt": {"$gt": ann.synced_at}}, {"_id": 1}, batch_size=LOAD_BATCH_SIZE
+            ))
+        if reconcile or ann.synced_at is None:
+            live = {d["_id"] for d in self.collection.find(query, {"_id": 1}, batch_size=LOAD_BATCH_SIZE)}
+            indexed = ann.doc_ids()
+            for doc_id in indexed - live:
+                ann.remove(doc_id)
+            stale.update(live - indexed)
+
+        added = 0
+        pending = sorted(stale)
+        for start in range(0, len(pending), LOAD_BATCH_SIZE):
+            docs = list(self.collection.find({**query, "_id": {"$in": pending[start:start + LOAD_BATCH_SIZE]}}, {"embedding": 1}))
+            if docs:
+                ann.add([d["_id"] for d in docs], np.vstack([decode_embedding(d["embedding"]) for d in docs]))
+                added += len(docs)
+        ann.synced_at = started
+        if added:
+            logger.info(f"ANN index for tenant {tenant_oid} caught up: {added} rows added")
+        return added
+
+    def search(self, tenant_id: Union[str, ObjectId], query, k: int = 10, nprobe: Optional[int] = None) -> List[SearchHit]:
+        """ANN search for large tenants with a built index, exact search otherwise."""
+        from app.services.ann_index import ANN_MIN_VECTORS
+        ann = self.get_ann(tenant_id)
+        if ann is not None and ann.size >= ANN_MIN_VECTORS:
+            # Re-rank PQ shortlists only if the exact store is already resident
+            return ann.search(query, k, nprobe, rerank_store=self._stores.get(to_object_id(tenant_id)))
+        return self.get(tenant_id).search(query, k)
+
+    def refresh(self, tenant_id: Optional[Union[str, ObjectId]] = None) -> int:
+        """Catch resident stores and opened ANN indexes up with Mongo; returns rows changed."""
+        if tenant_id is not None:
+            tenant_oid = to_object_id(tenant_id)
+            stores = [self.get(tenant_oid)]
+            anns = [(tenant_oid, self.get_ann(tenant_oid))]
+        else:
+            stores = list(self._stores.values())
+            anns = list(self._ann.items())
+        changed = sum(store.refresh(self.collection) for store in stores)
+        return changed + sum(self._catch_up_ann(tenant_oid, ann) for tenant_oid, ann in anns if ann is not None)
+
+    def save_all(self) -> None:
+        for store in list(self._stores.values()):
+            store.save(self.directory)
+
+    def apply_change(self, change: dict) -> None:
+        """Apply one change-stream event from the sitemaps collection."""
+        doc_id = change.get("documentKey", {}).get("_id")
+        if change.get("operationType") == "delete":
+            for target in list(self._stores.values()) + [a for a in self._ann.values() if a is not None]:
+                target.remove(doc_id)
+            return
+
+        doc = change.get("fullDocument") or {}
+        tenant = doc.get("tenant")
+        targets = [t for t in (self._stores.get(tenant), self._ann.get(tenant)) if t is not None]
+        for target in targets:
+            if doc.get("embedding") is None:
+                target.remove(doc_id)
+            elif isinstance(target, TenantVectorStore):
+                target.upsert(doc_id, doc["embedding"])
+            else:
+                target.add([doc_id], decode_embedding(doc["embedding"])[np.newaxis, :])
+
+    def follow_changes(self, stop: Optional[Event] = None) -> None:
+        """Keep loaded stores in sync via a change stream (requires a replica set)."""
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        with self.collection.watch(pipeline, full_document="updateLookup") as stream:
+            while stop is None or not stop.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self.apply_change(change)
+
+
+# Single process-wide registry
+vector_stores = VectorStoreRegistry()
+
+
+def semantic_search(
+    query_text: str,
+    tenant_id: Union[str, ObjectId],
+    k: int = 10,
+    embed_fn: Optional[Callable[[str], Iterable[float]]] = None,
+    registry: VectorStoreRegistry = vector_stores
+) -> List[SearchHit]:
+    """Embed the query and return the tenant's top-k (sitemap _id, cosine score)."""
+    if embed_fn is None:
+        from app.services.query_embedding_cache import embed_query
+        embed_fn = embed_query
+    embedding = embed_fn(query_text)
+    if embedding is None:
+        return []
+    return registry.search(tenant_id, embedding, k)
@@ -0,0 +1,102 @@
+"""
+Recall@k and latency of the IVF(-PQ) index against exact search, to pick
+nlist / nprobe / pq_m per tenant size.
+
+    python -m benchmarks.ann_recall --size 200000 --dim 256 --nprobe 1 4 8 16 32 --pq-m 0 32
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+from bson import ObjectId
+
+from app.services.ann_index import IVFIndex
+from app.services.vector_store import TenantVectorStore
+from benchmarks.vector_search import CHUNK, latency_summary
+
+
+def clustered_vectors(size: int, dimensions: int, clusters: int = 500, noise: float = 0.6, seed: int = 0) -> np.ndarray:
+    """Topic-like data: points scattered around random centres (uniform noise makes ANN look worse than reality)."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimensions), dtype=np.float32)
+    out = np.empty((size, dimensions), dtype=np.float32)
+    for start in range(0, size, CHUNK):
+        rows = min(CHUNK, size - start)
+        out[start:start + rows] = centres[rng.integers(0, clusters, rows)] + noise * rng.standard_normal((rows, dimensions), dtype=np.float32)
+    return out
+
+
+def recall_at_k(truth: List[List[ObjectId]], found: List[List[ObjectId]]) -> float:
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / max(1, sum(len(t) for t in truth))
+
+
+def bench_index(
+    index: IVFIndex,
+    queries: np.ndarray,
+    truth: List[List[ObjectId]],
+    k: int,
+    nprobe: int,
+    rerank_store: TenantVectorStore = None
+) -> Dict:
+    found, latencies = [], []
+    for q in queries:
+        started = time.perf_counter()
+        hits = index.search(q, k, nprobe, rerank_store=rerank_store)
+        latencies.append(time.perf_counter() - started)
+        found.append([doc_id for doc_id, _ in hits])
+    return {
+        "nprobe": nprobe,
+        "rerank": rerank_store is not None,
+        f"recall@{k}": round(recall_at_k(truth, found), 4),
+        **latency_summary(latencies),
+        "qps": round(len(queries) / sum(latencies), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN recall/latency benchmark")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[0])
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    vectors = clustered_vectors(args.size + args.queries, args.dim)
+    queries, vectors = vectors[:args.queries], vectors[args.queries:]
+
+    store = TenantVectorStore(ObjectId(), args.dim)
+    store.upsert_many([ObjectId() for _ in range(args.size)], vectors)
+
+    started = time.perf_counter()
+    truth = [[doc_id for doc_id, _ in hits] for hits in store.search_batch(queries, args.k)]
+    exact_qps = len(queries) / (time.perf_counter() - started)
+
+    results = []
+    for pq_m in args.pq_m:
+        started = time.perf_counter()
+        index = IVFIndex.from_store(store, nlist=args.nlist, pq_m=pq_m)
+        build_s = time.perf_counter() - started
+        for nprobe in args.nprobe:
+            for rerank_store in ([None, store] if pq_m else [None]):
+                result = {"size": args.size, "dimensions": args.dim, "nlist": index.nlist, "pq_m": pq_m,
+                          "build_s": round(build_s, 2),
+                          **bench_index(index, queries, truth, args.k, nprobe, rerank_store)}
+                results.append(result)
+                print(json.dumps(result))
+
+    summary = {"benchmark": "ann_recall", "exact_batched_qps": round(exact_qps, 1), "results": results}
+    print(json.dumps({"exact_batched_qps": summary["exact_batched_qps"]}))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
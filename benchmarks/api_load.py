@@ -0,0 +1,128 @@
+"""
+Sustained QPS and latency of the HTTP query service under concurrent load.
+
+    python -m app.api --workers 4 &
+    python -m benchmarks.api_load --tenant 6875f3afc8337606d54a7f37 --endpoint count \
+        --concurrency 32 --duration 30 --parsed parsed_query.json
+
+Waits for /health/ready, then keeps `concurrency` requests in flight for
+`duration` seconds. Pass --parsed (a saved /parse response) to measure the
+service without LLM latency; otherwise every request parses --query.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmarks.vector_search import latency_summary
+
+ENDPOINTS = ("parse", "search", "count", "aggregate")
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 300.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(1.0)
+    raise TimeoutError("Service did not become ready")
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    body: Dict,
+    concurrency: int,
+    duration: float,
+    warmup: float = 2.0
+) -> Dict:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    async def worker():
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                return
+            try:
+                response = await client.post(f"/{endpoint}", json=body)
+                status = str(response.status_code) if response.status_code != 200 else None
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            done = time.perf_counter()
+            if sent < measure_from:
+                continue
+            if status:
+                errors[status] = errors.get(status, 0) + 1
+            else:
+                latencies.append(done - sent)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - measure_from
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": errors,
+        "qps": round(len(latencies) / elapsed, 1) if elapsed > 0 else 0.0,
+        **(latency_summary(latencies) if latencies else {}),
+    }
+
+
+async def bench(args) -> List[Dict]:
+    parsed: Optional[Dict] = None
+    if args.parsed:
+        with open(args.parsed, "r", encoding="utf-8") as f:
+            parsed = json.load(f)
+        parsed = parsed.get("parsed", parsed)
+
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        await wait_ready(client)
+        results = []
+        for endpoint in args.endpoint:
+            body = {"tenant": args.tenant, "query": args.query}
+            if parsed is not None and endpoint != "parse":
+                body["parsed"] = parsed
+            if endpoint == "search":
+                body["k"] = args.k
+            for concurrency in args.concurrency:
+                result = await run_load(client, endpoint, body, concurrency, args.duration, args.warmup)
+                results.append(result)
+                print(json.dumps(result))
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP query service load test")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--tenant", required=True)
+    parser.add_argument("--query", default="Show me TOFU content for Financial Services")
+    parser.add_argument("--parsed", help="JSON file with a parsed query (skips the LLM)")
+    parser.add_argument("--endpoint", nargs="+", choices=ENDPOINTS, default=["count"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    results = asyncio.run(bench(args))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "api_load", "url": args.url, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
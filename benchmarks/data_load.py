@@ -0,0 +1,146 @@
+"""
+Sequential (load_data) vs parallel (parallel_load) loading of a synthetic
+sitemaps export.
+
+    python -m benchmarks.data_load --size-mb 4096 --processes 8 --insert-workers 8
+    python -m benchmarks.data_load --size-mb 512 --parse-only   # no MongoDB needed
+
+Inserts go to a throwaway database (bench_load_<seed>) on MONGO_URI that is
+dropped afterwards; the generated file is reused if it exists.
+"""
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict
+
+from bson import ObjectId, encode as bson_encode
+
+from app.db import load_data as sequential
+from app.db.parallel_load import CHUNK_BYTES, chunk_ranges, parallel_load, parse_range
+
+WORDS = ("content marketing funnel awareness buyer persona demand generation pipeline webinar case study "
+         "analytics revenue enterprise onboarding retention integration security compliance pricing").split()
+
+
+def write_synthetic_export(path: str, size_mb: int, tenants: int = 20, seed: int = 0) -> int:
+    """One sitemap doc per line inside a JSON array (Extended JSON $oid/$date), ~size_mb on disk."""
+    rng = random.Random(seed)
+    tenant_ids = [str(ObjectId()) for _ in range(tenants)]
+    attributes = [str(ObjectId()) for _ in range(200)]
+    epoch = datetime(2024, 1, 1)
+    target = size_mb << 20
+    written = docs = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        while written < target:
+            created = epoch + timedelta(minutes=rng.randrange(1_000_000))
+            doc = {
+                "_id": {"$oid": str(ObjectId())},
+                "tenant": {"$oid": rng.choice(tenant_ids)},
+                "fullUrl": f"https://example.com/{docs}",
+                "title": " ".join(rng.choices(WORDS, k=8)),
+                "description": " ".join(rng.choices(WORDS, k=60)),
+                "categoryAttribute": [{"$oid": a} for a in rng.sample(attributes, 4)],
+                "geoFocus": rng.choice(["Global", "US", "EMEA", "APAC"]),
+                "isMarketingContent": rng.random() < 0.7,
+                "createdAt": {"$date": created.isoformat(timespec="milliseconds") + "Z"},
+                "updatedAt": {"$date": (created + timedelta(days=3)).isoformat(timespec="milliseconds") + "Z"},
+            }
+            line = ("\n," if docs else "") + json.dumps(doc)
+            f.write(line)
+            written += len(line)
+            docs += 1
+        f.write("\n]\n")
+    return docs
+
+
+def bench_parse(path: str, processes: int, chunk_bytes: int) -> Dict:
+    started = time.perf_counter()
+    # Both sides BSON-encode: the sequential loader pays that cost inside insert_many
+    sequential_docs = sum(1 for doc in sequential.iter_json_documents(path) if bson_encode(doc))
+    sequential_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    ranges = chunk_ranges(path, chunk_bytes)
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(parse_range, path, start, end) for start, end in ranges]
+        parallel_docs = sum(len(batch) for fut in futures for batch in fut.result())
+    parallel_s = time.perf_counter() - started
+
+    assert sequential_docs == parallel_docs, (sequential_docs, parallel_docs)
+    return {
+        "docs": sequential_docs,
+        "ranges": len(ranges),
+        "sequential": {"seconds": round(sequential_s, 2), "docs_per_sec": round(sequential_docs / sequential_s)},
+        "parallel": {"seconds": round(parallel_s, 2), "docs_per_sec": round(parallel_docs / parallel_s)},
+        "speedup": round(sequential_s / parallel_s, 2),
+    }
+
+
+def bench_load(data_dir: str, processes: int, insert_workers: int, chunk_bytes: int, batch_size: int, seed: int = 0) -> Dict:
+    db_name = f"bench_load_{seed}"
+    sequential.client.drop_database(db_name)
+    database = sequential.client[db_name]
+    try:
+        started = time.perf_counter()
+        sequential.load_data(data_dir, batch_size, mode="swap", database=database)
+        sequential_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = parallel_load(data_dir, processes, insert_workers, chunk_bytes, batch_size, database=database)
+        parallel_s = time.perf_counter() - started
+    finally:
+        sequential.client.drop_database(db_name)
+
+    docs = sum(r["docs"] for r in results.values())
+    return {
+        "docs": docs,
+        "sequential": {"seconds": round(sequential_s, 2), "docs_per_sec": round(docs / sequential_s)},
+        "parallel": {"seconds": round(parallel_s, 2), "docs_per_sec": round(docs / parallel_s)},
+        "speedup": round(sequential_s / parallel_s, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs parallel loader benchmark")
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--data-dir", default="data/bench_load")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--insert-workers", type=int, default=4)
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES >> 20)
+    parser.add_argument("--batch-size", type=int, default=sequential.INSERT_BATCH_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--parse-only", action="store_true", help="Skip MongoDB; compare parsing throughput only")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    path = os.path.join(args.data_dir, "sitemaps.json")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        docs = write_synthetic_export(path, args.size_mb, seed=args.seed)
+        print(json.dumps({"generated_docs": docs, "seconds": round(time.perf_counter() - started, 1)}))
+
+    summary = {
+        "benchmark": "data_load",
+        "file_mb": round(os.path.getsize(path) / (1 << 20), 1),
+        "processes": args.processes,
+        "insert_workers": args.insert_workers,
+        "chunk_mb": args.chunk_mb,
+    }
+    if args.parse_only:
+        summary["parse"] = bench_parse(path, args.processes, args.chunk_mb << 20)
+    else:
+        summary["load"] = bench_load(args.data_dir, args.processes, args.insert_workers, args.chunk_mb << 20, args.batch_size, args.seed)
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+End-to-end stage timings on a synthetic multi-tenant dataset.
+
+    python -m benchmarks.end_to_end --tenants 10 --sitemaps 20000 --output results/e2e.json
+    python -m benchmarks.end_to_end --backend memory --tenants 2 --sitemaps 2000   # needs mongomock
+
+Stages: generate+load, schema extraction, fuzzy match, parse (LLM stubbed with
+--llm-latency-ms, or replayed from --llm-recording), pipeline build, execution,
+embedding backfill. Each stage reports wall time and, for per-query stages,
+latency percentiles. On mongod, pipelines with a date-range $match also report
+docs examined with and without it (temporal_scan). The results JSON carries the git commit so runs can be
+compared across commits.
+
+--backend mongod uses a throwaway database (bench_e2e_<seed>) on MONGO_URI and
+drops it afterwards unless --keep. --backend memory runs on mongomock: no
+server needed, but operators it lacks ($lookup with let, $setIntersection,
+$dateTrunc, ...) fail those executions. A stage with any failed call is
+reported with "valid": false, its error count and first error, and no
+timings, and is listed under invalid_stages.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.synthetic_data import DatasetSpec, TenantData, generate_dataset, insert_dataset
+from benchmarks.vector_search import latency_summary
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+
+
+class StubLLMClient:
+    """Stands in for the OpenAI client in try_query_parser: returns canned tool-call arguments per query."""
+
+    def __init__(self, answers: Dict[str, Dict[str, Any]], latency_s: float = 0.0):
+        self.answers = answers
+        self.latency_s = latency_s
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, messages: List[Dict], **kwargs):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        query = messages[-1]["content"]
+        arguments = json.dumps(self.answers.get(query, {"classification": "exploratory", "filters": {}}))
+        call = SimpleNamespace(function=SimpleNamespace(name="parse_query", arguments=arguments))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(tool_calls=[call]))])
+
+
+def open_backend(backend: str, db_name: str):
+    if backend == "memory":
+        try:
+            import mongomock
+        except ImportError as e:
+            raise SystemExit("--backend memory needs mongomock (pip install mongomock)") from e
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(MONGO_URI)
+    return client, client[db_name]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def per_call(fn: Callable[[Any], Any], items: List[Any]) -> Dict[str, Any]:
+    """
+    Run fn over items; wall time, latency percentiles and error count. Timings
+    of a partly failed run would mix in fast failures, so any error marks the
+    stage invalid and drops them.
+    """
+    latencies, errors, first_error, results = [], 0, None, []
+    started = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        try:
+            results.append(fn(item))
+            latencies.append(time.perf_counter() - t0)
+        except Exception as e:
+            errors += 1
+            first_error = first_error or f"{type(e).__name__}: {e}"
+            results.append(None)
+    stage: Dict[str, Any] = {"calls": len(items), "errors": errors, "valid": not errors}
+    if errors:
+        stage["first_error"] = first_error[:300]
+    else:
+        stage["wall_s"] = round(time.perf_counter() - started, 4)
+        if latencies:
+            stage.update(latency_summary(latencies))
+    return {"stage": stage, "results": results}
+
+
+def run(args) -> Dict[str, Any]:
+    from app.db.generate_embedding import EmbeddingStats, embed_batch, iter_embedding_batches
+    from app.db.stub_embedding_server import stub_vector
+    from app.services import try_query_parser
+    from app.services.database_schema import DynamicTenantSchemaExtractor
+    from app.services.get_category_id import CategoryIndex
+    from app.services.llm_transport import REPLAY, RecordingStore, RecordReplayClient
+    from app.services.temporal_filter import find_temporal_stage, scan_reduction
+    from app.services.try_query_builder import build_structured_pipeline
+
+    spec = DatasetSpec(
+        tenants=args.tenants,
+        sitemaps_per_tenant=args.sitemaps,
+        extra_categories=args.extra_categories,
+        attributes_per_doc=args.fan_out,
+        embedding_dimensions=args.dim,
+        embedded_fraction=args.embedded_fraction,
+        queries_per_tenant=args.queries,
+        seed=args.seed,
+    )
+    db_name = f"bench_e2e_{args.seed}"
+    client, db = open_backend(args.backend, db_name)
+    client.drop_database(db_name)
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    try:
+        # 1. Generate + load
+        started = time.perf_counter()
+        tenants: List[TenantData] = generate_dataset(spec)
+        counts = insert_dataset(db, spec, tenants, args.batch_size)
+        elapsed = time.perf_counter() - started
+        stages["load"] = {**counts, "wall_s": round(elapsed, 3), "sitemaps_per_s": round(counts["sitemaps"] / elapsed, 1)}
+
+        # 2. Schema extraction (per tenant: dynamic schema + category index)
+        extractor = DynamicTenantSchemaExtractor(client, db_name)
+        index = CategoryIndex()
+
+        def extract(tenant: TenantData):
+            index.refresh_tenant(db, tenant.tenant)
+            return extractor.extract_tenant_schema(str(tenant.tenant))
+
+        stages["schema_extraction"] = per_call(extract, tenants)["stage"]
+
+        queries = [(tenant, text, arguments) for tenant in tenants for text, arguments in tenant.queries]
+
+        # 3. Fuzzy match against the tenant vocabulary
+        stages["fuzzy_match"] = per_call(
+            lambda q: try_query_parser.intelligent_fuzzy_matching(q[1], q[0].vocabulary), queries
+        )["stage"]
+
+        # 4. Parse with the stubbed LLM, or replay a recording of real calls
+        if args.llm_recording:
+            try_query_parser.client = RecordReplayClient(
+                lambda: None, REPLAY, RecordingStore(args.llm_recording), str(args.llm_latency_ms)
+            )
+        else:
+            try_query_parser.client = StubLLMClient({text: arguments for _, text, arguments in queries}, args.llm_latency_ms / 1000.0)
+        parsed = per_call(
+            lambda q: try_query_parser.parse_query_with_enhanced_tools(q[1], q[0].vocabulary), queries
+        )
+        stages["parse"] = parsed["stage"]
+
+        # 5. Pipeline build
+        jobs = [(q[0], p) for q, p in zip(queries, parsed["results"]) if p is not None]
+        built = per_call(lambda job: build_structured_pipeline(job[1], str(job[0].tenant), index), jobs)
+        stages["pipeline_build"] = built["stage"]
+
+        # 6. Execution
+        executions = [(job[0], pipeline) for job, pipeline in zip(jobs, built["results"]) if pipeline is not None]
+        stages["execution"] = per_call(lambda e: len(list(db["sitemaps"].aggregate(e[1]))), executions)["stage"]
+
+        # 6b. What the pushed-down date range saves (explain needs a real server)
+        temporal = [(e[1], stage) for e in executions if (stage := find_temporal_stage(e[1])) is not None]
+        if args.backend == "mongod" and temporal:
+            reductions = [scan_reduction(db["sitemaps"], pipeline, stage) for pipeline, stage in temporal]
+            stages["temporal_scan"] = {
+                "pipelines": len(reductions),
+                "docs_examined_without": sum(r["docs_examined_without"] for r in reductions),
+                "docs_examined_with": sum(r["docs_examined_with"] for r in reductions),
+                "mean_reduction": round(sum(r["reduction"] for r in reductions) / len(reductions), 4),
+            }
+
+        # 7. Embedding backfill for docs generated without an embedding
+        embed_stats = EmbeddingStats()
+        stub_embed = lambda texts: ([stub_vector(t, spec.embedding_dimensions).tolist() for t in texts], None)
+        cursor = db["sitemaps"].find({"embedding": {"$exists": False}}, {"name": 1, "description": 1, "summary": 1})
+        for batch in iter_embedding_batches(cursor, args.embed_batch, stats=embed_stats):
+            embed_batch(db["sitemaps"], batch, embed_stats, stub_embed, use_cache=False)
+        stages["embedding_backfill"] = {
+            "docs": embed_stats.docs,
+            "requests": embed_stats.requests,
+            "wall_s": round(embed_stats.elapsed, 3),
+            "docs_per_s": round(embed_stats.docs_per_sec, 1),
+        }
+    finally:
+        if not args.keep:
+            client.drop_database(db_name)
+
+    return {
+        "benchmark": "end_to_end",
+        "commit": git_commit(),
+        "backend": args.backend,
+        "spec": vars(spec),
+        "llm_latency_ms": args.llm_latency_ms,
+        "llm_recording": args.llm_recording,
+        "stages": stages,
+        "invalid_stages": [name for name, stage in stages.items() if stage.get("valid") is False],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline stage benchmark")
+    parser.add_argument("--backend", choices=["mongod", "memory"], default="mongod")
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--sitemaps", type=int, default=10_000, help="Sitemaps per tenant")
+    parser.add_argument("--extra-categories", type=int, default=4)
+    parser.add_argument("--fan-out", type=int, default=6, help="categoryAttribute values per sitemap")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--embedded-fraction", type=float, default=0.5)
+    parser.add_argument("--queries", type=int, default=20, help="Queries per tenant")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-recording", help="Replay parser calls from this recording (see app/services/llm_transport.py)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--embed-batch", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark database")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results["stages"], indent=2))
+    if results["invalid_stages"]:
+        print(f"⚠️ Invalid stages (calls failed, no timings): {', '.join(results['invalid_stages'])}", file=sys.stderr)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
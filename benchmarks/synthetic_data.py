@@ -0,0 +1,184 @@
+"""
+Synthetic multi-tenant dataset: categories, category attributes, content types
+and sitemaps shaped like the production collections, plus per-tenant queries
+with the tool-call arguments an LLM would return for them.
+
+Category names match try_query_parser.get_database_field_mapping (Funnel Stage,
+Primary/Secondary Audience, Industry, Page Type, Language) so parser
+post-processing, pipeline building and execution take their real paths.
+
+    from benchmarks.synthetic_data import DatasetSpec, generate_dataset, insert_dataset
+    dataset = generate_dataset(DatasetSpec(tenants=10, sitemaps_per_tenant=20_000))
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Tuple
+
+from bson import ObjectId
+
+from app.db.embedding_codec import encode_embedding
+from app.db.load_data import insert_in_batches
+from app.db.stub_embedding_server import stub_vector
+from app.services.temporal_filter import ensure_temporal_indexes
+
+WORDS = ("content marketing funnel awareness buyer persona demand generation pipeline webinar case study "
+         "analytics revenue enterprise onboarding retention integration security compliance pricing").split()
+
+BASE_CATEGORIES = {
+    "Funnel Stage": ["TOFU", "MOFU", "BOFU"],
+    "Primary Audience": ["Individual Investors", "Financial Advisors", "Marketing Leaders", "IT Decision Makers",
+                         "Developers", "Procurement", "Executives", "Analysts"],
+    "Secondary Audience": ["Partners", "Students", "Journalists", "Job Seekers", "Existing Customers"],
+    "Industry": ["Healthcare", "Financial Services", "Retail", "Manufacturing", "Education", "Energy",
+                 "Technology", "Government", "Media", "Telecommunications"],
+}
+PAGE_TYPES = ["Blog Post", "Case Study", "Whitepaper", "Webinar", "Product Page", "Landing Page", "Ebook", "Video"]
+LANGUAGES = ["English", "German", "French", "Spanish", "Japanese"]
+EPOCH = datetime(2023, 1, 1)
+SPAN_DAYS = 1000
+
+
+@dataclass
+class DatasetSpec:
+    tenants: int = 5
+    sitemaps_per_tenant: int = 10_000
+    extra_categories: int = 4            # synthetic categories beyond BASE_CATEGORIES
+    attributes_per_category: int = 12    # for the extra categories
+    attributes_per_doc: int = 6          # categoryAttribute fan-out
+    embedding_dimensions: int = 256
+    embedded_fraction: float = 0.5       # rest is left for the embedding backfill stage
+    queries_per_tenant: int = 20
+    seed: int = 0
+
+
+@dataclass
+class TenantData:
+    tenant: ObjectId
+    categories: List[Dict]
+    category_attributes: List[Dict]
+    content_types: List[Dict]
+    vocabulary: Dict[str, List[str]]                     # category name -> attribute names
+    queries: List[Tuple[str, Dict[str, Any]]]            # (query text, tool-call arguments)
+
+
+def _tool_arguments(operation: str, filters: Dict[str, List[str]], **extra) -> Dict[str, Any]:
+    aggregate = operation in ("aggregate", "rank", "identify_gaps", "count")
+    return {
+        "classification": "analytical" if aggregate else "structured",
+        "filters": filters,
+        "constraints": extra.pop("constraints", {}),
+        "quoted_entities": [],
+        "user_intent": {"count": "count", "list": "retrieve"}.get(operation, "distribution_analysis"),
+        "operation_type": operation,
+        "aggregation_requested": aggregate and operation != "count",
+        "response_expectation": "data_list" if operation == "list" else "statistics",
+        "business_context": "content_strategy",
+        **extra,
+    }
+
+
+def generate_queries(rng: random.Random, vocabulary: Dict[str, List[str]], count: int) -> List[Tuple[str, Dict[str, Any]]]:
+    templates = [
+        lambda fs, ind, aud, lang, pt: (f"Show me {fs} content for {ind}", _tool_arguments("list", {"Funnel Stage": [fs], "Industry": [ind]})),
+        lambda fs, ind, aud, lang, pt: (f"How many {pt} pages target {aud}?", _tool_arguments("count", {"Page Type": [pt], "Primary Audience": [aud]})),
+        lambda fs, ind, aud, lang, pt: ("What funnel stages do we have the least content for?", _tool_arguments("identify_gaps", {})),
+        lambda fs, ind, aud, lang, pt: (f"Which industry has the most {fs} content?", _tool_arguments("rank", {"Funnel Stage": [fs]})),
+        lambda fs, ind, aud, lang, pt: (
+            f"List all {lang} {fs} pages created after January 1st, 2025",
+            _tool_arguments("list", {"Funnel Stage": [fs], "Language": [lang]},
+                            constraints={"temporal": {"type": "after", "start_date": "2025-01-01"}})
+        ),
+        lambda fs, ind, aud, lang, pt: (
+            f"Show the distribution of primary audience for {ind} content",
+            _tool_arguments("aggregate", {"Industry": [ind]})
+        ),
+    ]
+    queries = []
+    for i in range(count):
+        template = templates[i % len(templates)]
+        queries.append(template(
+            rng.choice(vocabulary["Funnel Stage"]),
+            rng.choice(vocabulary["Industry"]),
+            rng.choice(vocabulary["Primary Audience"]),
+            rng.choice(vocabulary["Language"]),
+            rng.choice(vocabulary["Page Type"]),
+        ))
+    return queries
+
+
+def generate_tenant(spec: DatasetSpec, rng: random.Random) -> TenantData:
+    tenant = ObjectId()
+    categories, attributes = [], []
+    vocabulary: Dict[str, List[str]] = {}
+
+    names = dict(BASE_CATEGORIES)
+    for i in range(spec.extra_categories):
+        names[f"Topic Cluster {i + 1}"] = [f"Cluster {i + 1} {w.title()}" for w in rng.sample(WORDS, min(spec.attributes_per_category, len(WORDS)))]
+    for name, values in names.items():
+        category = {"_id": ObjectId(), "tenant": tenant, "name": name, "createdAt": EPOCH, "updatedAt": EPOCH}
+        categories.append(category)
+        vocabulary[name] = list(values)
+        attributes.extend(
+            {"_id": ObjectId(), "tenant": tenant, "category": category["_id"], "name": value, "createdAt": EPOCH, "updatedAt": EPOCH}
+            for value in values
+        )
+
+    content_types = [{"_id": ObjectId(), "tenant": tenant, "name": name} for name in PAGE_TYPES]
+    vocabulary["Page Type"] = list(PAGE_TYPES)
+    vocabulary["Language"] = list(LANGUAGES)
+    queries = generate_queries(rng, vocabulary, spec.queries_per_tenant)
+    return TenantData(tenant, categories, attributes, content_types, vocabulary, queries)
+
+
+def iter_sitemaps(spec: DatasetSpec, tenant: TenantData, rng: random.Random) -> Iterator[Dict]:
+    """Each doc takes one attribute from each base category, the rest of the fan-out at random."""
+    by_category: Dict[ObjectId, List[ObjectId]] = {}
+    for attr in tenant.category_attributes:
+        by_category.setdefault(attr["category"], []).append(attr["_id"])
+    base = [by_category[c["_id"]] for c in tenant.categories if c["name"] in BASE_CATEGORIES]
+    all_attributes = [attr["_id"] for attr in tenant.category_attributes]
+
+    for i in range(spec.sitemaps_per_tenant):
+        picked = [rng.choice(ids) for ids in base]
+        extra = max(spec.attributes_per_doc - len(picked), 0)
+        picked.extend(a for a in rng.sample(all_attributes, min(extra, len(all_attributes))) if a not in picked)
+        created = EPOCH + timedelta(minutes=rng.randrange(SPAN_DAYS * 1440))
+        description = " ".join(rng.choices(WORDS, k=40))
+        doc = {
+            "_id": ObjectId(),
+            "tenant": tenant.tenant,
+            "name": " ".join(rng.choices(WORDS, k=6)),
+            "title": " ".join(rng.choices(WORDS, k=8)),
+            "fullUrl": f"https://example.com/{tenant.tenant}/{i}",
+            "description": description,
+            "summary": " ".join(rng.choices(WORDS, k=20)),
+            "categoryAttribute": picked,
+            "contentType": rng.choice(tenant.content_types)["_id"],
+            "geoFocus": rng.choice(LANGUAGES),
+            "isMarketingContent": rng.random() < 0.7,
+            "createdAt": created,
+            "updatedAt": created + timedelta(days=rng.randrange(30)),
+        }
+        if rng.random() < spec.embedded_fraction:
+            doc["embedding"] = encode_embedding(stub_vector(description, spec.embedding_dimensions))
+        yield doc
+
+
+def generate_dataset(spec: DatasetSpec) -> List[TenantData]:
+    rng = random.Random(spec.seed)
+    return [generate_tenant(spec, rng) for _ in range(spec.tenants)]
+
+
+def insert_dataset(db, spec: DatasetSpec, tenants: List[TenantData], batch_size: int = 1000) -> Dict[str, int]:
+    """Insert every collection; sitemaps are generated while inserting so memory stays flat."""
+    rng = random.Random(spec.seed + 1)
+    counts = {"categories": 0, "category_attributes": 0, "content_types": 0, "sitemaps": 0}
+    for tenant in tenants:
+        counts["categories"] += insert_in_batches(db["categories"], tenant.categories, batch_size)
+        counts["category_attributes"] += insert_in_batches(db["category_attributes"], tenant.category_attributes, batch_size)
+        counts["content_types"] += insert_in_batches(db["content_types"], tenant.content_types, batch_size)
+        counts["sitemaps"] += insert_in_batches(db["sitemaps"], iter_sitemaps(spec, tenant, rng), batch_size)
+    db["sitemaps"].create_index([("tenant", 1), ("categoryAttribute", 1)])
+    ensure_temporal_indexes(db["sitemaps"])
+    return counts
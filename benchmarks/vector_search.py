@@ -0,0 +1,94 @@
+"""
+QPS and latency of in-process top-k cosine search (TenantVectorStore).
+
+    python -m benchmarks.vector_search --sizes 10000 100000 1000000 --dim 1536
+
+Note: 1M x 1536 float32 is ~6 GB; use --dim 256 on smaller machines.
+"""
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+from bson import ObjectId
+
+from app.services.vector_store import TenantVectorStore
+
+CHUNK = 50_000
+
+
+def synthetic_store(size: int, dimensions: int, seed: int = 0) -> TenantVectorStore:
+    rng = np.random.default_rng(seed)
+    store = TenantVectorStore(ObjectId(), dimensions)
+    for start in range(0, size, CHUNK):
+        rows = min(CHUNK, size - start)
+        store.upsert_many([ObjectId() for _ in range(rows)], rng.standard_normal((rows, dimensions), dtype=np.float32))
+    return store
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    ms = np.array(latencies) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def bench_store(store: TenantVectorStore, queries: np.ndarray, k: int, batch_size: int) -> Dict:
+    store.search(queries[0], k)  # warm-up
+
+    latencies = []
+    for q in queries:
+        started = time.perf_counter()
+        store.search(q, k)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        store.search_batch(queries[i:i + batch_size], k)
+    batch_elapsed = time.perf_counter() - started
+
+    return {
+        "vectors": store.size,
+        "dimensions": store.dimensions,
+        "k": k,
+        "queries": len(queries),
+        "single_query": {**latency_summary(latencies), "qps": round(len(queries) / sum(latencies), 1)},
+        "batched": {"batch_size": batch_size, "qps": round(len(queries) / batch_elapsed, 1)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector store search benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    results = []
+    for size in args.sizes:
+        started = time.perf_counter()
+        store = synthetic_store(size, args.dim)
+        build_s = time.perf_counter() - started
+        result = bench_store(store, queries, args.k, args.batch_size)
+        result["build_s"] = round(build_s, 2)
+        results.append(result)
+        print(json.dumps(result))
+        del store
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "vector_search", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
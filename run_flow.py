@@ -1,13 +1,17 @@
 # run_flow.py
 
 from pymongo import MongoClient
-from app.services.query_parser import parse_query
-from app.services.retrieval_service import structured_search, build_structured_match
+from bson import ObjectId
+from app.services.try_query_parser import parse_query_with_enhanced_tools as parse_query
+from app.services.retrieval_service import iter_structured_results
+from app.services.vector_store import VectorStoreRegistry, semantic_search
 
 # 1. Connect to Mongo
 client = MongoClient("mongodb://localhost:27017") 
 db = client["your_database_name"]  # Change to your DB name
 collection = db["sitemaps"]        # Change to your collection name
+vector_stores = VectorStoreRegistry(db)
+TENANT_ID = ObjectId("6875f3afc8337606d54a7f37")
 
 # 2. Example queries
 queries = [
@@ -23,9 +27,15 @@ for q in queries:
     print(f"Parsed: {parsed}")
 
     if parsed["classification"] == "structured" and parsed["filters"]:
-        results = structured_search(parsed["filters"], collection)
-        print(f"✅ Found {len(results)} results:")
-        for r in results:
+        count = 0
+        for r in iter_structured_results(parsed, TENANT_ID, collection):
             print(f"- {r.get('title')} ({r.get('url')})")
+            count += 1
+        print(f"✅ Found {count} results")
     else:
-        print("⚠️ No structured filters found — will handle via semantic search later.")
+        hits = semantic_search(q, TENANT_ID, k=10, registry=vector_stores)
+        docs = {d["_id"]: d for d in collection.find({"_id": {"$in": [doc_id for doc_id, _ in hits]}}, {"title": 1, "url": 1})}
+        print(f"🔎 No structured filters found — top {len(hits)} semantic matches:")
+        for doc_id, score in hits:
+            r = docs.get(doc_id, {})
+            print(f"- {r.get('title')} ({r.get('url')}) score={score:.3f}")
@@ -0,0 +1,37 @@
+import mongomock
+import pytest
+from bson import ObjectId
+
+from app.services.get_category_id import CategoryIndex
+from app.services.service_state import ServiceState
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def tenant(db):
+    """One tenant with two categories; attribute name -> id under tenant["attributes"]."""
+    tenant_oid = ObjectId()
+    funnel, industry = ObjectId(), ObjectId()
+    db.categories.insert_many([
+        {"_id": funnel, "tenant": tenant_oid, "name": "Funnel Stage"},
+        {"_id": industry, "tenant": tenant_oid, "name": "Industry"},
+    ])
+    attributes = {}
+    for category, names in ((funnel, ["TOFU", "MOFU", "BOFU"]), (industry, ["Finance", "Retail"])):
+        for name in names:
+            attributes[name] = db.category_attributes.insert_one(
+                {"tenant": tenant_oid, "category": category, "name": name}
+            ).inserted_id
+    return {"tenant": tenant_oid, "categories": {"Funnel Stage": funnel, "Industry": industry}, "attributes": attributes}
+
+
+@pytest.fixture
+def service(db, tenant):
+    """A ready ServiceState on the mock database, with its own CategoryIndex."""
+    state = ServiceState(db=db, parse_fn=lambda text, vocabulary: {}, warm_tenants=[], category_index=CategoryIndex())
+    state.ready.set()
+    return state
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from app.services.ann_index import IVFIndex
+from app.services.vector_store import TenantVectorStore, normalize_rows
+
+
+def _clustered(n=2000, d=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, d))
+    vectors = centers[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, d))
+    return [ObjectId() for _ in range(n)], normalize_rows(vectors.astype(np.float32))
+
+
+def _recall(index, ids, vectors, queries, k=10, **kwargs):
+    found = 0
+    for q in queries:
+        exact = {ids[i] for i in np.argsort(-(vectors @ q))[:k]}
+        found += len(exact & {doc_id for doc_id, _ in index.search(q, k, **kwargs)})
+    return found / (k * len(queries))
+
+
+@pytest.fixture(scope="module")
+def data():
+    ids, vectors = _clustered()
+    return ids, vectors, vectors[:50] + 0.05
+
+
+def test_ivf_recall_grows_with_nprobe(data):
+    ids, vectors, queries = data
+    index = IVFIndex.build(ids, vectors, nlist=40, iters=10)
+
+    low, high = _recall(index, ids, vectors, queries, nprobe=1), _recall(index, ids, vectors, queries, nprobe=40)
+
+    assert high == pytest.approx(1.0)
+    assert low <= high and low > 0.5
+
+
+def test_pq_recall_with_rerank(data):
+    ids, vectors, queries = data
+    index = IVFIndex.build(ids, vectors, nlist=20, pq_m=8, iters=8)
+    store = TenantVectorStore(ObjectId())
+    store.upsert_many(ids, vectors)
+
+    assert index.data.dtype == np.uint8 and index.data.shape == (len(ids), 8)
+    assert _recall(index, ids, vectors, queries, nprobe=8, rerank_store=store) >= 0.8
+
+
+def test_add_remove_and_compact_keep_one_row_per_id(data):
+    ids, vectors, _ = data
+    index = IVFIndex.build(ids[:500], vectors[:500], nlist=10, iters=5)
+    new_id = ObjectId()
+
+    index.add([new_id, ids[0]], vectors[500:502])
+    index.remove(ids[1])
+    assert index.size == 500
+    assert index.search(vectors[500], 1, nprobe=10)[0][0] == new_id
+    assert ids[1] not in {doc_id for doc_id, _ in index.search(vectors[1], 5, nprobe=10)}
+
+    index.compact()
+
+    assert index.size == 500 and len(index.raw_ids) == 500
+    assert index.doc_ids() == (set(ids[:500]) - {ids[1]}) | {new_id}
+    assert index.search(vectors[500], 1, nprobe=10)[0][0] == new_id
+
+
+def test_compact_swaps_lists_in_one_assignment(data):
+    ids, vectors, _ = data
+    index = IVFIndex.build(ids[:200], vectors[:200], nlist=5, iters=5)
+    index.add([ObjectId()], vectors[200:201])
+    before = index._lists
+
+    index.compact()
+
+    assert index._lists is not before
+    assert len(before.pending_ids) == 1 and before.raw_ids.shape[0] == 200  # old state untouched
+
+
+def test_save_and_open_round_trip(data, tmp_path):
+    ids, vectors, queries = data
+    index = IVFIndex.build(ids[:300], vectors[:300], nlist=8, iters=5)
+    index.add([ObjectId()], vectors[300:301])
+    index.save(str(tmp_path), "tenant")
+
+    reopened = IVFIndex.open(str(tmp_path), "tenant")
+
+    assert reopened.size == 301
+    assert reopened.search(queries[0], 5, nprobe=8) == index.search(queries[0], 5, nprobe=8)
@@ -0,0 +1,20 @@
+from benchmarks.end_to_end import per_call
+
+
+def test_successful_stage_reports_timings():
+    out = per_call(lambda x: x * 2, [1, 2, 3])
+
+    assert out["results"] == [2, 4, 6]
+    assert out["stage"]["valid"] and out["stage"]["errors"] == 0
+    assert "wall_s" in out["stage"] and "p50_ms" in out["stage"]
+
+
+def test_any_failure_marks_the_stage_invalid_without_timings():
+    def fn(x):
+        if x == 2:
+            raise NotImplementedError("no let")
+        return x
+
+    stage = per_call(fn, [1, 2, 3])["stage"]
+
+    assert stage == {"calls": 3, "errors": 1, "valid": False, "first_error": "NotImplementedError: no let"}
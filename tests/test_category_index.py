@@ -0,0 +1,78 @@
+from app.services.get_category_id import CategoryExtractor, CategoryIndex
+from app.services.try_query_builder import build_structured_pipeline
+
+
+def _index(db, tenant):
+    index = CategoryIndex()
+    index.refresh_tenant(db, tenant["tenant"])
+    return index
+
+
+def test_lookups_are_case_and_whitespace_insensitive(db, tenant):
+    index = _index(db, tenant)
+    tofu = tenant["attributes"]["TOFU"]
+
+    assert index.get_category_id(tenant["tenant"], "  funnel   STAGE ") == tenant["categories"]["Funnel Stage"]
+    assert index.get_attribute_id(tenant["tenant"], "Funnel Stage", "tofu") == tofu
+    assert index.get_attribute(tofu) == ("Funnel Stage", "TOFU")
+    assert index.get_attribute_ids(tenant["tenant"], "Funnel Stage", ["tofu", "Nope", "TOFU"]) == [tofu]
+
+
+def test_refresh_keeps_tenant_visible_and_drops_removed_attributes(db, tenant):
+    index = _index(db, tenant)
+    retail = tenant["attributes"]["Retail"]
+    db.category_attributes.delete_one({"_id": retail})
+
+    index.refresh_tenant(db, tenant["tenant"])
+
+    assert index.has_tenant(tenant["tenant"])
+    assert index.get_attribute(retail) is None
+    assert index.get_attribute(tenant["attributes"]["Finance"]) == ("Industry", "Finance")
+
+
+def test_extractor_reuses_loaded_tenant(db, tenant, monkeypatch):
+    import app.services.get_category_id as module
+
+    index = _index(db, tenant)
+    monkeypatch.setattr(module, "category_index", index)
+    calls = []
+    monkeypatch.setattr(index, "refresh_tenant", lambda *args: calls.append(args))
+
+    CategoryExtractor(db.categories, str(tenant["tenant"]))
+
+    assert calls == []
+
+
+def _parsed(operation, aggregation_fields=()):
+    return {
+        "operation_type": operation,
+        "aggregation_requested": bool(aggregation_fields),
+        "filters": {"Funnel Stage": ["TOFU"], "Industry": ["Finance"]},
+        "database_mapping": {
+            "required_joins": [
+                {"collection": "category_attributes", "field": "categoryAttribute", "lookup_field": "name",
+                 "values": ["TOFU"], "category": "Funnel Stage"},
+                {"collection": "category_attributes", "field": "categoryAttribute", "lookup_field": "name",
+                 "values": ["Finance"], "category": "Industry"},
+            ],
+            "direct_fields": {},
+            "aggregation_fields": list(aggregation_fields),
+        },
+    }
+
+
+def test_list_filters_resolve_to_attribute_ids(db, tenant):
+    pipeline = build_structured_pipeline(_parsed("list"), str(tenant["tenant"]), _index(db, tenant))
+
+    assert not any("$lookup" in stage for stage in pipeline)
+    assert {"$match": {"categoryAttribute": {"$in": [tenant["attributes"]["TOFU"]]}}} in pipeline
+
+
+def test_grouped_category_keeps_its_lookup(db, tenant):
+    pipeline = build_structured_pipeline(_parsed("aggregate", ["Funnel Stage"]), str(tenant["tenant"]), _index(db, tenant))
+
+    lookups = [stage["$lookup"] for stage in pipeline if "$lookup" in stage]
+    assert len(lookups) == 1
+    assert lookups[0]["pipeline"][0]["$match"]["category"] == tenant["categories"]["Funnel Stage"]
+    assert {"$match": {"categoryAttribute": {"$in": [tenant["attributes"]["Finance"]]}}} in pipeline
+    assert pipeline[-2]["$group"]["_id"] == "$categoryAttributeDetails.Funnel Stage"
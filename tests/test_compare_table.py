@@ -0,0 +1,86 @@
+from bson import ObjectId
+
+from app.services.get_category_id import CategoryIndex
+from app.services.try_query_builder import build_compare_pipeline, comparison_table, resolve_comparison_entities
+
+WHITEPAPER = ObjectId()
+
+
+def _index(db, tenant):
+    index = CategoryIndex()
+    index.refresh_tenant(db, tenant["tenant"])
+    return index
+
+
+def _content_types(tenant_oid, names):
+    return list(names) + [WHITEPAPER]
+
+
+def _query(entities, **mapping):
+    return {
+        "operation_type": "compare",
+        "comparison_entities": entities,
+        "database_mapping": {"required_joins": [], "direct_fields": {}, "aggregation_fields": [], **mapping},
+    }
+
+
+def test_entities_resolve_to_attributes_content_types_and_direct_fields(db, tenant):
+    a = tenant["attributes"]
+    query = _query(
+        ["tofu", "Whitepaper", "us", "Unknown"],
+        required_joins=[{"collection": "content_types", "field": "contentType", "values": ["Whitepaper"]}],
+        direct_fields={"geoFocus": ["US"]},
+    )
+
+    entities = resolve_comparison_entities(query, tenant["tenant"], _index(db, tenant), _content_types)
+
+    assert entities == [
+        {"entity": "tofu", "resolved": True, "field": "categoryAttribute", "values": [a["TOFU"]], "category": "Funnel Stage"},
+        {"entity": "Whitepaper", "resolved": True, "field": "contentType", "values": ["Whitepaper", WHITEPAPER]},
+        {"entity": "us", "resolved": True, "field": "geoFocus", "values": ["US"]},
+        {"entity": "Unknown", "resolved": False},
+    ]
+
+
+def test_pipeline_replaces_entity_filters_with_one_faceted_scan(db, tenant):
+    a = tenant["attributes"]
+    query = _query(
+        ["TOFU", "BOFU"],
+        aggregation_fields=["Industry"],
+        required_joins=[
+            {"collection": "category_attributes", "field": "categoryAttribute", "category": "Funnel Stage", "values": ["TOFU", "BOFU"]},
+            {"collection": "category_attributes", "field": "categoryAttribute", "category": "Industry", "values": ["Retail"]},
+        ],
+    )
+
+    pipeline = build_compare_pipeline(query, str(tenant["tenant"]), _index(db, tenant), content_type_values=_content_types)
+
+    assert pipeline[0] == {"$match": {"tenant": tenant["tenant"]}}
+    assert {"$match": {"categoryAttribute": {"$in": [a["Retail"]]}}} in pipeline
+    assert {"$match": {"categoryAttribute": {"$in": [a["TOFU"], a["BOFU"]]}}} not in pipeline
+    assert pipeline[-3] == {"$match": {"$or": [{"categoryAttribute": {"$in": [a["TOFU"]]}}, {"categoryAttribute": {"$in": [a["BOFU"]]}}]}}
+    facet = pipeline[-1]["$facet"]
+    assert facet["totals"][0]["$group"].keys() == {"_id", "e0", "e1"}
+    assert facet["distribution"][1] == {"$match": {"categoryAttribute": {"$in": [a["Finance"], a["Retail"]]}}}
+
+
+def test_no_resolved_entities_gives_empty_facets(db, tenant):
+    pipeline = build_compare_pipeline(_query(["Nope"]), str(tenant["tenant"]), _index(db, tenant))
+
+    assert pipeline[-1] == {"$facet": {"totals": [{"$limit": 0}], "distribution": [{"$limit": 0}]}}
+
+
+def test_table_keeps_parser_order_zero_columns_and_unresolved_rows(db, tenant):
+    a = tenant["attributes"]
+    query = _query(["BOFU", "Nope", "TOFU"], aggregation_fields=["Industry"])
+    result = [{"totals": [{"_id": None, "e0": 1, "e1": 3}], "distribution": [{"_id": a["Finance"], "e0": 1, "e1": 2}]}]
+
+    table = comparison_table(result, query, str(tenant["tenant"]), _index(db, tenant))
+
+    assert table["dimension"] == "Industry" and table["columns"] == ["Finance", "Retail"]
+    assert [(r["entity"], r["resolved"], r["count"], r["share"]) for r in table["rows"]] == [
+        ("BOFU", True, 1, 0.25), ("Nope", False, 0, 0.0), ("TOFU", True, 3, 0.75),
+    ]
+    assert [r["distribution"] for r in table["rows"]] == [
+        {"Finance": 1, "Retail": 0}, {"Finance": 0, "Retail": 0}, {"Finance": 2, "Retail": 0},
+    ]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from app.db.embedding_backend import EmbeddingBackend, HashingEmbeddingBackend, get_backend
+
+
+def test_hashing_backend_is_deterministic_and_normalized():
+    backend = HashingEmbeddingBackend(dimensions=64)
+
+    (a, b), tokens = backend.embed(["Content strategy for finance", "Content strategy for finance"])
+
+    assert tokens is None
+    assert a == b and len(a) == 64
+    assert np.linalg.norm(a) == pytest.approx(1.0, rel=1e-5)
+
+
+def test_hashing_backend_scores_lexical_overlap():
+    backend = HashingEmbeddingBackend(dimensions=256)
+    query, close, far = (backend.vector(t) for t in ("pricing page", "pricing pages for teams", "quarterly webinar"))
+
+    assert query @ close > query @ far
+
+
+def test_empty_text_embeds_to_zeros():
+    assert not HashingEmbeddingBackend(dimensions=8).vector("  ").any()
+
+
+def test_model_names_keep_vector_spaces_apart():
+    assert HashingEmbeddingBackend(dimensions=64).model != HashingEmbeddingBackend(dimensions=128).model
+
+
+def test_backends_must_implement_embed():
+    class Incomplete(EmbeddingBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_unknown_backend_is_rejected():
+    assert get_backend("hashing") is get_backend("hashing")
+    with pytest.raises(ValueError):
+        get_backend("nope")
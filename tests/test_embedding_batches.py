@@ -0,0 +1,45 @@
+from app.db import generate_embedding as ge
+
+
+def _docs(*names):
+    return [{"_id": i, "name": name} for i, name in enumerate(names)]
+
+
+def test_batches_respect_input_limit():
+    batches = list(ge.iter_embedding_batches(_docs(*"abcde"), max_inputs=2, max_tokens=1000))
+
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert [item.doc_id for b in batches for item in b] == [0, 1, 2, 3, 4]
+
+
+def test_batches_respect_token_limit():
+    # 40 chars ~ 10 tokens each
+    batches = list(ge.iter_embedding_batches(_docs("x" * 40, "y" * 40, "z" * 40), max_inputs=100, max_tokens=25))
+
+    assert [len(b) for b in batches] == [2, 1]
+    assert all(sum(item.tokens for item in b) <= 25 for b in batches)
+
+
+def test_empty_docs_are_skipped():
+    stats = ge.EmbeddingStats()
+
+    batches = list(ge.iter_embedding_batches([{"_id": 1}, {"_id": 2, "name": "   "}], stats=stats))
+
+    assert batches == [] and stats.skipped == 2
+
+
+def test_embed_batch_writes_one_bulk_update(db):
+    db.sitemaps.insert_many(_docs("alpha", "beta"))
+    batch = next(ge.iter_embedding_batches(db.sitemaps.find()))
+    stats = ge.EmbeddingStats()
+    calls = []
+
+    def embed(texts):
+        calls.append(texts)
+        return [[1.0, 0.0] for _ in texts], 7
+
+    ge.embed_batch(db.sitemaps, batch, stats, embed, use_cache=False)
+
+    assert calls == [["alpha", "beta"]]
+    assert (stats.docs, stats.requests, stats.tokens) == (2, 1, 7)
+    assert db.sitemaps.count_documents({"embeddingModel": ge.EMBEDDING_MODEL, "embeddingUpdatedAt": {"$exists": True}}) == 2
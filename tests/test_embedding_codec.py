@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from app.db import embedding_codec as codec
+
+
+@pytest.fixture
+def vector():
+    return np.random.default_rng(0).normal(size=64).astype(np.float32)
+
+
+def test_float32_round_trip_is_exact(vector):
+    stored = codec.encode_embedding(vector, codec.FLOAT32)
+
+    assert codec.storage_format_of(stored) == codec.FLOAT32
+    assert len(stored) == 64 * 4
+    np.testing.assert_array_equal(codec.decode_embedding(stored), vector)
+
+
+def test_int8_round_trip_within_one_step(vector):
+    stored = codec.encode_embedding(vector, codec.INT8)
+    step = np.abs(vector).max() / 127
+
+    assert codec.storage_format_of(stored) == codec.INT8
+    assert len(stored) == 4 + 64
+    assert np.abs(codec.decode_embedding(stored) - vector).max() <= step / 2 + 1e-6
+
+
+def test_array_round_trip_and_zero_vector(vector):
+    stored = codec.encode_embedding(codec.encode_embedding(vector, codec.FLOAT32), codec.ARRAY)
+
+    assert isinstance(stored, list)
+    np.testing.assert_allclose(codec.decode_embedding(stored), vector)
+    np.testing.assert_array_equal(codec.decode_embedding(codec.encode_embedding([0.0] * 8, codec.INT8)), np.zeros(8))
+
+
+def test_decode_embeddings_stacks_mixed_formats(vector):
+    values = [vector.tolist(), codec.encode_embedding(vector, codec.FLOAT32), codec.encode_embedding(vector, codec.INT8)]
+
+    matrix = codec.decode_embeddings(values)
+
+    assert matrix.shape == (3, 64) and matrix.dtype == np.float32
+    np.testing.assert_allclose(matrix[2], vector, atol=np.abs(vector).max() / 127)
+
+
+def test_migrate_rewrites_only_other_formats(db, vector):
+    db.sitemaps.insert_many([
+        {"_id": 1, "embedding": vector.tolist()},
+        {"_id": 2, "embedding": codec.encode_embedding(vector, codec.FLOAT32)},
+        {"_id": 3},
+    ])
+
+    assert codec.migrate_embeddings(db.sitemaps, codec.FLOAT32) == 1
+    assert codec.storage_format_of(db.sitemaps.find_one({"_id": 1})["embedding"]) == codec.FLOAT32
+
+
+def test_unknown_format_is_rejected(vector):
+    with pytest.raises(ValueError):
+        codec.encode_embedding(vector, "float16")
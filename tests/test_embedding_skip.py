@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db import generate_embedding as ge
+
+CREATED = datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def module_db(db, monkeypatch):
+    monkeypatch.setattr(ge, "db", db)
+    return db
+
+
+def _fake_embed(calls):
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts], None
+    return embed
+
+
+def test_unchanged_hash_is_skipped_and_reported(db):
+    db.sitemaps.insert_one({"_id": 1, "name": "Pricing", "embeddingHash": ge.content_hash("Pricing")})
+    unchanged = []
+    stats = ge.EmbeddingStats()
+
+    batches = list(ge.iter_embedding_batches(db.sitemaps.find(), stats=stats, unchanged=unchanged))
+
+    assert batches == []
+    assert stats.unchanged == 1 and unchanged == [1]
+
+
+def test_identical_texts_are_embedded_once_and_cached(module_db):
+    module_db.sitemaps.insert_many([{"_id": i, "name": "Same text", "updatedAt": CREATED} for i in range(3)])
+    calls = []
+
+    ge.process_sitemaps(module_db.sitemaps, embed_fn=_fake_embed(calls))
+    ge.process_sitemaps(module_db.sitemaps, embed_fn=_fake_embed(calls))
+
+    assert calls == [["Same text"]]
+    assert module_db.sitemaps.count_documents({"embeddingHash": ge.content_hash("Same text")}) == 3
+    assert module_db[ge.EMBEDDING_CACHE_COLLECTION].count_documents({}) == 1
+
+
+def test_edited_docs_are_selected_until_checked(module_db):
+    calls = []
+    module_db.sitemaps.insert_many([{"_id": 1, "name": "Old", "updatedAt": CREATED}, {"_id": 2, "name": "Kept", "updatedAt": CREATED}])
+    ge.process_sitemaps(module_db.sitemaps, embed_fn=_fake_embed(calls))
+    later = datetime.utcnow() + timedelta(minutes=1)
+    module_db.sitemaps.update_one({"_id": 1}, {"$set": {"name": "New", "updatedAt": later}})
+    module_db.sitemaps.update_one({"_id": 2}, {"$set": {"updatedAt": later}})  # metadata-only edit
+
+    stats = ge.process_sitemaps(module_db.sitemaps, embed_fn=_fake_embed(calls))
+
+    assert calls[-1] == ["New"]
+    assert stats.docs == 1 and stats.unchanged == 1
+    module_db.sitemaps.update_many({}, {"$set": {"embeddingCheckedAt": later + timedelta(seconds=1)}})
+    assert module_db.sitemaps.count_documents(ge.pending_embedding_query()) == 0
@@ -0,0 +1,77 @@
+import pytest
+
+from app.db import embedding_worker as worker
+
+
+class _Status(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def test_token_bucket_waits_for_refill(monkeypatch):
+    clock = {"now": 0.0}
+    slept = []
+    monkeypatch.setattr(worker.time, "monotonic", lambda: clock["now"])
+
+    def sleep(seconds):
+        slept.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr(worker.time, "sleep", sleep)
+    bucket = worker.TokenBucket(rate_per_sec=10, capacity=10)
+
+    assert bucket.acquire(10) == 0
+    assert bucket.acquire(5) == pytest.approx(0.5)
+    assert slept == [pytest.approx(0.5)]
+
+
+def test_token_bucket_caps_oversized_requests(monkeypatch):
+    monkeypatch.setattr(worker.time, "sleep", lambda s: pytest.fail("should not wait"))
+    bucket = worker.TokenBucket(rate_per_sec=1, capacity=3)
+
+    assert bucket.acquire(100) == 0
+
+
+@pytest.mark.parametrize("exc, retryable", [
+    (_Status(429), True),
+    (_Status(503), True),
+    (_Status(400), False),
+    (ConnectionError(), True),
+    (ValueError(), False),
+])
+def test_is_retryable(exc, retryable):
+    assert worker.is_retryable(exc) is retryable
+
+
+def test_backoff_retries_retryable_errors_only(monkeypatch):
+    monkeypatch.setattr(worker.time, "sleep", lambda s: None)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _Status(429)
+        return "ok"
+
+    assert worker.with_backoff(flaky, max_retries=5)() == "ok"
+    assert len(attempts) == 3
+
+    def bad_request():
+        attempts.append(1)
+        raise _Status(400)
+
+    attempts.clear()
+    with pytest.raises(_Status):
+        worker.with_backoff(bad_request, max_retries=5)()
+    assert len(attempts) == 1
+
+
+def test_watermark_only_advances_over_contiguous_successes():
+    mark = worker._Watermark(None)
+
+    assert mark.finish(1, "b", True) is None
+    assert mark.finish(0, "a", True) == "b"
+    assert mark.finish(3, "d", True) is None
+    assert mark.finish(2, "c", False) is None
+    assert mark.value == "b"
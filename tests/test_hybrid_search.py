@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.services.get_category_id import CategoryIndex
+from app.services.hybrid_search import HybridSearcher
+from app.services.tenant_snapshot import TenantSnapshotRegistry
+from app.services.vector_store import VectorStoreRegistry
+
+
+@pytest.fixture
+def searcher(db, tenant, tmp_path):
+    index = CategoryIndex()
+    index.refresh_tenant(db, tenant["tenant"])
+    registry = VectorStoreRegistry(db, directory=str(tmp_path), ann_directory=str(tmp_path))
+    return HybridSearcher(registry, index, db, TenantSnapshotRegistry(db))
+
+
+def _page(db, tenant, attribute, vector, **fields):
+    return db.sitemaps.insert_one({
+        "tenant": tenant["tenant"],
+        "categoryAttribute": [tenant["attributes"][attribute]],
+        "embedding": vector,
+        "embeddingUpdatedAt": datetime(2025, 1, 1),
+        "createdAt": datetime(2025, 1, 1),
+        **fields,
+    }).inserted_id
+
+
+def _filtered(values, **extra):
+    return {
+        "query_text": "q",
+        "database_mapping": {
+            "required_joins": [{"collection": "category_attributes", "field": "categoryAttribute",
+                                "lookup_field": "name", "values": values, "category": "Funnel Stage"}],
+            "direct_fields": {},
+        },
+        **extra,
+    }
+
+
+def test_filters_restrict_semantic_ranking(db, tenant, searcher):
+    tofu = _page(db, tenant, "TOFU", [1.0, 0.0])
+    _page(db, tenant, "MOFU", [1.0, 0.01])
+    tofu_far = _page(db, tenant, "TOFU", [0.0, 1.0])
+
+    hits = searcher.search(_filtered(["TOFU"]), tenant["tenant"], [1.0, 0.0], k=5)
+
+    assert [doc_id for doc_id, _ in hits] == [tofu, tofu_far]
+
+
+def test_unfiltered_query_searches_everything(db, tenant, searcher):
+    ids = {_page(db, tenant, name, [1.0, float(i)]) for i, name in enumerate(["TOFU", "MOFU"])}
+
+    assert {doc_id for doc_id, _ in searcher.search({"query_text": "q"}, tenant["tenant"], [1.0, 0.0])} == ids
+
+
+def test_unknown_values_match_nothing(db, tenant, searcher):
+    _page(db, tenant, "TOFU", [1.0, 0.0])
+
+    assert searcher.search(_filtered(["Nope"]), tenant["tenant"], [1.0, 0.0]) == []
+
+
+def test_metadata_edits_are_seen_after_snapshot_refresh(db, tenant, searcher):
+    page = _page(db, tenant, "MOFU", [1.0, 0.0])
+    assert searcher.search(_filtered(["TOFU"]), tenant["tenant"], [1.0, 0.0]) == []
+
+    db.sitemaps.update_one({"_id": page}, {"$set": {
+        "categoryAttribute": [tenant["attributes"]["TOFU"]], "updatedAt": datetime(2030, 1, 1)
+    }})
+    searcher.snapshots.refresh(tenant["tenant"])
+
+    assert [doc_id for doc_id, _ in searcher.search(_filtered(["TOFU"]), tenant["tenant"], [1.0, 0.0])] == [page]
+
+
+def test_temporal_constraint_applies(db, tenant, searcher):
+    _page(db, tenant, "TOFU", [1.0, 0.0], createdAt=datetime(2023, 5, 1))
+    recent = _page(db, tenant, "TOFU", [1.0, 0.0], createdAt=datetime(2025, 3, 1))
+    parsed = _filtered(["TOFU"], constraints={"temporal": {"type": "after", "start_date": "2024-12-31"}})
+
+    assert [doc_id for doc_id, _ in searcher.search(parsed, tenant["tenant"], [1.0, 0.0])] == [recent]
+
+
+def test_content_type_names_resolve_to_ids(db, tenant, searcher):
+    blog = db.content_types.insert_one({"tenant": tenant["tenant"], "name": "Blog Post"}).inserted_id
+
+    assert searcher.content_type_values(tenant["tenant"], ["blog post"]) == ["blog post", blog]
+    assert searcher.content_type_values(ObjectId(), ["Blog Post"]) == ["Blog Post"]
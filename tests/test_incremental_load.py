@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.db import load_data as loader
+
+UPDATED = datetime(2025, 3, 1, 12, 0, 0, 123000)
+TENANT = ObjectId()
+KEY = loader.NATURAL_KEYS["sitemaps"]
+
+
+def _page(i, **fields):
+    return {"_id": ObjectId(f"{i:024x}"), "tenant": TENANT, "name": f"page {i}", "updatedAt": UPDATED, **fields}
+
+
+def test_only_changed_docs_are_replaced_and_vanished_deleted(db):
+    loader.incremental_load(db.sitemaps, [_page(1), _page(2), _page(3)])
+
+    stats = loader.incremental_load(db.sitemaps, [
+        _page(1),
+        _page(2, name="renamed", updatedAt=UPDATED + timedelta(seconds=1)),
+    ], batch_size=1)
+
+    assert stats == {"seen": 2, "upserted": 1, "unchanged": 1, "deleted": 1}
+    assert db.sitemaps.find_one({"_id": _page(2)["_id"]})["name"] == "renamed"
+    assert db.sitemaps.count_documents({}) == 2
+
+
+def test_docs_without_updated_at_are_compared_by_content(db):
+    doc = {"_id": ObjectId(), "tenant": TENANT, "name": "Funnel Stage"}
+    loader.incremental_load(db.categories, [dict(doc)])
+
+    assert loader.incremental_load(db.categories, [dict(doc)])["unchanged"] == 1
+    assert loader.incremental_load(db.categories, [{**doc, "name": "Stage"}])["upserted"] == 1
+
+
+def test_replacing_keeps_the_stored_embedding(db):
+    loader.incremental_load(db.sitemaps, [_page(1)])
+    derived = {"embedding": b"\x00" * 8, "embeddingHash": "abc", "embeddingModel": "m",
+               "embeddingUpdatedAt": UPDATED, "embeddingCheckedAt": UPDATED}
+    db.sitemaps.update_one({"_id": _page(1)["_id"]}, {"$set": derived})
+
+    loader.incremental_load(db.sitemaps, [_page(1, summary="new", updatedAt=UPDATED + timedelta(minutes=1))])
+
+    stored = db.sitemaps.find_one({"_id": _page(1)["_id"]})
+    assert stored["summary"] == "new"
+    assert {k: stored[k] for k in derived} == derived
+
+
+def test_docs_without_id_are_matched_on_the_natural_key(db):
+    def export():
+        return [{"tenant": TENANT, "fullUrl": f"https://example.com/{i}", "name": str(i)} for i in range(3)]
+
+    loader.incremental_load(db.sitemaps, export(), natural_key=KEY)
+    ids = {d["fullUrl"]: d["_id"] for d in db.sitemaps.find()}
+
+    stats = loader.incremental_load(db.sitemaps, export(), natural_key=KEY)
+
+    assert stats == {"seen": 3, "upserted": 0, "unchanged": 3, "deleted": 0}
+    assert {d["fullUrl"]: d["_id"] for d in db.sitemaps.find()} == ids
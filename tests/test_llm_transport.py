@@ -0,0 +1,76 @@
+import pytest
+
+from app.services.llm_transport import (
+    PASSTHROUGH, RECORD, REPLAY, RecordingStore, RecordReplayClient, ReplayMiss, request_hash, response_from,
+)
+
+REQUEST = {
+    "model": "gpt-test",
+    "messages": [{"role": "user", "content": "BOFU pages for Finance"}],
+    "tools": [{"type": "function", "function": {"name": "parse_query"}}],
+    "tool_choice": "auto",
+}
+CALLS = [{"name": "parse_query", "arguments": '{"filters": {"Funnel Stage": ["BOFU"]}}'}]
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.requests = []
+        self.chat = self
+
+    @property
+    def completions(self):
+        return self
+
+    def create(self, **request):
+        self.requests.append(request)
+        return response_from(CALLS)
+
+
+def test_hash_covers_prompt_fields_only():
+    assert request_hash(REQUEST) == request_hash({**REQUEST, "temperature": 0.7})
+    assert request_hash(REQUEST) != request_hash({**REQUEST, "messages": [{"role": "user", "content": "TOFU"}]})
+
+
+def test_record_then_replay_without_the_real_client(tmp_path):
+    path = str(tmp_path / "rec" / "llm.jsonl")
+    real = FakeOpenAI()
+    recorder = RecordReplayClient(lambda: real, RECORD, RecordingStore(path))
+    recorder.chat.completions.create(**REQUEST)
+
+    def no_client():
+        raise AssertionError("replay must not build the real client")
+
+    replayer = RecordReplayClient(no_client, REPLAY, RecordingStore(path), replay_latency_ms="recorded")
+    message = replayer.chat.completions.create(**{**REQUEST, "temperature": 0}).choices[0].message
+
+    assert len(real.requests) == 1
+    assert [(c.function.name, c.function.arguments) for c in message.tool_calls] == [(c["name"], c["arguments"]) for c in CALLS]
+    assert replayer.stats() == {"mode": REPLAY, "recordings": 1, "calls": 1, "recorded": 0, "replayed": 1, "misses": 0}
+
+
+def test_replay_miss_and_last_write_wins(tmp_path):
+    path = str(tmp_path / "llm.jsonl")
+    store = RecordingStore(path)
+    key = request_hash(REQUEST)
+    store.put(key, [], 0.1)
+    store.put(key, CALLS, 0.2)
+
+    reloaded = RecordingStore(path)
+    client = RecordReplayClient(lambda: None, REPLAY, reloaded)
+
+    assert len(reloaded) == 1 and reloaded.get(key)["tool_calls"] == CALLS
+    with pytest.raises(ReplayMiss):
+        client.chat.completions.create(**{**REQUEST, "model": "other"})
+    assert client.stats()["misses"] == 1
+
+
+def test_passthrough_and_bad_mode():
+    real = FakeOpenAI()
+    client = RecordReplayClient(lambda: real, PASSTHROUGH)
+
+    client.chat.completions.create(**REQUEST)
+
+    assert real.requests == [REQUEST] and client.stats()["recordings"] == 0
+    with pytest.raises(ValueError):
+        RecordReplayClient(lambda: real, "live")
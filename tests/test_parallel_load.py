@@ -0,0 +1,58 @@
+import json
+import time
+
+import pytest
+from bson import decode
+
+from app.db import parallel_load as pl
+from app.db.load_data import STAGING_SUFFIX, iter_json_documents
+
+DOCS = [{"_id": i, "items": [{"n": j} for j in range(3)], "text": "x" * 40} for i in range(50)]
+
+
+@pytest.mark.parametrize("indent", [None, 2, 4])
+def test_ranges_split_on_document_boundaries_at_any_indentation(tmp_path, indent):
+    path = tmp_path / "docs.json"
+    if indent is None:
+        path.write_text("[" + "\n,".join(json.dumps(d) for d in DOCS) + "]\n")
+    else:
+        path.write_text(json.dumps(DOCS, indent=indent))
+
+    ranges = pl.chunk_ranges(str(path), chunk_bytes=256)
+    parsed = [decode(raw) for start, end in ranges for batch in pl.parse_range(str(path), start, end, 7) for raw in batch]
+
+    assert len(ranges) > 5
+    assert parsed == list(iter_json_documents(str(path)))
+
+
+def test_compact_file_is_one_range_with_a_warning(tmp_path, capsys):
+    path = tmp_path / "docs.json"
+    path.write_text(json.dumps(DOCS))
+
+    assert pl.chunk_ranges(str(path), chunk_bytes=256) == [(0, path.stat().st_size)]
+    assert "No document boundaries" in capsys.readouterr().out
+
+
+def _state(db, inserted, rejected=0, duplicates=0):
+    db["sitemaps" + STAGING_SUFFIX].insert_many([{"_id": i, "new": True} for i in range(inserted)])
+    state = pl._FileState("sitemaps", 1)
+    state.inserted, state.rejected, state.duplicates = inserted, rejected, duplicates
+    return state
+
+
+def test_rejected_documents_block_the_swap(db):
+    db.sitemaps.insert_one({"_id": "live"})
+
+    assert pl.publish(db, _state(db, 3, rejected=1), time.perf_counter()) is None
+    assert db.sitemaps.count_documents({}) == 1
+    assert "sitemaps" + STAGING_SUFFIX not in db.list_collection_names()
+
+
+def test_duplicates_alone_still_swap(db):
+    db.sitemaps.insert_one({"_id": "live"})
+
+    result = pl.publish(db, _state(db, 3, duplicates=2), time.perf_counter())
+
+    assert result["docs"] == 3 and result["duplicates"] == 2
+    assert db.sitemaps.count_documents({"new": True}) == 3
+    assert db.sitemaps.count_documents({"_id": "live"}) == 0
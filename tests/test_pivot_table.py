@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from app.services.get_category_id import CategoryIndex
+from app.services.pivot_table import PivotTable
+from app.services.try_query_builder import build_pivot_pipeline, pivot_dimensions
+
+
+def _join(category, values):
+    return {"collection": "category_attributes", "field": "categoryAttribute", "category": category, "values": values}
+
+
+def _query(operation, agg_fields, *joins):
+    return {"operation_type": operation, "database_mapping": {"aggregation_fields": agg_fields, "required_joins": list(joins)}}
+
+
+@pytest.mark.parametrize("query, expected", [
+    (_query("aggregate", ["Funnel Stage", "Industry"]), ("Funnel Stage", "Industry")),
+    (_query("identify_gaps", ["Industry"], _join("Funnel Stage", ["BOFU"])), ("Funnel Stage", "Industry")),
+    (_query("identify_gaps", ["Industry"], _join("Industry", ["Retail"])), None),
+    (_query("aggregate", ["Industry"]), None),
+    (_query("list", ["Funnel Stage", "Industry"]), None),
+    (_query("count", ["Funnel Stage", "Industry"]), None),
+])
+def test_pivot_dimensions(query, expected):
+    assert pivot_dimensions(query) == expected
+
+
+@pytest.fixture
+def index(db, tenant):
+    index = CategoryIndex()
+    index.refresh_tenant(db, tenant["tenant"])
+    return index
+
+
+def test_pipeline_leaves_out_filters_on_the_dimensions(tenant, index):
+    a = tenant["attributes"]
+    query = _query("identify_gaps", ["Industry"], _join("Funnel Stage", ["BOFU"]))
+
+    pipeline = build_pivot_pipeline(query, str(tenant["tenant"]), index, "Funnel Stage", "Industry")
+
+    assert pipeline[0] == {"$match": {"tenant": tenant["tenant"]}}
+    assert not any("$lookup" in stage for stage in pipeline)
+    assert pipeline[1] == {"$match": {"$and": [
+        {"categoryAttribute": {"$in": [a["TOFU"], a["MOFU"], a["BOFU"]]}},
+        {"categoryAttribute": {"$in": [a["Finance"], a["Retail"]]}},
+    ]}}
+    assert pipeline[-1] == {"$group": {"_id": {"r": "$r", "c": "$c"}, "count": {"$sum": 1}}}
+
+
+def _table(tenant, index):
+    a = tenant["attributes"]
+    result = [
+        {"_id": {"r": a["TOFU"], "c": a["Finance"]}, "count": 6},
+        {"_id": {"r": a["TOFU"], "c": a["Retail"]}, "count": 2},
+        {"_id": {"r": a["BOFU"], "c": a["Finance"]}, "count": 1},
+        {"_id": {"r": ObjectId(), "c": a["Retail"]}, "count": 9},  # attribute deleted since
+    ]
+    query = _query("identify_gaps", ["Industry"], _join("Funnel Stage", ["BOFU"]))
+    return PivotTable.for_query(result, query, tenant["tenant"], index)
+
+
+def test_matrix_has_explicit_zeros_and_totals(tenant, index):
+    table = _table(tenant, index)
+
+    assert table.to_dict() == {
+        "rows": "Funnel Stage", "columns": "Industry",
+        "row_labels": ["TOFU", "MOFU", "BOFU"], "column_labels": ["Finance", "Retail"],
+        "counts": [[6, 2], [0, 0], [1, 0]],
+        "row_totals": [8, 0, 1], "column_totals": [7, 2],
+    }
+    assert table.total == 9
+    np.testing.assert_array_equal(table.percentages(axis=1), [[75.0, 25.0], [0.0, 0.0], [100.0, 0.0]])
+    assert PivotTable.for_query([], _query("list", []), tenant["tenant"], index) is None
+
+
+def test_gaps_and_rank(tenant, index):
+    table = _table(tenant, index)
+
+    assert table.gaps(rows=["bofu"]) == [{"Funnel Stage": "BOFU", "Industry": "Retail", "count": 0, "share": 0.0}]
+    assert [(g["Funnel Stage"], g["Industry"]) for g in table.gaps(max_count=1, max_share=25.0)] == [
+        ("MOFU", "Finance"), ("MOFU", "Retail"), ("BOFU", "Retail"), ("BOFU", "Finance"), ("TOFU", "Retail"),
+    ]
+    assert table.rank() == [("TOFU", 8), ("BOFU", 1), ("MOFU", 0)]
+    assert table.rank(axis=1, descending=False) == [("Retail", 2), ("Finance", 7)]
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.services.query_embedding_cache import QueryEmbeddingCache
+
+
+def test_keys_ignore_case_and_whitespace():
+    cache = QueryEmbeddingCache(max_entries=10, directory=None)
+    calls = []
+
+    first = cache.get_or_compute("m", "Blog  posts", lambda t: calls.append(t) or [1.0, 2.0])
+    second = cache.get_or_compute("m", " blog posts ", lambda t: calls.append(t) or [9.0, 9.0])
+
+    assert calls == ["Blog  posts"]
+    assert second is first and not first.flags.writeable
+    assert cache.get_or_compute("other-model", "blog posts", lambda t: [3.0]).tolist() == [3.0]
+
+
+def test_lru_eviction():
+    cache = QueryEmbeddingCache(max_entries=2, directory=None)
+    for text in ("a", "b"):
+        cache.put("m", text, [1.0])
+    cache.get("m", "a")
+    cache.put("m", "c", [1.0])
+
+    assert cache.get("m", "b") is None and cache.get("m", "a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_concurrent_misses_share_one_call():
+    cache = QueryEmbeddingCache(directory=None)
+    release = threading.Event()
+    calls = []
+
+    def slow(text):
+        calls.append(text)
+        release.wait(5)
+        return [1.0]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("m", "q", slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1 and len(results) == 5
+    assert all(r is results[0] for r in results)
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = QueryEmbeddingCache(directory=None)
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("m", "q", lambda t: (_ for _ in ()).throw(RuntimeError("down")))
+
+    assert cache.get_or_compute("m", "q", lambda t: [2.0]).tolist() == [2.0]
+    assert cache.stats()["errors"] == 1
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    QueryEmbeddingCache(directory=str(tmp_path)).get_or_compute("m", "q", lambda t: [0.5, 0.25])
+    reopened = QueryEmbeddingCache(directory=str(tmp_path))
+
+    value = reopened.get_or_compute("m", "q", lambda t: pytest.fail("should read from disk"))
+
+    np.testing.assert_array_equal(value, [0.5, 0.25])
+    assert reopened.stats()["disk_hits"] == 1
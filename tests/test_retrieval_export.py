@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers.query import router
+from app.services.retrieval_service import build_structured_match, iter_export
+
+
+def _join(category, values):
+    return {"collection": "category_attributes", "field": "categoryAttribute", "lookup_field": "name",
+            "category": category, "values": values}
+
+
+def _query(*joins):
+    return {"database_mapping": {"required_joins": list(joins), "direct_fields": {}}}
+
+
+@pytest.fixture
+def pages(db, tenant):
+    attrs = tenant["attributes"]
+    db.sitemaps.insert_many([
+        {"tenant": tenant["tenant"], "title": f"page {i}", "fullUrl": f"https://example.com/{i}",
+         "categoryAttribute": [attrs[stage]], "embedding": b"\x00" * 8, "createdAt": datetime(2025, 1, i + 1)}
+        for i, stage in enumerate(["TOFU", "TOFU", "BOFU"])
+    ])
+
+
+def test_joins_without_values_are_dropped(service, tenant):
+    service._ensure_tenant(tenant["tenant"])
+    pipeline = build_structured_match(
+        _query(_join("Funnel Stage", ["TOFU"]), _join("Industry", [])), tenant["tenant"], service.category_index
+    )
+
+    assert not any("$lookup" in stage or "$unwind" in stage for stage in pipeline)
+    assert {"$match": {"categoryAttribute": {"$in": [tenant["attributes"]["TOFU"]]}}} in pipeline
+
+
+@pytest.mark.usefixtures("pages")
+def test_export_formats(service, tenant, db):
+    service._ensure_tenant(tenant["tenant"])
+    query = _query(_join("Funnel Stage", ["TOFU"]))
+
+    lines = list(iter_export(query, tenant["tenant"], db.sitemaps, "ndjson", service.category_index))
+    rows = list(csv.DictReader(io.StringIO("".join(
+        iter_export(query, tenant["tenant"], db.sitemaps, "csv", service.category_index)
+    ))))
+
+    assert [json.loads(line)["title"] for line in lines] == ["page 0", "page 1"]
+    assert "embedding" not in json.loads(lines[0])
+    assert [row["fullUrl"] for row in rows] == ["https://example.com/0", "https://example.com/1"]
+    with pytest.raises(ValueError):
+        iter_export(query, tenant["tenant"], db.sitemaps, "xml")
+
+
+@pytest.mark.usefixtures("pages")
+def test_export_route_streams_csv(service, tenant):
+    app = FastAPI()
+    app.include_router(router)
+    app.state.service = service
+
+    response = TestClient(app).post("/export", json={
+        "tenant": str(tenant["tenant"]), "parsed": _query(_join("Funnel Stage", ["BOFU"])), "format": "csv", "limit": 5
+    })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[1].split(",")[1] == "page 2"
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from app.services.scheduler import FairScheduler, SchedulerFull, SchedulerTimeout, parse_weights
+
+
+def _wait_until(predicate):
+    deadline = time.monotonic() + 5
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.002)
+    assert predicate()
+
+
+def _dispatch_order(pool, jobs):
+    """Queue jobs [(tenant, priority)] one by one behind a held slot, then record the order they run in."""
+    order = []
+    pool.acquire("holder")
+    threads = []
+    for i, (tenant, priority) in enumerate(jobs):
+        thread = threading.Thread(target=pool.run, args=(tenant, lambda t=tenant, p=priority: order.append((t, p)), priority))
+        thread.start()
+        threads.append(thread)
+        _wait_until(lambda: pool.stats()["queued"] == i + 1)
+    pool.release()
+    for thread in threads:
+        thread.join(5)
+    return order
+
+
+def test_a_busy_tenant_cannot_delay_a_quiet_one():
+    pool = FairScheduler("test", 1, weights={})
+
+    order = _dispatch_order(pool, [("a", "interactive")] * 6 + [("b", "interactive")] * 2)
+
+    assert [t for t, _ in order] == ["a", "b", "a", "b", "a", "a", "a", "a"]
+
+
+def test_weights_share_slots_proportionally():
+    pool = FairScheduler("test", 1, weights={"a": 2.0})
+
+    order = _dispatch_order(pool, [("a", "interactive")] * 6 + [("b", "interactive")] * 3)
+
+    assert [t for t, _ in order][:6] == ["a", "b", "a", "a", "b", "a"]
+
+
+def test_interactive_first_but_batch_is_not_starved():
+    pool = FairScheduler("test", 1, weights={}, batch_every=4)
+
+    order = _dispatch_order(pool, [("a", "batch")] * 2 + [("a", "interactive")] * 6)
+
+    assert [p for _, p in order] == ["interactive", "interactive", "batch"] + ["interactive"] * 3 + ["batch", "interactive"]
+
+
+def test_full_queue_and_timeout():
+    pool = FairScheduler("test", 1, weights={}, max_queued_per_tenant=1)
+    pool.acquire("holder")
+    queued = threading.Thread(target=pool.run, args=("a", lambda: None))
+    queued.start()
+    _wait_until(lambda: pool.stats()["queued"] == 1)
+
+    with pytest.raises(SchedulerFull):
+        pool.acquire("a")
+    with pytest.raises(SchedulerTimeout):
+        pool.acquire("b", timeout=0.02)
+
+    pool.release()
+    queued.join(5)
+    stats = pool.stats()
+    assert (stats["rejected"], stats["timed_out"], stats["queued"], stats["running"]) == (1, 1, 0, 0)
+    assert stats["wait_ms"]["interactive"]["samples"] == 2
+
+
+def test_errors_release_the_slot_and_bad_priorities_are_rejected():
+    pool = FairScheduler("test", 1, weights={})
+
+    with pytest.raises(RuntimeError):
+        pool.run("a", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+    assert pool.run("a", lambda: 1) == 1
+    assert pool.stats()["errors"] == 1
+    with pytest.raises(ValueError):
+        pool.acquire("a", "urgent")
+
+
+def test_parse_weights():
+    assert parse_weights(" a:2, b:0.5,broken, :3") == {"a": 2.0, "b": 0.5}
@@ -0,0 +1,93 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.services import service_state
+
+
+class _Calls(list):
+    result: list = []
+
+
+@pytest.fixture
+def aggregate_calls(monkeypatch):
+    """Canned Mongo results (mongomock can't run the compare/pivot expressions); records the pipelines."""
+    calls = _Calls()
+
+    def fake(collection, pipeline, tenant_oid, **kwargs):
+        calls.append(pipeline)
+        return calls.result
+
+    monkeypatch.setattr(service_state, "coalesced_aggregate", fake)
+    return calls
+
+
+@pytest.fixture
+def pages(db, tenant):
+    a = tenant["attributes"]
+    db.sitemaps.insert_many([
+        {"tenant": tenant["tenant"], "categoryAttribute": attrs, "geoFocus": "US", "createdAt": datetime(2025, 1, 1),
+         "updatedAt": datetime(2025, 1, 1)}
+        for attrs in ([a["TOFU"], a["Finance"]], [a["TOFU"]], [a["BOFU"], a["Retail"]])
+    ])
+    db.content_types.insert_one({"tenant": tenant["tenant"], "name": "Blog"})
+
+
+def _join(category, values):
+    return {"collection": "category_attributes", "field": "categoryAttribute", "category": category, "values": values}
+
+
+@pytest.mark.usefixtures("pages")
+def test_single_category_aggregate_is_answered_from_the_snapshot(service, tenant, aggregate_calls):
+    query = {"operation_type": "aggregate", "database_mapping": {"aggregation_fields": ["Funnel Stage"], "required_joins": []}}
+
+    rows = service._aggregate(query, tenant["tenant"])
+
+    assert rows == [{"_id": "TOFU", "count": 2}, {"_id": "BOFU", "count": 1}, {"_id": "MOFU", "count": 0}]
+    assert aggregate_calls == []
+
+
+@pytest.mark.usefixtures("pages")
+def test_compare_with_an_aggregation_field_returns_the_comparison_table(service, tenant, aggregate_calls):
+    a = tenant["attributes"]
+    aggregate_calls.result = [{"totals": [{"_id": None, "e0": 2, "e1": 1}], "distribution": [{"_id": a["Finance"], "e0": 1, "e1": 0}]}]
+    query = {
+        "operation_type": "compare",
+        "aggregation_requested": True,
+        "comparison_entities": ["TOFU", "BOFU"],
+        "database_mapping": {"aggregation_fields": ["Industry"], "required_joins": [_join("Funnel Stage", ["TOFU", "BOFU"])]},
+    }
+
+    table = service._aggregate(query, tenant["tenant"])
+
+    assert "$facet" in aggregate_calls[0][-1]
+    assert [(r["entity"], r["count"], r["distribution"]) for r in table["rows"]] == [
+        ("TOFU", 2, {"Finance": 1, "Retail": 0}), ("BOFU", 1, {"Finance": 0, "Retail": 0}),
+    ]
+
+
+@pytest.mark.usefixtures("pages")
+def test_identify_gaps_with_a_pivot_pair_returns_the_matrix(service, tenant, aggregate_calls):
+    a = tenant["attributes"]
+    aggregate_calls.result = [{"_id": {"r": a["TOFU"], "c": a["Finance"]}, "count": 1}]
+    query = {
+        "operation_type": "identify_gaps",
+        "database_mapping": {"aggregation_fields": ["Industry"], "required_joins": [_join("Funnel Stage", ["BOFU"])]},
+    }
+
+    matrix = service._aggregate(query, tenant["tenant"])
+
+    assert aggregate_calls[0][-1]["$group"]["_id"] == {"r": "$r", "c": "$c"}
+    assert matrix["rows"] == "Funnel Stage" and matrix["columns"] == "Industry"
+    assert matrix["counts"] == [[1, 0], [0, 0], [0, 0]]
+
+
+@pytest.mark.usefixtures("pages")
+def test_vocabulary_merges_categories_languages_and_page_types(service, tenant):
+    vocabulary = service.vocabulary(str(tenant["tenant"]))
+
+    assert sorted(vocabulary["Funnel Stage"]) == ["BOFU", "MOFU", "TOFU"]
+    assert vocabulary["Language"] == ["US"]
+    assert vocabulary["Page Type"] == ["Blog"]
+    assert service.vocabulary(ObjectId()) == {}
@@ -0,0 +1,87 @@
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.services.single_flight import SingleFlight, coalesced_aggregate, coalesced_parse, parse_key, pipeline_key
+
+
+def _run_concurrently(flights, n, key, fn):
+    """n callers of flights.do(key, fn); fn blocks until all but the leader are waiting."""
+    release = threading.Event()
+    results, errors = [], []
+
+    def blocked():
+        release.wait(5)
+        return fn()
+
+    def call():
+        try:
+            results.append(flights.do(key, blocked))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flights.stats()["coalesced"] < n - 1 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_callers_share_one_execution():
+    flights = SingleFlight("test")
+    calls = []
+
+    results, errors = _run_concurrently(flights, 6, "k", lambda: calls.append(1) or {"rows": 1})
+
+    assert len(calls) == 1 and not errors
+    assert len(results) == 6 and all(r is results[0] for r in results)
+    stats = flights.stats()
+    assert (stats["calls"], stats["executions"], stats["coalesced"], stats["in_flight"]) == (6, 1, 5, 0)
+
+
+def test_errors_reach_every_waiter_and_the_next_call_runs_again():
+    flights = SingleFlight("test")
+
+    def fail():
+        raise RuntimeError("boom")
+
+    results, errors = _run_concurrently(flights, 4, "k", fail)
+
+    assert not results and len(errors) == 4 and all(str(e) == "boom" for e in errors)
+    assert flights.do("k", lambda: 2) == 2
+    assert flights.stats()["errors"] == 1
+
+
+def test_different_keys_do_not_coalesce():
+    flights = SingleFlight("test")
+
+    assert [flights.do(k, lambda k=k: k) for k in ("a", "b", "a")] == ["a", "b", "a"]
+    assert flights.stats()["executions"] == 3
+
+
+def test_keys():
+    tenant = ObjectId()
+    pipeline = [{"$match": {"tenant": tenant, "createdAt": {"$gte": datetime(2025, 1, 1)}}}]
+
+    assert parse_key(tenant, "Blog  Posts ") == parse_key(str(tenant), "blog posts")
+    assert pipeline_key(tenant, "sitemaps", pipeline) == pipeline_key(str(tenant), "sitemaps", [dict(pipeline[0])])
+    assert pipeline_key(tenant, "sitemaps", pipeline) != pipeline_key(tenant, "sitemaps", [{"$match": {"tenant": ObjectId()}}])
+    # Key order is part of a pipeline's meaning
+    assert pipeline_key(tenant, "c", [{"$sort": {"a": 1, "b": 1}}]) != pipeline_key(tenant, "c", [{"$sort": {"b": 1, "a": 1}}])
+
+
+def test_wrappers(db):
+    db.sitemaps.insert_many([{"tenant": 1, "n": i} for i in range(3)])
+    flights = SingleFlight("test")
+
+    rows = coalesced_aggregate(db.sitemaps, [{"$match": {"n": {"$gte": 1}}}, {"$project": {"_id": 0, "n": 1}}], 1, flights)
+
+    assert rows == [{"n": 1}, {"n": 2}]
+    assert coalesced_parse(1, "q", lambda text: {"text": text}, flights) == {"text": "q"}
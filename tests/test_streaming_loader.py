@@ -0,0 +1,49 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from bson import ObjectId
+
+from app.db import load_data as loader
+
+DOCS = [
+    {"_id": {"$oid": "6875f3afc8337606d54a7f37"}, "name": "A", "createdAt": {"$date": "2025-01-02T03:04:05Z"}},
+    {"_id": {"$oid": "6875f3afc8337606d54a7f38"}, "name": "B, with [brackets] and {braces}", "views": {"$numberLong": "42"}},
+    {"_id": {"$oid": "6875f3afc8337606d54a7f39"}, "nested": {"ids": [{"$oid": "6875f3afc8337606d54a7f37"}]}},
+]
+
+
+def _write(tmp_path, text):
+    path = tmp_path / "docs.json"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("text", [
+    json.dumps(DOCS, indent=2),
+    json.dumps(DOCS),
+    "\n".join(json.dumps(d) for d in DOCS) + "\n",
+])
+@pytest.mark.parametrize("chunk_size", [7, loader.READ_CHUNK_SIZE])
+def test_reads_arrays_and_ndjson_across_chunk_boundaries(tmp_path, text, chunk_size):
+    docs = list(loader.iter_json_documents(_write(tmp_path, text), chunk_size=chunk_size))
+
+    assert [d["_id"] for d in docs] == [ObjectId(d["_id"]["$oid"]) for d in DOCS]
+    assert docs[0]["createdAt"] == datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert docs[1]["views"] == 42 and docs[1]["name"] == DOCS[1]["name"]
+    assert docs[2]["nested"]["ids"] == [ObjectId("6875f3afc8337606d54a7f37")]
+
+
+def test_empty_array_and_truncated_file(tmp_path):
+    assert list(loader.iter_json_documents(_write(tmp_path, " [ ] "))) == []
+    with pytest.raises(json.JSONDecodeError):
+        list(loader.iter_json_documents(_write(tmp_path, '[{"a": 1}, {"b": '), chunk_size=4))
+
+
+def test_batched_insert_skips_duplicates(db):
+    db.sitemaps.insert_one({"_id": 2})
+
+    inserted = loader.insert_in_batches(db.sitemaps, ({"_id": i} for i in range(5)), batch_size=2)
+
+    assert inserted == 4
+    assert db.sitemaps.count_documents({}) == 5
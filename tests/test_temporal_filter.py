@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+from app.services import temporal_filter as tf
+
+NOW = datetime(2025, 5, 14, 15, 30)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2025-03-04", (datetime(2025, 3, 4), "day")),
+    ("March 4th, 2025", (datetime(2025, 3, 4), "day")),
+    ("Mar 2025", (datetime(2025, 3, 1), "month")),
+    ("2025", (datetime(2025, 1, 1), "year")),
+    ("25/03/2025", (datetime(2025, 3, 25), "day")),
+    ("03/25/2025", (datetime(2025, 3, 25), "day")),
+    ("2025-03-04T10:00:00Z", (datetime(2025, 3, 4, 10), None)),
+    ("13/13/2025", None),
+    ("soon", None),
+])
+def test_parse_date(text, expected):
+    assert tf.parse_date(text) == expected
+
+
+def test_ambiguous_slash_dates_follow_the_configured_order(monkeypatch):
+    assert tf.parse_date("03/04/2025")[0] == datetime(2025, 4, 3)
+    monkeypatch.setattr(tf, "SLASH_DATE_ORDER", "mdy")
+    assert tf.parse_date("03/04/2025")[0] == datetime(2025, 3, 4)
+
+
+@pytest.mark.parametrize("temporal, start, end", [
+    ({"type": "after", "start_date": "2024"}, datetime(2025, 1, 1), None),
+    ({"type": "after", "end_date": "2025-01-31"}, datetime(2025, 2, 1), None),
+    ({"type": "after", "start_date": "2025-01-31T12:00:00Z"}, datetime(2025, 1, 31, 12, 0, 0, 1000), None),
+    ({"type": "before", "end_date": "2025-02"}, None, datetime(2025, 2, 1)),
+    ({"type": "range", "start_date": "2025-01", "end_date": "2025-03"}, datetime(2025, 1, 1), datetime(2025, 4, 1)),
+    ({"type": "relative", "relative_period": "last quarter"}, datetime(2025, 1, 1), datetime(2025, 4, 1)),
+    ({"type": "relative", "relative_period": "past 30 days"}, datetime(2025, 4, 14, 15, 30), NOW),
+    ({"type": "relative", "relative_period": "ytd"}, datetime(2025, 1, 1), NOW),
+])
+def test_resolve_temporal_is_half_open(temporal, start, end):
+    assert tf.resolve_temporal(temporal, NOW) == tf.TemporalRange("createdAt", start, end)
+
+
+def test_unreadable_or_empty_constraints_build_no_stage():
+    assert tf.resolve_temporal({"type": "after", "start_date": "someday"}, NOW) is None
+    assert tf.build_temporal_match(tf.resolve_temporal(None, NOW)) == {}
+
+
+def test_match_stage_uses_gte_and_lt():
+    stage = tf.build_temporal_match(tf.resolve_temporal(
+        {"type": "range", "date_field": "updatedAt", "start_date": "2025-01-01", "end_date": "2025-01-31"}, NOW
+    ))
+    assert stage == {"$match": {"updatedAt": {"$gte": datetime(2025, 1, 1), "$lt": datetime(2025, 2, 1)}}}
+    assert tf.find_temporal_stage([{"$match": {"tenant": 1}}, stage]) is stage
+
+
+def test_after_a_timestamp_excludes_the_timestamp(db):
+    edge = datetime(2025, 1, 31, 12)
+    db.sitemaps.insert_many([{"createdAt": edge}, {"createdAt": datetime(2025, 1, 31, 12, 0, 0, 1000)}])
+    stage = tf.build_temporal_match(tf.resolve_temporal({"type": "after", "start_date": "2025-01-31T12:00:00"}, NOW))
+
+    assert [d["createdAt"] for d in db.sitemaps.aggregate([stage])] == [datetime(2025, 1, 31, 12, 0, 0, 1000)]
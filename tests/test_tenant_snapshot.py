@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from bson import ObjectId
+
+from app.services.get_category_id import CategoryIndex
+from app.services.tenant_snapshot import FilterSpec, TenantSnapshot, TenantSnapshotRegistry, answer_aggregation
+from app.services.temporal_filter import TemporalRange
+
+PDF, BLOG = ObjectId(), ObjectId()
+
+
+@pytest.fixture
+def pages(db, tenant):
+    a = tenant["attributes"]
+    rows = [
+        ([a["TOFU"], a["Finance"]], PDF, "US", datetime(2025, 1, 5)),
+        ([a["TOFU"], a["Retail"]], BLOG, "DE", datetime(2025, 2, 5)),
+        ([a["BOFU"], a["Finance"]], BLOG, "US", datetime(2025, 3, 5)),
+        ([], PDF, "US", datetime(2025, 4, 5)),
+    ]
+    ids = db.sitemaps.insert_many([
+        {"tenant": tenant["tenant"], "categoryAttribute": attrs, "contentType": ct, "geoFocus": geo,
+         "createdAt": created, "updatedAt": created}
+        for attrs, ct, geo, created in rows
+    ]).inserted_ids
+    return ids
+
+
+def _rows(view, mask):
+    return [view.ids[i] for i in np.flatnonzero(mask)]
+
+
+def test_masks_or_within_and_across_filters(db, tenant, pages):
+    a = tenant["attributes"]
+    view = TenantSnapshot.from_collection(db.sitemaps, tenant["tenant"]).view()
+
+    assert _rows(view, view.attribute_mask([a["TOFU"], a["BOFU"]])) == pages[:3]
+    spec = FilterSpec(attribute_groups=[[a["TOFU"], a["BOFU"]], [a["Finance"]]], value_filters={"geoFocus": ["US"]})
+    assert _rows(view, view.filter_mask(spec)) == [pages[0], pages[2]]
+    assert _rows(view, view.value_mask("contentType", [PDF, ObjectId()])) == [pages[0], pages[3]]
+    spec = FilterSpec(temporal_range=TemporalRange("createdAt", datetime(2025, 2, 1), datetime(2025, 4, 1)))
+    assert _rows(view, view.filter_mask(spec)) == pages[1:3]
+    assert view.attribute_counts([a["TOFU"], a["Finance"], ObjectId()]).tolist() == [2, 2, 0]
+    assert view.value_counts("geoFocus") == {"US": 3, "DE": 1}
+
+
+def test_updates_and_removals_keep_views_consistent(db, tenant, pages):
+    a = tenant["attributes"]
+    snapshot = TenantSnapshot.from_collection(db.sitemaps, tenant["tenant"])
+    before = snapshot.view()
+
+    snapshot.upsert_many([{"_id": pages[0], "categoryAttribute": [a["MOFU"]], "createdAt": datetime(2025, 1, 5)}])
+    snapshot.remove(pages[1])
+    after = snapshot.view()
+
+    assert before.count(before.attribute_mask([a["TOFU"]])) == 2
+    assert after.count(after.filter_mask(FilterSpec(attribute_groups=[[a["TOFU"]]]))) == 0
+    assert _rows(after, after.filter_mask(FilterSpec(attribute_groups=[[a["MOFU"]]]))) == [pages[0]]
+    assert after.count() == 3
+
+
+def test_synced_at_falls_back_to_load_time(db, tenant):
+    db.sitemaps.insert_one({"tenant": tenant["tenant"], "createdAt": datetime(2025, 1, 1)})
+    snapshot = TenantSnapshot.from_collection(db.sitemaps, tenant["tenant"])
+
+    assert snapshot.synced_at is not None
+    assert snapshot.refresh(db.sitemaps) == 0
+
+
+def test_answer_aggregation_uses_the_given_content_types(db, tenant, pages):
+    index = CategoryIndex()
+    index.refresh_tenant(db, tenant["tenant"])
+    calls = []
+
+    def content_types(tenant_oid, names):
+        calls.append((tenant_oid, list(names)))
+        return [PDF]
+
+    query = {
+        "operation_type": "aggregate",
+        "database_mapping": {
+            "aggregation_fields": ["Funnel Stage"],
+            "required_joins": [{"collection": "content_types", "field": "contentType", "values": ["Whitepaper"]}],
+        },
+    }
+    rows = answer_aggregation(query, tenant["tenant"], TenantSnapshotRegistry(db), index, content_type_values=content_types)
+
+    assert calls == [(tenant["tenant"], ["Whitepaper"])]
+    assert rows == [{"_id": "TOFU", "count": 1}, {"_id": "MOFU", "count": 0}, {"_id": "BOFU", "count": 0}]
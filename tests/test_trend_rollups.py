@@ -0,0 +1,96 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import trend_rollups as tr
+from app.services.temporal_filter import period_start
+
+NOW = datetime(2025, 6, 20)
+
+
+@pytest.fixture(autouse=True)
+def python_buckets(monkeypatch):
+    """mongomock has no $dateTrunc: return the matched docs and bucket them here."""
+    def build(match_stages, period, field=tr.DEFAULT_DATE_FIELD):
+        return [*match_stages, {"$match": {field: {"$type": "date"}}}, {"$addFields": {"_period": period, "_field": field}}]
+
+    def rows(result):
+        totals, attributes = Counter(), Counter()
+        for doc in result:
+            bucket = period_start(doc[doc["_field"]], doc["_period"])
+            totals[bucket] += 1
+            for attr in doc.get("categoryAttribute") or []:
+                attributes[bucket, attr] += 1
+        return [(b, a, n) for (b, a), n in attributes.items()] + [(b, None, n) for b, n in totals.items()]
+
+    monkeypatch.setattr(tr, "build_bucket_pipeline", build)
+    monkeypatch.setattr(tr, "bucket_rows", rows)
+
+
+@pytest.fixture
+def pages(db, tenant):
+    tofu = tenant["attributes"]["TOFU"]
+    days = [datetime(2025, 1, 1) + timedelta(days=d) for d in range(0, 170, 3)]
+    db.sitemaps.insert_many([{"tenant": tenant["tenant"], "categoryAttribute": [tofu], "createdAt": day} for day in days])
+    return days
+
+
+def _totals(rows):
+    totals = Counter()
+    for bucket, attribute, count in rows:
+        if attribute is None:
+            totals[bucket] += count
+    return totals
+
+
+def test_partial_edge_buckets_are_counted_live(db, tenant, pages):
+    since, until = datetime(2025, 2, 10), datetime(2025, 5, 17)
+
+    rows = tr.read_trend(db, tenant["tenant"], "month", since=since, until=until, now=NOW)
+
+    expected = Counter(period_start(day, "month") for day in pages if since <= day < until)
+    assert _totals(rows) == expected
+    assert db[tr.ROLLUP_COLLECTION].count_documents({"attribute": None}) == 6
+
+
+def test_range_inside_one_bucket_is_all_live(db, tenant, pages):
+    since, until = datetime(2025, 3, 5), datetime(2025, 3, 20)
+
+    rows = tr.read_trend(db, tenant["tenant"], "month", since=since, until=until, now=NOW)
+
+    assert _totals(rows) == {datetime(2025, 3, 1): sum(1 for day in pages if since <= day < until)}
+
+
+def test_closed_buckets_are_kept_and_emptied_open_ones_deleted(db, tenant, pages):
+    tr.refresh_rollups(db, tenant["tenant"], "month", now=NOW)
+    db.sitemaps.delete_many({"createdAt": {"$gte": datetime(2025, 6, 1)}})
+    db.sitemaps.delete_many({"createdAt": {"$lt": datetime(2025, 2, 1)}})
+
+    stats = tr.refresh_rollups(db, tenant["tenant"], "month", now=NOW + timedelta(hours=1))
+
+    buckets = set(db[tr.ROLLUP_COLLECTION].distinct("bucket"))
+    assert stats["recomputed_from"] == datetime(2025, 6, 1)
+    assert datetime(2025, 6, 1) not in buckets
+    assert datetime(2025, 1, 1) in buckets
+
+
+def test_held_lease_skips_and_expired_lease_is_taken(db, tenant, pages):
+    state_id = tr._state_id(tenant["tenant"], "month", tr.DEFAULT_DATE_FIELD)
+    db[tr.ROLLUP_STATE_COLLECTION].insert_one({"_id": state_id, "leaseUntil": datetime(2999, 1, 1)})
+
+    assert tr.refresh_rollups(db, tenant["tenant"], "month", now=NOW) == {"skipped": True}
+
+    db[tr.ROLLUP_STATE_COLLECTION].update_one({"_id": state_id}, {"$set": {"leaseUntil": datetime(2000, 1, 1)}})
+    assert tr.refresh_rollups(db, tenant["tenant"], "month", now=NOW)["rows"] > 0
+    assert "leaseUntil" not in db[tr.ROLLUP_STATE_COLLECTION].find_one({"_id": state_id})
+
+
+def test_series_is_dense(tenant):
+    tofu = tenant["attributes"]["TOFU"]
+    rows = [(datetime(2025, 1, 1), tofu, 2), (datetime(2025, 3, 1), None, 5)]
+
+    series = tr.trend_series(rows, [(tofu, "TOFU")], "month", datetime(2025, 1, 1), datetime(2025, 4, 1))
+
+    assert series["buckets"] == ["2025-01-01T00:00:00", "2025-02-01T00:00:00", "2025-03-01T00:00:00"]
+    assert series["series"] == {"TOFU": [2, 0, 0]} and series["totals"] == [0, 0, 5]
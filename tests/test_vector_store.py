@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId
+
+from app.services.vector_store import TenantVectorStore
+
+
+def _insert(db, tenant, vectors, updated_at=datetime(2025, 1, 1)):
+    ids = []
+    for vector in vectors:
+        ids.append(db.sitemaps.insert_one(
+            {"tenant": tenant, "embedding": list(map(float, vector)), "embeddingUpdatedAt": updated_at}
+        ).inserted_id)
+    return ids
+
+
+def test_search_ranks_by_cosine(db):
+    tenant = ObjectId()
+    ids = _insert(db, tenant, [[1, 0, 0], [0, 1, 0], [1, 1, 0]])
+    store = TenantVectorStore.from_collection(db.sitemaps, tenant)
+
+    hits = store.search([2, 0.1, 0], k=2)
+
+    assert [doc_id for doc_id, _ in hits] == [ids[0], ids[2]]
+    assert hits[0][1] > hits[1][1]
+
+
+def test_incremental_refresh_pulls_changes_and_drops_deleted(db):
+    tenant = ObjectId()
+    ids = _insert(db, tenant, [[1, 0], [0, 1], [1, 1]])
+    store = TenantVectorStore.from_collection(db.sitemaps, tenant)
+    _insert(db, tenant, [[1, -1]], updated_at=datetime(2025, 2, 1))
+    db.sitemaps.delete_one({"_id": ids[0]})
+    db.sitemaps.update_one({"_id": ids[1]}, {"$unset": {"embedding": ""}})
+
+    changed = store.refresh(db.sitemaps)
+
+    assert changed == 3  # one added, two removed
+    assert store.size == 2 and store.row_of(ids[0]) is None and store.row_of(ids[1]) is None
+
+
+def test_full_refresh_keeps_serving_old_rows_until_swap(db):
+    tenant = ObjectId()
+    ids = _insert(db, tenant, [[1, 0], [0, 1]])
+    store = TenantVectorStore.from_collection(db.sitemaps, tenant)
+    seen_during_load = []
+
+    class Collection:
+        def find(self, *args, **kwargs):
+            for doc in db.sitemaps.find(*args, **kwargs):
+                seen_during_load.append(store.size)
+                yield doc
+
+    store.refresh(Collection(), full=True)
+
+    assert seen_during_load == [2, 2]
+    assert {doc_id for doc_id, _ in store.search([1, 1], k=5)} == set(ids)
+
+
+def test_remove_leaves_previous_snapshot_intact(db):
+    tenant = ObjectId()
+    ids = _insert(db, tenant, [[1, 0], [0, 1], [1, 1]])
+    store = TenantVectorStore.from_collection(db.sitemaps, tenant)
+    matrix, snapshot_ids = store._snapshot()
+    before = matrix.copy()
+
+    store.remove(ids[0])
+
+    np.testing.assert_array_equal(matrix, before)
+    assert snapshot_ids == ids and store.ids == [ids[2], ids[1]]
+
+
+def test_save_and_open_round_trip(db, tmp_path):
+    tenant = ObjectId()
+    ids = _insert(db, tenant, [[1, 0], [0, 1]])
+    store = TenantVectorStore.from_collection(db.sitemaps, tenant)
+    store.save(str(tmp_path))
+
+    reopened = TenantVectorStore.open(str(tmp_path), tenant)
+
+    assert reopened.ids == ids and reopened.synced_at == store.synced_at
+    reopened.upsert(ObjectId(), [1.0, 1.0])  # first write copies the memory map
+    assert reopened.size == 3